@@ -0,0 +1,153 @@
+"""
+Account number allocation.
+
+Each process reserves a block of numbers from the AccountNumberSequence row
+with a single ``UPDATE ... RETURNING`` and then hands them out from memory, so
+creating an account costs no query at all most of the time and two processes
+can never get the same number.
+The reservation runs on its own autocommit connection, like a database
+sequence it is never rolled back together with the caller's transaction.
+Inside an atomic block it runs on the caller's connection instead, a second
+connection would wait on the write lock the caller holds (SQLite takes it
+at BEGIN). Those numbers roll back with the caller, so they are reserved
+one at a time and never cached; ``take`` before opening the transaction to
+get numbers from the block.
+
+Numbers are 11 sequence digits plus a Luhn check digit. Legacy accounts have
+10 random digits and no check digit, the lengths never overlap.
+"""
+
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import AccountNumberSequence
+
+SEQUENCE_NAME = "bank_account"
+ACCOUNT_NUMBER_LENGTH = 12
+LEGACY_ACCOUNT_NUMBER_LENGTH = 10
+
+
+def luhn_check_digit(digits):
+    total = 0
+    # walking from the right, every digit that ends up in an odd position once
+    # the check digit is appended gets doubled
+    for position, char in enumerate(reversed(digits)):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(number):
+    """
+    Check the shape and check digit of number without touching the database.
+    Legacy numbers have no check digit, only their shape can be checked.
+    """
+    if not number or not number.isdigit():
+        return False
+    if len(number) == LEGACY_ACCOUNT_NUMBER_LENGTH:
+        return True
+    return (
+        len(number) == ACCOUNT_NUMBER_LENGTH
+        and luhn_check_digit(number[:-1]) == number[-1]
+    )
+
+
+class AccountNumberAllocator:
+    def __init__(self, name=SEQUENCE_NAME, block_size=None):
+        self.name = name
+        self.block_size = block_size or settings.ACCOUNT_NUMBER_BLOCK_SIZE
+        self.next_value = 0
+        self.block_end = 0  # exclusive
+        self.lock = threading.Lock()
+
+    def _update(self, connection, size):
+        """Move the sequence on by size on connection, returns the new end."""
+        table = AccountNumberSequence._meta.db_table
+        qn = connection.ops.quote_name
+        update = (
+            f"UPDATE {qn(table)} SET {qn('next_value')} = {qn('next_value')} + %s "
+            f"WHERE {qn('name')} = %s"
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor in ("postgresql", "sqlite"):
+                cursor.execute(
+                    f"{update} RETURNING {qn('next_value')}", [size, self.name]
+                )
+                return cursor.fetchone()[0]
+            cursor.execute(update, [size, self.name])
+            cursor.execute(
+                f"SELECT {qn('next_value')} FROM {qn(table)} WHERE {qn('name')} = %s",
+                [self.name],
+            )
+            return cursor.fetchone()[0]
+
+    def _reserve(self, size):
+        """Reserve size values from the sequence, returns the first one."""
+        alias = router.db_for_write(AccountNumberSequence)
+        if connections[alias].in_atomic_block:
+            # a second connection would wait on the caller's write lock
+            return self._update(connections[alias], size) - size
+        connection = connections.create_connection(alias)
+        try:
+            if connection.vendor not in ("postgresql", "sqlite"):
+                connection.set_autocommit(False)
+            end = self._update(connection, size)
+            if not connection.get_autocommit():
+                connection.commit()
+        finally:
+            connection.close()
+        return end - size
+
+    def _in_atomic_block(self):
+        alias = router.db_for_write(AccountNumberSequence)
+        return connections[alias].in_atomic_block
+
+    def _number(self, value):
+        digits = str(value)
+        return digits + luhn_check_digit(digits)
+
+    def next(self):
+        with self.lock:
+            if self.next_value >= self.block_end:
+                if self._in_atomic_block():
+                    # rolled back with the caller, so never cached
+                    return self._number(self._reserve(1))
+                self.next_value = self._reserve(self.block_size)
+                self.block_end = self.next_value + self.block_size
+            value = self.next_value
+            self.next_value += 1
+        return self._number(value)
+
+    def take(self, count):
+        """
+        Return count numbers at once, for bulk onboarding.
+        Whatever the in-memory block cannot cover is reserved in one query.
+        """
+        with self.lock:
+            values = list(
+                range(self.next_value, min(self.block_end, self.next_value + count))
+            )
+            self.next_value += len(values)
+            missing = count - len(values)
+            if missing:
+                start = self._reserve(missing)
+                values.extend(range(start, start + missing))
+        return [self._number(value) for value in values]
+
+
+_allocators = {}
+
+
+def get_account_number_allocator():
+    # keyed by pid so forked workers never hand out the same block
+    pid = os.getpid()
+    if pid not in _allocators:
+        _allocators[pid] = AccountNumberAllocator()
+    return _allocators[pid]
@@ -1,30 +1,183 @@
+from decimal import Decimal
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Case, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
-from .models import BankAccount, Transaction, Wallet
+from .models import (
+    HOLDER_FIELDS,
+    BalanceShard,
+    BankAccount,
+    LedgerEntry,
+    ScheduledTransfer,
+    Transaction,
+    Wallet,
+)
 
 # Register your models here.
 
+ZERO = Decimal("0.00")
+
+
+def estimated_row_count(model, using):
+    """
+    Rough row count of model's table without a COUNT(*): the planner's
+    estimate on PostgreSQL, elsewhere the highest primary key (ids only grow).
+    The highest key is an upper bound, it keeps counting rows that were
+    deleted since, archived transactions among them.
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 until the table was first analyzed
+        return row[0] if row and row[0] >= 0 else None
+    return model._base_manager.using(using).aggregate(top=Max("pk"))["top"]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator for very large tables. An unfiltered list uses
+    estimated_row_count() once the table is big enough for it to matter, a
+    filtered or searched one stops counting at max_count rows. The estimate
+    is an upper bound on SQLite and MySQL, the page count can run past the
+    last page once rows were deleted.
+    """
+
+    exact_below = 10_000
+    max_count = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+            return queryset.count()
+        return queryset[: self.max_count].count()
+
+
+def prefix_upper_bound(prefix):
+    # "abc" -> "abd", so a prefix search is an index range, not a LIKE
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class IndexedSearchMixin:
+    """
+    Admin search that only runs index lookups: each (field, mode) of
+    indexed_search_fields matches the search term exactly or as a prefix.
+    A field across a relation, "sender__email", becomes a sender_id IN
+    (subquery) so both sides keep their index.
+    """
+
+    indexed_search_fields = ()
+
+    def get_search_fields(self, request):
+        # shows the search box, matching is done by get_search_results
+        return [field for field, _ in self.indexed_search_fields]
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        condition = Q()
+        for path, mode in self.indexed_search_fields:
+            if mode == "exact":
+                lookup = {"exact": term}
+            else:
+                lookup = {"gte": term, "lt": prefix_upper_bound(term)}
+
+            relation, _, field = path.rpartition("__")
+            if relation:
+                related = self.model._meta.get_field(relation).related_model
+                matches = related._base_manager.filter(
+                    **{f"{field}__{key}": value for key, value in lookup.items()}
+                )
+                condition |= Q(**{f"{relation}__in": matches.values("pk")})
+            else:
+                condition |= Q(
+                    **{f"{path}__{key}": value for key, value in lookup.items()}
+                )
+        return queryset.filter(condition), False
+
+
+class ShardedBalanceMixin:
+    """
+    Shows the balance with what the holder's shards hold, see shards.py. A
+    correlated subquery per listed row, and only for sharded holders, so the
+    changelist stays a plain ordered LIMIT over the table.
+    """
+
+    def get_queryset(self, request):
+        field = HOLDER_FIELDS[self.model]
+        shard_total = (
+            BalanceShard.objects.filter(**{field: OuterRef("pk")})
+            .values(field)
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                shard_total=Case(
+                    When(
+                        balance_shards__gt=0,
+                        then=Coalesce(Subquery(shard_total), Value(ZERO)),
+                    ),
+                    default=Value(ZERO),
+                )
+            )
+        )
+
+    @admin.display(description="balance", ordering="balance")
+    def total_balance(self, obj):
+        return obj.balance + obj.shard_total
+
+
+class LargeTableAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # no second COUNT(*) of the whole table for "x results (y total)"
+    show_full_result_count = False
+
 
 @admin.register(BankAccount)
-class BankAccountAdmin(admin.ModelAdmin):
+class BankAccountAdmin(ShardedBalanceMixin, LargeTableAdmin):
     list_display = [
         "account_number",
         "account_type",
-        "balance",
+        "total_balance",
+        "balance_shards",
         "is_active",
         "created_at",
         "owner__email",
     ]
     list_filter = ["account_type", "is_active"]
+    list_select_related = ["owner"]
+    indexed_search_fields = [("account_number", "prefix"), ("owner__email", "prefix")]
+    raw_id_fields = ["owner"]
+    readonly_fields = ["balance_shards"]
 
 
 @admin.register(Wallet)
-class WalletAdmin(admin.ModelAdmin):
-    list_display = ["user", "balance", "last_update"]
+class WalletAdmin(ShardedBalanceMixin, admin.ModelAdmin):
+    list_display = ["user", "total_balance", "balance_shards", "last_update"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    readonly_fields = ["balance_shards"]
 
 
 @admin.register(Transaction)
-class transactionAdmin(admin.ModelAdmin):
+class transactionAdmin(LargeTableAdmin):
     list_display = [
         "sender",
         "transaction_type",
@@ -34,6 +187,70 @@ class transactionAdmin(admin.ModelAdmin):
         "receipt",
         "created_at",
     ]
-    list_filter = ["transaction_type", "transaction_category", "transaction_status"]
-    search_fields = ["receipt", "sender__email", "recipient_address"]
+    # a bounded range on created_at, date_hierarchy would list the distinct
+    # years of the whole table on every page
+    list_filter = [
+        "transaction_type",
+        "transaction_category",
+        "transaction_status",
+        ("created_at", admin.DateFieldListFilter),
+    ]
+    list_select_related = ["sender"]
+    indexed_search_fields = [
+        ("receipt", "exact"),
+        ("sender__email", "prefix"),
+        ("recipient__email", "prefix"),
+        ("sender_bank_account__account_number", "prefix"),
+    ]
     ordering = ["-created_at"]
+    raw_id_fields = ["sender", "recipient", "sender_bank_account"]
+
+
+@admin.register(ScheduledTransfer)
+class ScheduledTransferAdmin(LargeTableAdmin):
+    list_display = [
+        "owner",
+        "transaction_type",
+        "recipient_address",
+        "amount",
+        "frequency",
+        "next_run_at",
+        "runs",
+        "failures",
+        "is_active",
+    ]
+    list_filter = ["frequency", "transaction_type", "is_active"]
+    list_select_related = ["owner"]
+    indexed_search_fields = [("owner__email", "prefix")]
+    raw_id_fields = ["owner", "sender_bank_account", "last_transaction"]
+    readonly_fields = ["claimed_until", "last_run_at", "last_error", "failures"]
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(LargeTableAdmin):
+    list_display = [
+        "transaction",
+        "entry_type",
+        "amount",
+        "wallet",
+        "bank_account",
+        "created_at",
+    ]
+    list_filter = ["entry_type"]
+    list_select_related = [
+        "transaction__sender",
+        "transaction__recipient",
+        "wallet__user",
+        "bank_account",
+    ]
+    indexed_search_fields = [("transaction__receipt", "exact")]
+
+    # the ledger is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,260 @@
+"""
+Cold storage for old transactions.
+
+archive_transactions moves completed transactions older than a cutoff out of
+the transaction table into segment files under ARCHIVE_DIR, oldest first,
+segment_size rows per file. A segment is a run of zlib-compressed blocks,
+one per user who sent or received any of its transactions, each the NDJSON
+of that user's rows newest first. An ArchiveBlock row per block (user,
+offset, length, oldest and newest row) is the per-user index, so reading one
+user's archive never decompresses anyone else's rows.
+
+A segment is written to a temporary file and renamed into place, then
+registered with its blocks in one transaction, then its transactions are
+deleted chunk_size at a time, each chunk its own short transaction, and
+finally it is sealed. Nothing holds a lock for longer than one chunk, and an
+interrupted run finishes the deletes of an unsealed segment before archiving
+more. The ledger entries stay, they are the book balances are checked
+against.
+
+A transaction stays in the table while something still points at it: an
+idempotency key younger than IDEMPOTENCY_KEY_TTL, whose retries must replay
+it rather than move the money again, or the last_transaction of a scheduled
+transfer.
+
+Readers see an unsealed segment and the rows it still shares with the table
+at the same time, ArchivedHistory pages and merged exports drop the copy.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import zlib
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    ArchiveBlock,
+    ArchiveSegment,
+    IdempotencyKey,
+    ScheduledTransfer,
+    Transaction,
+)
+
+FIELDS = [field.attname for field in Transaction._meta.concrete_fields]
+
+
+def segment_path(name):
+    return os.path.join(settings.ARCHIVE_DIR, name)
+
+
+def _micros(moment):
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+def _encode(rows):
+    lines = (json.dumps(row, default=str, separators=(",", ":")) for row in rows)
+    return zlib.compress("\n".join(lines).encode())
+
+
+def _transaction(row):
+    """An archived row as a Transaction, never saved again."""
+    values = dict(row)
+    values["amount"] = Decimal(values["amount"])
+    values["created_at"] = parse_datetime(values["created_at"])
+    values["updated_at"] = parse_datetime(values["updated_at"])
+    txn = Transaction.from_db(None, FIELDS, [values[name] for name in FIELDS])
+    txn.sender_email = row["sender_email"]
+    txn.is_archived = True
+    return txn
+
+
+def _read_block(files, block):
+    name = block.segment.name
+    if name not in files:
+        files[name] = open(segment_path(name), "rb")
+    segment = files[name]
+    segment.seek(block.offset)
+    data = zlib.decompress(segment.read(block.length)).decode()
+    return [_transaction(json.loads(line)) for line in data.split("\n")]
+
+
+def _merged(blocks, newest_first):
+    """
+    The transactions of blocks in (created_at, id) order. blocks must come
+    ordered by their first row in that order, and a block is only opened once
+    the rows already open can't all come before it.
+    """
+    sign = -1 if newest_first else 1
+
+    def key(txn):
+        return (sign * _micros(txn.created_at), sign * txn.pk)
+
+    def bound(block):
+        edge = block.newest if newest_first else block.oldest
+        return (sign * _micros(edge), float("-inf"))
+
+    def push(rows):
+        for txn in rows:
+            heapq.heappush(heap, (key(txn), next(tiebreak), txn, rows))
+            break
+
+    heap = []
+    tiebreak = itertools.count()
+    blocks = iter(blocks)
+    block = next(blocks, None)
+    with ExitStack() as stack:
+        files = {}
+        stack.callback(lambda: [f.close() for f in files.values()])
+        while heap or block is not None:
+            while block is not None and (not heap or bound(block) <= heap[0][0]):
+                rows = _read_block(files, block)
+                push(iter(rows if newest_first else reversed(rows)))
+                block = next(blocks, None)
+            _, _, txn, rows = heapq.heappop(heap)
+            yield txn
+            push(rows)
+
+
+class ArchivedHistory:
+    """A user's archived transactions, as a branch of keyset_page."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def after(self, cursor, limit):
+        """Up to limit transactions after cursor, newest first."""
+        blocks = ArchiveBlock.objects.filter(user=self.user).select_related("segment")
+        if cursor is not None:
+            blocks = blocks.filter(oldest__lte=cursor[0])
+        rows = _merged(blocks.order_by("-newest").iterator(), newest_first=True)
+        if cursor is not None:
+            created_at, pk = cursor
+            rows = (
+                txn
+                for txn in rows
+                if txn.created_at < created_at
+                or (txn.created_at == created_at and txn.pk < pk)
+            )
+        return list(itertools.islice(rows, limit))
+
+
+def archived_transactions(user):
+    """Every archived transaction of user, oldest first, streamed block by block."""
+    blocks = ArchiveBlock.objects.filter(user=user).select_related("segment")
+    return _merged(blocks.order_by("oldest").iterator(), newest_first=False)
+
+
+def _candidates(cutoff, segment_size):
+    live_keys = IdempotencyKey.objects.filter(
+        transaction=OuterRef("pk"),
+        created_at__gte=timezone.now()
+        - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    )
+    schedules = ScheduledTransfer.objects.filter(last_transaction=OuterRef("pk"))
+    return (
+        Transaction.objects.filter(
+            transaction_status=Transaction.TransactionStatus.COMPLETED,
+            created_at__lt=cutoff,
+        )
+        .exclude(Exists(live_keys))
+        .exclude(Exists(schedules))
+        .order_by("created_at", "pk")
+        .values(*FIELDS, "sender__email")[:segment_size]
+    )
+
+
+def _write_segment(rows):
+    """Write rows to a new segment file, returns the segment and its blocks unsaved."""
+    by_user = defaultdict(list)
+    for row in rows:
+        row["sender_email"] = row.pop("sender__email")
+        by_user[row["sender_id"]].append(row)
+        if row["recipient_id"] not in (None, row["sender_id"]):
+            by_user[row["recipient_id"]].append(row)
+
+    first = rows[0]
+    name = f"segment-{first['created_at']:%Y%m%d%H%M%S}-{first['id']}.seg"
+    segment = ArchiveSegment(
+        name=name,
+        rows=len(rows),
+        oldest=rows[0]["created_at"],
+        newest=rows[-1]["created_at"],
+    )
+    blocks = []
+    os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+    path = segment_path(name)
+    with open(path + ".tmp", "wb") as output:
+        for user_id, user_rows in by_user.items():
+            user_rows.reverse()
+            data = _encode(user_rows)
+            blocks.append(
+                ArchiveBlock(
+                    user_id=user_id,
+                    offset=output.tell(),
+                    length=len(data),
+                    rows=len(user_rows),
+                    oldest=user_rows[-1]["created_at"],
+                    newest=user_rows[0]["created_at"],
+                )
+            )
+            output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(path + ".tmp", path)
+    return segment, blocks
+
+
+def _segment_ids(segment):
+    ids = set()
+    with open(segment_path(segment.name), "rb") as source:
+        for block in segment.blocks.order_by("offset"):
+            source.seek(block.offset)
+            for line in zlib.decompress(source.read(block.length)).split(b"\n"):
+                ids.add(json.loads(line)["id"])
+    return sorted(ids)
+
+
+def _seal(segment, chunk_size):
+    """Delete the transactions of segment from the table, chunk by chunk."""
+    ids = _segment_ids(segment)
+    for i in range(0, len(ids), chunk_size):
+        with transaction.atomic():
+            Transaction.objects.filter(pk__in=ids[i : i + chunk_size]).delete()
+    segment.is_sealed = True
+    segment.save(update_fields=["is_sealed"])
+
+
+def archive_transactions(cutoff, segment_size=50_000, chunk_size=2000):
+    """
+    Archive the completed transactions created before cutoff. Yields the
+    number of segments and rows archived so far after every segment.
+    """
+    for segment in ArchiveSegment.objects.filter(is_sealed=False):
+        _seal(segment, chunk_size)
+
+    segments = archived = 0
+    while True:
+        rows = list(_candidates(cutoff, segment_size).iterator(chunk_size=chunk_size))
+        if not rows:
+            return
+        segment, blocks = _write_segment(rows)
+        with transaction.atomic():
+            segment.save()
+            for block in blocks:
+                block.segment = segment
+            ArchiveBlock.objects.bulk_create(blocks, batch_size=2000)
+        _seal(segment, chunk_size)
+
+        segments += 1
+        archived += len(rows)
+        yield segments, archived
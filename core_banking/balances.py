@@ -0,0 +1,87 @@
+"""
+Balance mutation service.
+
+Every change to a cached balance is one UPDATE computed by the database,
+``balance = balance - x WHERE balance >= x`` for a debit and
+``balance = balance + x`` for a credit. Nothing is read into python first and
+only the balance column is written, so concurrent transfers cannot lose each
+other's updates and no row is held longer than a single statement.
+Holders with balance_shards take their credits on shard rows, see shards.py.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Value, When
+
+from . import shards
+from .models import BankAccount, Wallet
+from .summaries import holder_user_id, invalidate_balance_summary
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+INSUFFICIENT_FUNDS_MESSAGES = {
+    Wallet: "You don't have enough funds in your wallet , you wallet balance is {balance}",
+    BankAccount: "you don't have enough funds in your bank account, your bank account balance is {balance}",
+}
+
+
+def _sync(holder, balance):
+    # mirror the new value on the instance the caller holds, it may already be
+    # stale under concurrency but matches what a single request just did
+    holder.balance = balance
+
+
+def debit(holder, amount):
+    """
+    Take amount from holder only if it has enough funds.
+    Raises InsufficientFunds when the guarded UPDATE matched no row.
+    """
+    model = type(holder)
+    guarded = model.objects.filter(pk=holder.pk, balance__gte=amount)
+    if guarded.update(balance=F("balance") - amount):
+        _sync(holder, Decimal(str(holder.balance)) - amount)
+    elif not (holder.balance_shards and _debit_sharded(holder, amount, guarded)):
+        # only the failure path pays for a read, to report the balance
+        balance = shards.current_balance(holder)
+        if not holder.balance_shards:
+            _sync(holder, balance)
+        raise InsufficientFunds(
+            INSUFFICIENT_FUNDS_MESSAGES[model].format(balance=balance)
+        )
+    invalidate_balance_summary(holder_user_id(holder))
+
+
+def _debit_sharded(holder, amount, guarded):
+    if shards.debit_shard(holder, amount):
+        return True
+    # the money is spread over several shards, gather it and retry
+    shards.fold_shards(holder)
+    return bool(guarded.update(balance=F("balance") - amount))
+
+
+def credit(holder, amount):
+    """Add amount to holder."""
+    # a shard count the shard rows don't match (yet) credits the holder row
+    if not (holder.balance_shards and shards.credit_shard(holder, amount)):
+        type(holder).objects.filter(pk=holder.pk).update(balance=F("balance") + amount)
+        _sync(holder, Decimal(str(holder.balance)) + amount)
+    invalidate_balance_summary(holder_user_id(holder))
+
+
+def credit_many(model, amounts, batch_size=500):
+    """
+    Credit many rows of model at once, amounts maps pk -> amount.
+    Each batch is one ``balance = balance + CASE pk WHEN ... END`` UPDATE, so
+    it stays a database-side increment like credit().
+    """
+    pks = list(amounts)
+    for i in range(0, len(pks), batch_size):
+        batch = pks[i : i + batch_size]
+        increment = Case(
+            *(When(pk=pk, then=Value(amounts[pk])) for pk in batch),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        model.objects.filter(pk__in=batch).update(balance=F("balance") + increment)
@@ -0,0 +1,97 @@
+"""
+Helpers shared by the benchmark_* management commands.
+"""
+
+import os
+import resource
+import statistics
+import uuid
+from decimal import Decimal
+
+from .models import Transaction, User
+from .receipts import get_receipt_generator
+
+
+def throwaway_user(label, **extra_fields):
+    """A user with a unique email, benchmarks roll back or delete them afterwards."""
+    return User.objects.create_user(
+        f"bench-{label}-{uuid.uuid4().hex[:8]}@example.com",
+        first_name="Bench",
+        last_name=label,
+        **extra_fields,
+    )
+
+
+def fill_transactions(user, rows, batch_size=5000):
+    """
+    Insert rows completed transactions sent by user without moving any money,
+    only the size of the table matters to the benchmarks.
+    """
+    generator = get_receipt_generator()
+    for start in range(0, rows, batch_size):
+        Transaction.objects.bulk_create(
+            Transaction(
+                sender=user,
+                transaction_type=Transaction.TransactionType.WALLET,
+                transaction_status=Transaction.TransactionStatus.COMPLETED,
+                amount=Decimal("1.00"),
+                receipt=generator(),
+            )
+            for _ in range(min(batch_size, rows - start))
+        )
+    return rows
+
+
+def rss_mb():
+    """Current resident memory of this process in MB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # no procfs, fall back to the peak which is all getrusage offers
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(len(sorted_values) * pct / 100)) - 1)
+    return sorted_values[index]
+
+
+def latency_stats(timings, elapsed, errors=0):
+    """Throughput and latency of one benchmarked operation, ready for JSON."""
+    timings = sorted(timings)
+    return {
+        "count": len(timings),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(timings) * 1e3, 3) if timings else 0.0,
+        "p50_ms": round(percentile(timings, 50) * 1e3, 3),
+        "p99_ms": round(percentile(timings, 99) * 1e3, 3),
+    }
+
+
+def regressions(baseline, current, tolerance):
+    """
+    Compare two benchmark_transfers reports, yield a message for every
+    operation whose throughput dropped or p99 grew by more than tolerance
+    (a fraction, 0.2 for 20%).
+    """
+    for scenario, operations in current["scenarios"].items():
+        for name, stats in operations.items():
+            before = baseline.get("scenarios", {}).get(scenario, {}).get(name)
+            if not before:
+                continue
+            if stats["per_second"] < before["per_second"] * (1 - tolerance):
+                yield (
+                    f"{scenario}/{name}: {stats['per_second']}/s, "
+                    f"was {before['per_second']}/s"
+                )
+            if stats["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+                yield (
+                    f"{scenario}/{name}: p99 {stats['p99_ms']}ms, "
+                    f"was {before['p99_ms']}ms"
+                )
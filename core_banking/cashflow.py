@@ -0,0 +1,259 @@
+"""
+Monthly cash-flow aggregates.
+
+MonthlyCashFlow keeps, per wallet or bank account, month and category, the
+money that came in, the money that went out and the number of ledger
+entries behind them. Every ledger entry ledger.py writes is added to its row
+in the same atomic block, with F() increments, so a dashboard or a
+statement reads a few rows per month instead of scanning the transactions.
+A hot holder with balance_shards = N (see shards.py) would queue all its
+postings on one row again, so its postings go to one of N slot rows at
+random instead. Readers always sum the rows of a month and category.
+
+Categories are the transaction category, "Transfer" for transfers and
+"Opening balance" for the money an account was opened with, so the rows of
+one holder add up to its ledger balance. rebuild_cash_flows recomputes them
+from the ledger, see the rebuild_cash_flows command, except the months of
+archived transactions: their ledger entries no longer say what category they
+were, so those rows are kept as they are.
+"""
+
+import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, Count, DateField, F, Max, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import HOLDER_FIELDS, ArchiveSegment, LedgerEntry, MonthlyCashFlow
+from .summaries import holder_user_id
+
+TRANSFER = "Transfer"
+OPENING_BALANCE = "Opening balance"
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+USER_FIELDS = {"wallet": "wallet__user", "bank_account": "bank_account__owner"}
+
+
+def month_of(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def entry_category(entry):
+    if entry.transaction_id is None:
+        return OPENING_BALANCE
+    return entry.transaction.transaction_category or TRANSFER
+
+
+def _slot(holder):
+    return random.randrange(holder.balance_shards) if holder.balance_shards else 0
+
+
+def add_entries(entries, new_holders=False):
+    """
+    Add freshly saved ledger entries to their monthly rows. new_holders says
+    none of the holders has rows yet, so they are inserted without looking.
+    """
+    deltas = defaultdict(lambda: [ZERO, ZERO, 0])
+    for entry in entries:
+        holder = entry.wallet or entry.bank_account
+        if holder is None:
+            continue
+        key = (
+            HOLDER_FIELDS[type(holder)],
+            holder.pk,
+            holder_user_id(holder),
+            month_of(entry.created_at),
+            entry_category(entry),
+            _slot(holder),
+        )
+        delta = deltas[key]
+        if entry.entry_type == LedgerEntry.EntryType.CREDIT:
+            delta[0] += entry.amount
+        else:
+            delta[1] += entry.amount
+        delta[2] += 1
+    if new_holders:
+        MonthlyCashFlow.objects.bulk_create(
+            (_row(key, *delta) for key, delta in deltas.items()), batch_size=2000
+        )
+    else:
+        _apply(deltas)
+
+
+def _row(key, inflow, outflow, count):
+    field, pk, user_id, month, category, slot = key
+    return MonthlyCashFlow(
+        user_id=user_id,
+        month=month,
+        category=category,
+        slot=slot,
+        inflow=inflow,
+        outflow=outflow,
+        entries=count,
+        **{f"{field}_id": pk},
+    )
+
+
+def _apply(deltas):
+    missing = {}
+    for key, (inflow, outflow, count) in deltas.items():
+        field, pk, _, month, category, slot = key
+        updated = MonthlyCashFlow.objects.filter(
+            **{f"{field}_id": pk}, month=month, category=category, slot=slot
+        ).update(
+            inflow=F("inflow") + inflow,
+            outflow=F("outflow") + outflow,
+            entries=F("entries") + count,
+        )
+        if not updated:
+            missing[key] = _row(key, inflow, outflow, count)
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            MonthlyCashFlow.objects.bulk_create(missing.values())
+    except IntegrityError:
+        # a concurrent posting created some of the rows first
+        _apply({key: deltas[key] for key in missing})
+
+
+def _cents(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def monthly_cash_flow(user, months=12):
+    """[{month, inflow, outflow}] of all of user's accounts, newest first."""
+    rows = (
+        MonthlyCashFlow.objects.filter(user=user)
+        .values("month")
+        .annotate(inflow=Sum("inflow"), outflow=Sum("outflow"))
+        .order_by("-month")[:months]
+    )
+    return [
+        {
+            "month": row["month"],
+            "inflow": _cents(row["inflow"]),
+            "outflow": _cents(row["outflow"]),
+        }
+        for row in rows
+    ]
+
+
+def holder_cash_flow(holder, start, end=None):
+    """(inflow, outflow) of holder for the months from start until before end."""
+    rows = MonthlyCashFlow.objects.filter(
+        **{HOLDER_FIELDS[type(holder)]: holder}, month__gte=start
+    )
+    if end is not None:
+        rows = rows.filter(month__lt=end)
+    totals = rows.aggregate(inflow=Sum("inflow"), outflow=Sum("outflow"))
+    return _cents(totals["inflow"]), _cents(totals["outflow"])
+
+
+def balance_before(holder, month):
+    """Balance of holder when month began, from its monthly rows."""
+    totals = MonthlyCashFlow.objects.filter(
+        **{HOLDER_FIELDS[type(holder)]: holder}, month__lt=month
+    ).aggregate(inflow=Sum("inflow"), outflow=Sum("outflow"))
+    return _cents(totals["inflow"]) - _cents(totals["outflow"])
+
+
+def archived_through():
+    """The last month with archived transactions (see archive.py), or None."""
+    newest = ArchiveSegment.objects.aggregate(newest=Max("newest"))["newest"]
+    return month_of(newest) if newest else None
+
+
+def _ledger_rows(field, pks, frozen=None):
+    """The monthly rows of the holders pks after month frozen, computed from the ledger."""
+    entries = LedgerEntry.objects.filter(**{f"{field}__in": pks})
+    if frozen is not None:
+        next_month = (frozen + timedelta(days=32)).replace(day=1)
+        entries = entries.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(next_month, time()))
+        )
+    return (
+        entries.annotate(
+            month=TruncMonth("created_at", output_field=DateField()),
+            category=Case(
+                When(transaction__isnull=True, then=Value(OPENING_BALANCE)),
+                default=Coalesce("transaction__transaction_category", Value(TRANSFER)),
+            ),
+        )
+        .values(field, USER_FIELDS[field], "month", "category")
+        .annotate(
+            inflow=Sum(
+                Case(
+                    When(entry_type=LedgerEntry.EntryType.CREDIT, then=F("amount")),
+                    default=Value(ZERO),
+                )
+            ),
+            outflow=Sum(
+                Case(
+                    When(entry_type=LedgerEntry.EntryType.DEBIT, then=F("amount")),
+                    default=Value(ZERO),
+                )
+            ),
+            entries=Count("pk"),
+        )
+        .order_by()
+    )
+
+
+def rebuild_chunk(field, first_pk, last_pk, frozen=None):
+    """
+    Recompute the rows of the holders first_pk..last_pk after month frozen,
+    returns how many were written.
+    """
+    model = next(m for m, f in HOLDER_FIELDS.items() if f == field)
+    with transaction.atomic():
+        # postings to these holders update their balance row first, so they
+        # wait until the chunk is rebuilt
+        pks = list(
+            model.objects.select_for_update()
+            .filter(pk__gte=first_pk, pk__lte=last_pk)
+            .values_list("pk", flat=True)
+        )
+        rows = [
+            MonthlyCashFlow(
+                user_id=row[USER_FIELDS[field]],
+                month=row["month"],
+                category=row["category"],
+                inflow=_cents(row["inflow"]),
+                outflow=_cents(row["outflow"]),
+                entries=row["entries"],
+                **{f"{field}_id": row[field]},
+            )
+            for row in _ledger_rows(field, pks, frozen)
+        ]
+        stale = MonthlyCashFlow.objects.filter(**{f"{field}__in": pks})
+        if frozen is not None:
+            stale = stale.filter(month__gt=frozen)
+        stale.delete()
+        MonthlyCashFlow.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def rebuild_cash_flows(processes=None, chunk_size=1000):
+    """
+    Recompute every monthly row from the ledger, chunk_size holders per job
+    across a process pool. Returns the number of rows written.
+    """
+    frozen = archived_through()
+    jobs = []
+    for model, field in HOLDER_FIELDS.items():
+        pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        for i in range(0, len(pks), chunk_size):
+            chunk = pks[i : i + chunk_size]
+            jobs.append((field, chunk[0], chunk[-1], frozen))
+
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        return sum(pool.map(rebuild_chunk, *zip(*jobs))) if jobs else 0
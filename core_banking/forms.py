@@ -2,8 +2,12 @@ from decimal import Decimal
 
 from django import forms
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
+from .account_numbers import is_valid_account_number
+from .idempotency import MAX_KEY_LENGTH, new_idempotency_key
 from .models import BankAccount, Transaction
+from .recipients import resolve_recipient
 
 
 class BankAccountForm(forms.ModelForm):
@@ -13,6 +17,14 @@ class BankAccountForm(forms.ModelForm):
 
 
 class TransactionForm(forms.ModelForm):
+    # a fresh key per rendered form, a resubmit of the same page reuses it
+    idempotency_key = forms.CharField(
+        required=False,
+        max_length=MAX_KEY_LENGTH,
+        widget=forms.HiddenInput,
+        initial=new_idempotency_key,
+    )
+
     class Meta:
         model = Transaction
         fields = [
@@ -64,28 +76,49 @@ class TransactionForm(forms.ModelForm):
             raise forms.ValidationError("Amount must be greater than 0.00")
         return amount
 
+    def _resolve_recipient(self, transaction_type, recipient_address):
+        """
+        Look the recipient up once and hand it to the transaction, which then
+        uses it instead of querying again. See recipients.py
+        """
+        holder = resolve_recipient(transaction_type, recipient_address)
+        self.instance.remember_recipient(transaction_type, recipient_address, holder)
+        return holder
+
+    def _recipient_error(self, transaction_type, recipient_address):
+        """Why recipient_address can't receive this transfer, None if it can."""
+        if transaction_type == Transaction.TransactionType.WALLET:
+            if not recipient_address:
+                return None
+            if "@" not in recipient_address:
+                return "Please enter a valid email address."
+            if not self._resolve_recipient(transaction_type, recipient_address):
+                return "No user with this email address."
+            return None
+
+        if not recipient_address:
+            return "Please enter a valid bank account number."
+        if not is_valid_account_number(recipient_address):
+            # caught by the check digit, no need to ask the database
+            return "This bank account number is not valid, please check it for typos."
+        if not self._resolve_recipient(transaction_type, recipient_address):
+            return "Bank account does not exist."
+        return None
+
     def clean(self):
         cleaned_data = super().clean()
         transaction_type = cleaned_data.get("transaction_type")
         recipient_address = cleaned_data.get("recipient_address")
         sender_bank_account = cleaned_data.get("sender_bank_account")
 
-        if transaction_type == Transaction.TransactionType.WALLET:
-            if recipient_address and "@" not in recipient_address:
-                self.add_error(  # when to use validationerror and when to use add_eeror
-                    "recipient_address", "Please enter a valid email address."
-                )
-        elif transaction_type == Transaction.TransactionType.BANK_ACCOUNT:
-            if not recipient_address:
-                self.add_error(
-                    "recipient_address", "Please enter a valid bank account number."
-                )
-            else:
-                exists = BankAccount.objects.filter(
-                    account_number=recipient_address
-                ).exists()
-                if not exists:
-                    self.add_error("recipient_address", "Bank account does not exist.")
+        if transaction_type in (
+            Transaction.TransactionType.WALLET,
+            Transaction.TransactionType.BANK_ACCOUNT,
+        ):
+            error = self._recipient_error(transaction_type, recipient_address)
+            if error:
+                self.add_error("recipient_address", error)
+        if transaction_type == Transaction.TransactionType.BANK_ACCOUNT:
             if not sender_bank_account:
                 self.add_error(
                     "sender_bank_account", "Please select a bank account to send from."
@@ -103,6 +136,14 @@ class TransactionForm(forms.ModelForm):
 
 
 class DepositWithdrawForm(forms.ModelForm):
+    # a fresh key per rendered form, a resubmit of the same page reuses it
+    idempotency_key = forms.CharField(
+        required=False,
+        max_length=MAX_KEY_LENGTH,
+        widget=forms.HiddenInput,
+        initial=new_idempotency_key,
+    )
+
     class Meta:
         model = Transaction
         fields = [
@@ -165,3 +206,64 @@ class DepositWithdrawForm(forms.ModelForm):
                 self.add_error("sender_bank_account", "Select a Bank Account")
 
         return cleaned_data
+
+
+class TransactionExportForm(forms.Form):
+    TRANSFER = "Transfer"
+
+    format = forms.ChoiceField(
+        choices=[("csv", "CSV"), ("ndjson", "NDJSON")], required=False
+    )
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    transaction_type = forms.ChoiceField(
+        choices=[("", "All")] + Transaction.TransactionType.choices, required=False
+    )
+    # transfers are the transactions without a category
+    transaction_category = forms.ChoiceField(
+        choices=[("", "All"), (TRANSFER, TRANSFER)]
+        + Transaction.TransactionCategory.choices,
+        required=False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("start")
+        end = cleaned_data.get("end")
+        if start and end and start > end:
+            raise ValidationError("Start date must be before end date")
+        return cleaned_data
+
+    def filter(self, queryset):
+        """Apply the cleaned filters to queryset."""
+        data = self.cleaned_data
+        if data.get("start"):
+            queryset = queryset.filter(created_at__date__gte=data["start"])
+        if data.get("end"):
+            queryset = queryset.filter(created_at__date__lte=data["end"])
+        if data.get("transaction_type"):
+            queryset = queryset.filter(transaction_type=data["transaction_type"])
+        category = data.get("transaction_category")
+        if category == self.TRANSFER:
+            queryset = queryset.filter(transaction_category__isnull=True)
+        elif category:
+            queryset = queryset.filter(transaction_category=category)
+        return queryset
+
+    def accepts(self, txn):
+        """Whether the cleaned filters keep txn, for archived transactions."""
+        data = self.cleaned_data
+        day = timezone.localtime(txn.created_at).date()
+        if data.get("start") and day < data["start"]:
+            return False
+        if data.get("end") and day > data["end"]:
+            return False
+        if (
+            data.get("transaction_type")
+            and txn.transaction_type != data["transaction_type"]
+        ):
+            return False
+        category = data.get("transaction_category")
+        if category == self.TRANSFER:
+            return txn.transaction_category is None
+        return not category or txn.transaction_category == category
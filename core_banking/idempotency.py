@@ -0,0 +1,140 @@
+"""
+Idempotency keys for money-moving requests.
+
+A client sends a key with a transfer, deposit or withdrawal, either as the
+Idempotency-Key header or the hidden idempotency_key form field. The first
+request with a key claims it in an IdempotencyKey row, unique per user, in
+the same database transaction that saves the Transaction, together with a
+hash of what it asked for. A retry with the same key hits the unique index
+instead, and gets the original transaction back without the transfer running
+again. A retry that races the first request waits on that index until the
+first one commits. A key reused for a different type, amount, recipient or
+source is refused with ValueError.
+
+A retry is answered before the velocity limits are checked, and those are
+checked before the write transaction opens.
+
+Only completed transactions keep their key. A failed one (insufficient
+funds) rolls its claim back with everything else, so it may be retried.
+Recent results are also cached for IDEMPOTENCY_CACHE_TIMEOUT seconds, so
+hot retries skip the database. Keys are dropped after IDEMPOTENCY_KEY_TTL by
+the expire_idempotency_keys command.
+"""
+
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .instrumentation import record_cache_lookup
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = 64
+HEADER = "Idempotency-Key"
+
+
+@dataclass
+class IdempotentResult:
+    transaction_id: int
+    receipt: str
+    replayed: bool = False
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def request_key(request, form):
+    """The key of a request, the header wins over the form field."""
+    return request.headers.get(HEADER) or form.cleaned_data.get("idempotency_key")
+
+
+def _cache_key(user_id, key):
+    # v2 entries carry the fingerprint
+    return f"idempotency:v2:{user_id}:{key}"
+
+
+def fingerprint(txn):
+    """Hash of what txn asks for, a retry with the same key must match it."""
+    request = [
+        txn.transaction_type,
+        txn.transaction_category,
+        str(txn.amount),
+        txn.recipient_address,
+        txn.sender_bank_account_id,
+    ]
+    return hashlib.sha256(json.dumps(request, default=str).encode()).hexdigest()
+
+
+def _replayed(transaction_id, receipt, stored, expected):
+    if stored and stored != expected:
+        raise ValueError(
+            "This idempotency key was already used for a different request"
+        )
+    return IdempotentResult(transaction_id, receipt, replayed=True)
+
+
+def _replay(user_id, key, expected):
+    """The result saved under key, None if the key is unused."""
+    row = (
+        IdempotencyKey.objects.filter(user_id=user_id, key=key)
+        .values_list("transaction_id", "transaction__receipt", "fingerprint")
+        .first()
+    )
+    return _replayed(*row, expected) if row else None
+
+
+def save_once(txn, key):
+    """
+    Save txn unless its sender already used key, in which case nothing is
+    saved and the original transaction is returned. Raises ValueError if key
+    was used for a different request, and what txn.save() raises.
+    """
+    if not key:
+        txn.save()
+        return IdempotentResult(txn.pk, txn.receipt)
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(
+            f"The idempotency key can be at most {MAX_KEY_LENGTH} characters long"
+        )
+
+    expected = fingerprint(txn)
+    cache_key = _cache_key(txn.sender_id, key)
+    cached = cache.get(cache_key)
+    record_cache_lookup(cached is not None)
+    if cached is not None:
+        return _replayed(*cached, expected)
+    # a retry of a finished request is answered before the limits are checked
+    result = _replay(txn.sender_id, key, expected)
+    if result is not None:
+        return result
+    # before the write transaction opens, see Transaction.check_velocity
+    txn.check_velocity()
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                claim = IdempotencyKey.objects.create(
+                    user_id=txn.sender_id, key=key, fingerprint=expected
+                )
+        except IntegrityError:
+            # a concurrent request with the same key committed first
+            result = _replay(txn.sender_id, key, expected)
+        else:
+            txn.save()
+            claim.transaction = txn
+            claim.save(update_fields=["transaction"])
+            result = IdempotentResult(txn.pk, txn.receipt)
+
+    transaction.on_commit(
+        lambda: cache.set(
+            cache_key,
+            (result.transaction_id, result.receipt, expected),
+            settings.IDEMPOTENCY_CACHE_TIMEOUT,
+        )
+    )
+    return result
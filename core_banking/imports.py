@@ -0,0 +1,321 @@
+"""
+Bulk import of a legacy book: users, bank accounts and historical transactions.
+
+Records are streamed from CSV or NDJSON and written with bulk_create in
+batches, each committed on its own, so the normal per-row paths are skipped:
+
+- users get their wallet in the same batch, the post_save signal never runs;
+- accounts keep the number they had, missing ones come from one allocator
+  reservation per batch;
+- transactions are inserted as history with the receipt they had. No money
+  moves and no ledger entries are written.
+
+The imported wallet and account balances are the truth. Each one is backed by
+an opening balance ledger entry, so the ledger, the monthly cash flow and the
+reconcile command agree with them from the start.
+
+Foreign key checks are disabled while loading where the backend allows it
+(SQLite, MySQL; PostgreSQL defers them to each commit anyway) and run once
+over the imported tables at the end, like loaddata does.
+"""
+
+import csv
+import json
+from contextlib import contextmanager
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .account_numbers import get_account_number_allocator, is_valid_account_number
+from .ledger import post_opening_balances
+from .models import BankAccount, Transaction, User, Wallet
+from .receipts import get_receipt_generator
+
+MAX_AMOUNT = Decimal("99999999.99")
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+def read_records(stream, fmt):
+    """Yield the records of stream as dicts, fmt is "csv" or "ndjson"."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _text(record, name):
+    value = record.get(name)
+    return str(value).strip() if value not in (None, "") else ""
+
+
+def _flag(record, name, default):
+    value = _text(record, name)
+    return value.lower() in TRUE_VALUES if value else default
+
+
+def _amount(record, name, minimum):
+    raw = _text(record, name) or "0"
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        raise ValueError(f"{name} {raw!r} is not an amount")
+    if not amount.is_finite() or amount != amount.quantize(Decimal("0.01")):
+        raise ValueError(f"{name} {raw!r} is not an amount")
+    if not minimum <= amount <= MAX_AMOUNT:
+        raise ValueError(f"{name} {raw} is out of range")
+    return amount
+
+
+def _moment(record, name):
+    raw = _text(record, name)
+    if not raw:
+        return timezone.now()
+    moment = parse_datetime(raw)
+    if moment is None:
+        day = parse_date(raw)
+        if day is None:
+            raise ValueError(f"{name} {raw!r} is not a date")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _choice(record, name, choices, default):
+    value = _text(record, name) or default
+    if value and value not in choices.values:
+        raise ValueError(f"{name} {value!r} is not one of {', '.join(choices.values)}")
+    return value or None
+
+
+@contextmanager
+def preserve_timestamps(model, *names):
+    """Let bulk_create keep the given auto_now / auto_now_add values."""
+    fields = [model._meta.get_field(name) for name in names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _ensure_pks(objs, model, key):
+    # bulk_create only sets primary keys on backends that can return them
+    missing = [obj for obj in objs if obj.pk is None]
+    if missing:
+        pks = dict(
+            model.objects.filter(
+                **{f"{key}__in": [getattr(obj, key) for obj in missing]}
+            ).values_list(key, "pk")
+        )
+        for obj in missing:
+            obj.pk = pks[getattr(obj, key)]
+
+
+def _users_by_email(emails):
+    return dict(
+        User.objects.filter(email__in=set(emails) - {""}).values_list("email", "pk")
+    )
+
+
+def _user_id(users, record, name, required=True):
+    email = User.objects.normalize_email(_text(record, name))
+    if not email:
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    if email not in users:
+        raise ValueError(f"no user with email {email}")
+    return users[email]
+
+
+def import_users(records):
+    """
+    Columns: email, first_name, last_name, password (a Django hash, unusable
+    when empty), phone_number, national_id, address, date_of_birth,
+    is_active, email_confirmed, date_joined, wallet_balance.
+    """
+    users, wallet_balances = [], []
+    for number, record in records:
+        try:
+            email = User.objects.normalize_email(_text(record, "email"))
+            for name in ("email", "first_name", "last_name"):
+                if not _text(record, name):
+                    raise ValueError(f"{name} is required")
+            date_of_birth = _text(record, "date_of_birth")
+            users.append(
+                User(
+                    email=email,
+                    first_name=_text(record, "first_name"),
+                    last_name=_text(record, "last_name"),
+                    password=_text(record, "password") or make_password(None),
+                    phone_number=_text(record, "phone_number") or None,
+                    national_id=_text(record, "national_id") or None,
+                    address=_text(record, "address") or None,
+                    date_of_birth=parse_date(date_of_birth) if date_of_birth else None,
+                    is_active=_flag(record, "is_active", True),
+                    email_confirmed=_flag(record, "email_confirmed", True),
+                    date_joined=_moment(record, "date_joined"),
+                )
+            )
+            wallet_balances.append(_amount(record, "wallet_balance", Decimal("0")))
+        except ValueError as e:
+            raise ValueError(f"Record {number}: {e}")
+
+    with transaction.atomic(), preserve_timestamps(User, "date_joined"):
+        User.objects.bulk_create(users)
+        _ensure_pks(users, User, "email")
+        wallets = [
+            Wallet(user=user, balance=balance)
+            for user, balance in zip(users, wallet_balances)
+        ]
+        Wallet.objects.bulk_create(wallets)
+        _ensure_pks(wallets, Wallet, "user_id")
+        post_opening_balances(wallets)
+    return len(users)
+
+
+def import_accounts(records):
+    """
+    Columns: owner (email), account_number (allocated when empty),
+    account_type, balance, is_active, created_at.
+    """
+    owners = _users_by_email(
+        User.objects.normalize_email(_text(record, "owner")) for _, record in records
+    )
+    accounts = []
+    for number, record in records:
+        try:
+            account_number = _text(record, "account_number")
+            if account_number and not is_valid_account_number(account_number):
+                raise ValueError(f"{account_number!r} is not a valid account number")
+            accounts.append(
+                BankAccount(
+                    owner_id=_user_id(owners, record, "owner"),
+                    account_number=account_number,
+                    account_type=_choice(
+                        record,
+                        "account_type",
+                        BankAccount.AccountChoices,
+                        BankAccount.AccountChoices.SAVINGS,
+                    ),
+                    balance=_amount(record, "balance", Decimal("0")),
+                    is_active=_flag(record, "is_active", True),
+                    created_at=_moment(record, "created_at"),
+                )
+            )
+        except ValueError as e:
+            raise ValueError(f"Record {number}: {e}")
+
+    # reserved before the write transaction opens, see account_numbers.py
+    unnumbered = [account for account in accounts if not account.account_number]
+    numbers = get_account_number_allocator().take(len(unnumbered))
+    for account, account_number in zip(unnumbered, numbers):
+        account.account_number = account_number
+
+    with transaction.atomic(), preserve_timestamps(BankAccount, "created_at"):
+        BankAccount.objects.bulk_create(accounts)
+        _ensure_pks(accounts, BankAccount, "account_number")
+        post_opening_balances(accounts)
+    return len(accounts)
+
+
+def import_transactions(records):
+    """
+    Columns: sender (email), recipient (email), recipient_address,
+    sender_account (number), transaction_type, transaction_category,
+    transaction_status (Completed when empty), amount, receipt (generated
+    when empty), created_at.
+    """
+    users = _users_by_email(
+        User.objects.normalize_email(_text(record, name))
+        for _, record in records
+        for name in ("sender", "recipient")
+    )
+    accounts = dict(
+        BankAccount.objects.filter(
+            account_number__in={_text(r, "sender_account") for _, r in records} - {""}
+        ).values_list("account_number", "pk")
+    )
+    generator = get_receipt_generator()
+    txns = []
+    for number, record in records:
+        try:
+            sender_account = _text(record, "sender_account")
+            if sender_account and sender_account not in accounts:
+                raise ValueError(f"no bank account {sender_account}")
+            created_at = _moment(record, "created_at")
+            txns.append(
+                Transaction(
+                    sender_id=_user_id(users, record, "sender"),
+                    recipient_id=_user_id(users, record, "recipient", required=False),
+                    recipient_address=_text(record, "recipient_address") or None,
+                    sender_bank_account_id=accounts.get(sender_account),
+                    transaction_type=_choice(
+                        record, "transaction_type", Transaction.TransactionType, None
+                    ),
+                    transaction_category=_choice(
+                        record,
+                        "transaction_category",
+                        Transaction.TransactionCategory,
+                        None,
+                    ),
+                    transaction_status=_choice(
+                        record,
+                        "transaction_status",
+                        Transaction.TransactionStatus,
+                        Transaction.TransactionStatus.COMPLETED,
+                    ),
+                    amount=_amount(record, "amount", Decimal("0.01")),
+                    receipt=_text(record, "receipt") or generator(),
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+            )
+        except ValueError as e:
+            raise ValueError(f"Record {number}: {e}")
+
+    with preserve_timestamps(Transaction, "created_at", "updated_at"):
+        Transaction.objects.bulk_create(txns)
+    return len(txns)
+
+
+IMPORTERS = {
+    "users": (import_users, [User, Wallet]),
+    "accounts": (import_accounts, [BankAccount]),
+    "transactions": (import_transactions, [Transaction]),
+}
+
+
+def import_bank_data(kind, records, batch_size=1000, skip=0):
+    """
+    Import records of kind ("users", "accounts" or "transactions") in
+    batches of batch_size, each in its own transaction, after skipping the
+    first skip records. Yields the number of records imported so far after
+    every batch. Raises ValueError, naming the record, for bad input.
+    """
+    importer, models = IMPORTERS[kind]
+    connection = connections[router.db_for_write(models[0])]
+    records = enumerate(records, 1)
+    imported = skip
+    for _ in islice(records, skip):
+        pass
+
+    with connection.constraint_checks_disabled():
+        while batch := list(islice(records, batch_size)):
+            try:
+                imported += importer(batch)
+            except IntegrityError as e:
+                raise ValueError(f"Records {batch[0][0]}-{batch[-1][0]}: {e}") from e
+            yield imported
+    connection.check_constraints(table_names=[model._meta.db_table for model in models])
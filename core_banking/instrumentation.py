@@ -0,0 +1,231 @@
+"""
+Per-request instrumentation.
+
+InstrumentationMiddleware samples INSTRUMENTATION_SAMPLE_RATE of the requests.
+For a sampled request it times every SQL query on every database connection
+and counts cache lookups (record_cache_lookup), then logs one JSON line on
+the "core_banking.instrumentation" logger and adds the request to rolling
+per-view histograms kept in memory. Unsampled requests cost one random().
+
+Queries sharing a signature (the SQL before its parameters are filled in)
+more than once in a request are reported as duplicates, usually an N+1.
+Staff read the histograms of this process at /instrumentation/.
+"""
+
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WALL_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+TOP_DUPLICATES = 10
+
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+
+_current = ContextVar("request_stats", default=None)
+
+
+def query_signature(sql):
+    # bulk lookups vary in length, IN (%s, %s, ...) is one signature
+    return _IN_LIST.sub("(...)", sql)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.signatures = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # a django execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.signatures[query_signature(sql)] += 1
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.signatures.items() if n > 1}
+
+
+def record_cache_lookup(hit):
+    """Count a cache hit or miss against the current request, if sampled."""
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th value, None for overflow."""
+        count = sum(self.counts)
+        if not count:
+            return 0
+        rank = count * pct / 100
+        seen = 0
+        for bound, bucket in zip(self.bounds, self.counts):
+            seen += bucket
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        count = sum(self.counts)
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": count,
+            "mean": round(self.total / count, 3) if count else 0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.wall_ms = Histogram(WALL_BUCKETS_MS)
+        self.db_ms = Histogram(WALL_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.duplicates = Counter()
+
+    def add(self, wall, stats):
+        self.wall_ms.add(wall * 1e3)
+        self.db_ms.add(stats.db_time * 1e3)
+        self.queries.add(stats.queries)
+        self.cache_hits += stats.cache_hits
+        self.cache_misses += stats.cache_misses
+        # how many requests repeated each signature
+        self.duplicates.update(stats.duplicates().keys())
+
+    def merge(self, other):
+        self.wall_ms.merge(other.wall_ms)
+        self.db_ms.merge(other.db_ms)
+        self.queries.merge(other.queries)
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.duplicates.update(other.duplicates)
+
+    def as_dict(self):
+        return {
+            "wall_ms": self.wall_ms.as_dict(),
+            "db_ms": self.db_ms.as_dict(),
+            "queries": self.queries.as_dict(),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "duplicate_queries": dict(self.duplicates.most_common(TOP_DUPLICATES)),
+        }
+
+
+class RollingStats:
+    """
+    Per-view stats over the last `slots` windows of `slot_seconds` each,
+    older windows are dropped as time moves on.
+    """
+
+    def __init__(self, slots=12, slot_seconds=300, clock=time.monotonic):
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        self.clock = clock
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _window(self):
+        return int(self.clock() // self.slot_seconds)
+
+    def add(self, view, wall, stats):
+        window = self._window()
+        with self._lock:
+            views = self._windows.setdefault(window, {})
+            views.setdefault(view, ViewStats()).add(wall, stats)
+            for old in [w for w in self._windows if w <= window - self.slots]:
+                del self._windows[old]
+
+    def snapshot(self):
+        oldest = self._window() - self.slots
+        merged = {}
+        with self._lock:
+            for window, views in self._windows.items():
+                if window <= oldest:
+                    continue
+                for view, view_stats in views.items():
+                    merged.setdefault(view, ViewStats()).merge(view_stats)
+        return {
+            "window_seconds": self.slots * self.slot_seconds,
+            "views": {view: merged[view].as_dict() for view in sorted(merged)},
+        }
+
+
+rolling_stats = RollingStats(
+    slots=settings.INSTRUMENTATION_SLOTS,
+    slot_seconds=settings.INSTRUMENTATION_SLOT_SECONDS,
+)
+
+
+@contextmanager
+def collect_stats():
+    """Account every query and cache lookup of the block in a RequestStats."""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all(initialized_only=False):
+                stack.enter_context(connection.execute_wrapper(stats))
+            yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_request(request, response, wall, stats):
+    """Add a finished request to the histograms and log it."""
+    match = request.resolver_match
+    view = match.view_name if match else "unresolved"
+    rolling_stats.add(view, wall, stats)
+    logger.info(
+        json.dumps(
+            {
+                "view": view,
+                "method": request.method,
+                "status": response.status_code,
+                "wall_ms": round(wall * 1e3, 3),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_time * 1e3, 3),
+                "duplicate_queries": stats.duplicates(),
+                "cache_hits": stats.cache_hits,
+                "cache_misses": stats.cache_misses,
+            }
+        )
+    )
@@ -0,0 +1,185 @@
+"""
+Posting engine for the double-entry ledger.
+
+Money never moves by editing a balance in python. A posting applies a narrow
+``balance = balance +/- x`` update to the cached projection on the Wallet /
+BankAccount row (see balances.py), appends one DEBIT and one CREDIT
+LedgerEntry and adds them to the monthly cash-flow rows (see cashflow.py).
+Because the ledger is the source of truth, the projections can be verified or
+rebuilt in bulk at any time.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, When
+
+from . import balances, cashflow
+from .models import HOLDER_FIELDS, BalanceShard, LedgerEntry
+from .shards import pending_balances
+from .summaries import holder_user_id, invalidate_balance_summary
+
+CENT = Decimal("0.01")
+
+
+def _holder_fields(holder):
+    # None is the outside world, it has no balance to project
+    if holder is None:
+        return {}
+    return {HOLDER_FIELDS[type(holder)]: holder}
+
+
+def _entries(txn, debit, credit, amount):
+    return [
+        LedgerEntry(
+            transaction=txn,
+            entry_type=LedgerEntry.EntryType.DEBIT,
+            amount=amount,
+            **_holder_fields(debit),
+        ),
+        LedgerEntry(
+            transaction=txn,
+            entry_type=LedgerEntry.EntryType.CREDIT,
+            amount=amount,
+            **_holder_fields(credit),
+        ),
+    ]
+
+
+def move_funds(debit, credit, amount):
+    """
+    Apply amount to the cached balances through the balance service.
+    The guarded debit runs first so a short balance raises InsufficientFunds
+    before anything else is written.
+    """
+    if debit is not None:
+        balances.debit(debit, amount)
+    if credit is not None:
+        balances.credit(credit, amount)
+
+
+def record_many(postings, batch_size=2000):
+    """Append the entries of many (txn, debit, credit) postings at once."""
+    entries = LedgerEntry.objects.bulk_create(
+        (
+            entry
+            for txn, debit, credit in postings
+            for entry in _entries(txn, debit, credit, txn.amount)
+        ),
+        batch_size=batch_size,
+    )
+    cashflow.add_entries(entries)
+
+
+def record_entries(txn, debit, credit):
+    """
+    Append the DEBIT/CREDIT pair for txn, which must already be saved.
+    Must run inside the same atomic block as move_funds.
+    """
+    entries = LedgerEntry.objects.bulk_create(_entries(txn, debit, credit, txn.amount))
+    cashflow.add_entries(entries)
+
+
+def post_opening_balance(holder):
+    """
+    Back the balance a holder was created with by an entry from the outside
+    world. The projection already holds the amount so it is not touched.
+    """
+    if not holder.balance:
+        return
+    entries = LedgerEntry.objects.bulk_create(
+        _entries(None, None, holder, Decimal(str(holder.balance)))
+    )
+    cashflow.add_entries(entries)
+
+
+def post_opening_balances(holders, batch_size=2000):
+    """post_opening_balance for many holders created together, e.g. by an import."""
+    entries = LedgerEntry.objects.bulk_create(
+        (
+            entry
+            for holder in holders
+            if holder.balance
+            for entry in _entries(None, None, holder, Decimal(str(holder.balance)))
+        ),
+        batch_size=batch_size,
+    )
+    cashflow.add_entries(entries, new_holders=True)
+
+
+def signed_amount():
+    """Credits count up and debits count down."""
+    return Case(
+        When(entry_type=LedgerEntry.EntryType.CREDIT, then=F("amount")),
+        default=-F("amount"),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def _cents(total):
+    # SQLite sums decimals as floats, round back to the stored precision
+    return Decimal(str(total or 0)).quantize(CENT)
+
+
+def holder_entries(holder):
+    return LedgerEntry.objects.filter(**_holder_fields(holder))
+
+
+def holder_balance(holder, before=None):
+    """Balance of holder according to the ledger, optionally as of before."""
+    entries = holder_entries(holder)
+    if before is not None:
+        entries = entries.filter(created_at__lt=before)
+    total = entries.aggregate(total=Sum(signed_amount()))["total"]
+    return _cents(total)
+
+
+def ledger_balances(model, pk_range=None):
+    """
+    Return {holder_pk: balance} for every holder of model that has entries,
+    or only for those with first <= pk <= last when pk_range is (first, last).
+    """
+    field = HOLDER_FIELDS[model]
+    if pk_range is None:
+        entries = LedgerEntry.objects.filter(**{f"{field}__isnull": False})
+    else:
+        first, last = pk_range
+        entries = LedgerEntry.objects.filter(
+            **{f"{field}__gte": first, f"{field}__lte": last}
+        )
+    rows = (
+        entries.values(field)
+        .annotate(total=Sum(signed_amount()))
+        .values_list(field, "total")
+    )
+    return {pk: _cents(total) for pk, total in rows}
+
+
+def verify_balances(model):
+    """Yield (holder, cached, expected) for every projection that disagrees with the ledger."""
+    expected = ledger_balances(model)
+    pending = pending_balances(model)
+    holders = model.objects.only("pk", "balance", "balance_shards")
+    for holder in holders.iterator(chunk_size=2000):
+        cached = holder.balance + pending.get(holder.pk, 0)
+        should_be = expected.get(holder.pk, Decimal("0.00"))
+        if cached != should_be:
+            yield holder, cached, should_be
+
+
+def rebuild_balances(model, batch_size=2000):
+    """
+    Overwrite every drifted projection of model with its ledger balance,
+    emptying the shards of the sharded ones.
+    """
+    fixed = []
+    for holder, _, expected in verify_balances(model):
+        holder.balance = expected
+        fixed.append(holder)
+    with transaction.atomic():
+        model.objects.bulk_update(fixed, ["balance"], batch_size=batch_size)
+        BalanceShard.objects.filter(
+            **{f"{HOLDER_FIELDS[model]}__in": [h.pk for h in fixed if h.balance_shards]}
+        ).update(balance=0)
+        invalidate_balance_summary(*(holder_user_id(holder) for holder in fixed))
+    return len(fixed)
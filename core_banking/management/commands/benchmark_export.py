@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core_banking.benchmarks import fill_transactions, rss_mb, throwaway_user
+from core_banking.exports import export_transactions
+from core_banking.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Export --rows transactions through the streaming exporter and fail if "
+        "memory grows by more than --rss-ceiling MB. The rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--rss-ceiling", type=float, default=64.0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = throwaway_user("export")
+            fill_transactions(user, options["rows"])
+
+            baseline = peak = rss_mb()
+            exported = 0
+            started = time.perf_counter()
+            chunks = export_transactions(
+                Transaction.objects.filter(sender=user), options["format"]
+            )
+            for exported, chunk in enumerate(chunks, 1):
+                if exported % 10_000 == 0:
+                    peak = max(peak, rss_mb())
+            elapsed = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        growth = peak - baseline
+        self.stdout.write(
+            f"exported {exported} chunks in {elapsed:.1f}s "
+            f"({exported / elapsed:.0f}/s), rss growth {growth:.1f}MB"
+        )
+        if growth > options["rss_ceiling"]:
+            raise CommandError(
+                f"RSS grew by {growth:.1f}MB, over the {options['rss_ceiling']}MB ceiling"
+            )
@@ -0,0 +1,86 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import override_settings
+
+from core_banking.benchmarks import throwaway_user
+from core_banking.ledger import holder_balance
+from core_banking.models import Transaction, User
+from core_banking.shards import current_balance, set_balance_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure wallet transfers/second into one merchant wallet from many "
+        "threads, once per --shards count. The benchmark users are deleted "
+        "afterwards. On SQLite every write takes the database lock, so only "
+        "a server database (PostgreSQL) shows the gain from sharding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=10.0)
+
+    # a load generator would trip the velocity limits
+    @override_settings(VELOCITY_LIMITS={})
+    def handle(self, *args, **options):
+        merchant = throwaway_user("merchant")
+        payers = [throwaway_user(f"payer-{i}") for i in range(options["workers"])]
+        try:
+            for payer in payers:
+                Transaction(
+                    sender=payer,
+                    transaction_type=Transaction.TransactionType.WALLET,
+                    transaction_category=Transaction.TransactionCategory.DEPOSIT,
+                    amount=Decimal("1000000"),
+                ).save()
+
+            wallet = merchant.wallet
+            for shards in options["shards"]:
+                set_balance_shards(wallet, shards)
+                completed, locked = self._run(payers, merchant, options["duration"])
+                self.stdout.write(
+                    f"shards={shards:>3}: {completed / options['duration']:8.1f} "
+                    f"credits/s (locked={locked})"
+                )
+
+            if current_balance(wallet) != holder_balance(wallet):
+                raise CommandError("The merchant balance disagrees with the ledger")
+        finally:
+            User.objects.filter(pk__in=[u.pk for u in [merchant, *payers]]).delete()
+
+    def _run(self, payers, merchant, duration):
+        counts = {"completed": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def worker(payer):
+            completed = locked = 0
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        Transaction(
+                            sender=payer,
+                            transaction_type=Transaction.TransactionType.WALLET,
+                            recipient_address=merchant.email,
+                            amount=Decimal("1.00"),
+                        ).save()
+                        completed += 1
+                    except OperationalError:
+                        locked += 1
+            finally:
+                connection.close()
+            with lock:
+                counts["completed"] += completed
+                counts["locked"] += locked
+
+        threads = [threading.Thread(target=worker, args=(p,)) for p in payers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts["completed"], counts["locked"]
@@ -0,0 +1,62 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core_banking.benchmarks import fill_transactions, percentile, throwaway_user
+from core_banking.models import Transaction
+from core_banking.receipts import get_receipt_generator
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Transaction insert latency while the table grows to --rows. "
+        "Everything runs in one transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--checkpoints", type=int, default=10)
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=200,
+            help="Transactions saved and timed at each checkpoint.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        generator = get_receipt_generator()
+        started = time.perf_counter()
+        for _ in range(100_000):
+            generator()
+        per_id = (time.perf_counter() - started) / 100_000
+        self.stdout.write(f"generator: {per_id * 1e6:.2f}us per receipt")
+
+        step = options["rows"] // options["checkpoints"]
+        with transaction.atomic():
+            user = throwaway_user("receipts")
+            filled = 0
+            for _ in range(options["checkpoints"] + 1):
+                timings = []
+                for _ in range(options["samples"]):
+                    txn = Transaction(
+                        sender=user,
+                        transaction_type=Transaction.TransactionType.WALLET,
+                        transaction_category=Transaction.TransactionCategory.DEPOSIT,
+                        amount=Decimal("1.00"),
+                    )
+                    t0 = time.perf_counter()
+                    txn.save()
+                    timings.append(time.perf_counter() - t0)
+                timings.sort()
+                self.stdout.write(
+                    f"rows={filled + options['samples']:>10} "
+                    f"mean={statistics.mean(timings) * 1e3:.3f}ms "
+                    f"p99={percentile(timings, 99) * 1e3:.3f}ms"
+                )
+                filled += fill_transactions(user, step, options["batch_size"])
+
+            transaction.set_rollback(True)
@@ -0,0 +1,103 @@
+import multiprocessing
+import random
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import override_settings
+
+from core_banking.models import Transaction, User
+
+
+def _run_worker(args):
+    emails, duration = args
+    users = list(User.objects.filter(email__in=emails))
+    rng = random.Random()
+    counts = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        sender, recipient = rng.sample(users, 2)
+        try:
+            Transaction(
+                sender=sender,
+                transaction_type=Transaction.TransactionType.WALLET,
+                recipient_address=recipient.email,
+                amount=Decimal(rng.randint(1, 1000)) / 100,
+            ).save()
+            counts["completed"] += 1
+        except OperationalError:
+            counts["locked"] += 1
+        except ValueError:
+            counts["insufficient"] += 1
+    connection.close()
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare wallet transfers/second from several processes on SQLite with "
+        "the default settings and with SQLITE_OPTIONS. Runs on scratch database "
+        "files, the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--users", type=int, default=200)
+
+    # a load generator would trip the velocity limits
+    @override_settings(VELOCITY_LIMITS={})
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only makes sense on SQLite")
+
+        db = connections["default"]
+        original = dict(db.settings_dict)
+        try:
+            for label, db_options in (
+                ("default", {}),
+                ("tuned", settings.SQLITE_OPTIONS),
+            ):
+                with tempfile.TemporaryDirectory() as tmp:
+                    db.close()
+                    db.settings_dict["NAME"] = Path(tmp) / "benchmark.sqlite3"
+                    db.settings_dict["OPTIONS"] = db_options
+                    self._run(label, options)
+        finally:
+            db.close()
+            db.settings_dict.update(original)
+
+    def _run(self, label, options):
+        call_command("migrate", verbosity=0)
+        emails = []
+        for i in range(options["users"]):
+            user = User.objects.create_user(
+                f"bench-{i}@example.com", first_name="Bench", last_name=str(i)
+            )
+            Transaction(
+                sender=user,
+                transaction_type=Transaction.TransactionType.WALLET,
+                transaction_category=Transaction.TransactionCategory.DEPOSIT,
+                amount=Decimal("1000"),
+            ).save()
+            emails.append(user.email)
+
+        # forked workers must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        jobs = [(emails, options["duration"])] * options["processes"]
+        with context.Pool(options["processes"]) as pool:
+            counts = sum(pool.map(_run_worker, jobs), Counter())
+
+        rate = counts["completed"] / options["duration"]
+        self.stdout.write(
+            f"{label:>8}: {rate:8.1f} transfers/s "
+            f"(completed={counts['completed']} locked={counts['locked']} "
+            f"insufficient={counts['insufficient']})"
+        )
@@ -0,0 +1,306 @@
+import json
+import platform
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core_banking.benchmarks import latency_stats, regressions, throwaway_user
+from core_banking.models import BankAccount, Transaction, User
+from core_banking.shards import set_balance_shards
+
+SCENARIOS = ("uniform", "hot_account", "sharded_hot_account", "mixed")
+OPERATIONS = ("wallet_transfer", "bank_transfer", "deposit", "withdrawal")
+SEED_BALANCE = Decimal("1000000")
+
+
+class Worker:
+    """Per-thread state: the user it acts as and, for page reads, a logged in client."""
+
+    def __init__(self, user):
+        self.user = user
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = Client()
+            self._client.force_login(self.user)
+        return self._client
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure transfers/second and p50/p99 latency of Transaction.save() "
+        "for transfers, deposits and withdrawals, under uniform traffic, a "
+        "single hot merchant account, the same account sharded, and mixed "
+        "with page reads. Writes the results to --output as JSON. The "
+        "benchmark users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=500,
+            help="Operations timed per operation type and scenario.",
+        )
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--read-ratio",
+            type=float,
+            default=0.8,
+            help="Share of page reads in the mixed scenario.",
+        )
+        parser.add_argument(
+            "--hot-shards",
+            type=int,
+            default=8,
+            help="balance_shards of the merchant in the sharded_hot_account scenario.",
+        )
+        parser.add_argument("--label", default="", help="e.g. the release tag.")
+        parser.add_argument("--output", default="benchmark_transfers.json")
+        parser.add_argument(
+            "--baseline",
+            help="A previous --output file, fail when a result regressed against it.",
+        )
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=20.0,
+            help="Percent drop in throughput or growth in p99 tolerated by --baseline.",
+        )
+
+    # a load generator would trip the velocity limits
+    @override_settings(VELOCITY_LIMITS={})
+    def handle(self, *args, **options):
+        self.options = options
+        self.users = [
+            throwaway_user(str(i), is_active=True) for i in range(options["users"])
+        ]
+        self.merchant = throwaway_user("merchant", is_active=True)
+        self.accounts = {}
+        try:
+            for user in [*self.users, self.merchant]:
+                Transaction(
+                    sender=user,
+                    transaction_type=Transaction.TransactionType.WALLET,
+                    transaction_category=Transaction.TransactionCategory.DEPOSIT,
+                    amount=SEED_BALANCE,
+                ).save()
+                self.accounts[user.pk] = BankAccount.objects.create(
+                    owner=user, balance=SEED_BALANCE
+                )
+
+            results = {}
+            for scenario in options["scenarios"]:
+                results[scenario] = getattr(self, f"_scenario_{scenario}")()
+        finally:
+            User.objects.filter(
+                pk__in=[user.pk for user in [*self.users, self.merchant]]
+            ).delete()
+
+        report = {
+            "label": options["label"],
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "parameters": {
+                key: options[key]
+                for key in (
+                    "iterations",
+                    "workers",
+                    "users",
+                    "seed",
+                    "read_ratio",
+                    "hot_shards",
+                )
+            },
+            "scenarios": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+
+        for scenario, operations in results.items():
+            for name, stats in operations.items():
+                self.stdout.write(
+                    f"{scenario:>19} {name:<16} {stats['per_second']:>9.1f}/s "
+                    f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                    f"errors={stats['errors']}"
+                )
+        self.stdout.write(f"results written to {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+            found = list(regressions(baseline, report, options["max_regression"] / 100))
+            if found:
+                raise CommandError("Regressions:\n" + "\n".join(found))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    # scenarios
+
+    def _scenario_uniform(self):
+        results = {}
+        for name in OPERATIONS:
+            operation = getattr(self, f"_{name}")
+            results.update(
+                self._run(lambda rng, worker: (name, operation(rng, worker, None)))
+            )
+        return results
+
+    def _scenario_hot_account(self):
+        # every transfer lands on the same merchant wallet / bank account
+        results = {}
+        for name in ("wallet_transfer", "bank_transfer"):
+            operation = getattr(self, f"_{name}")
+            results.update(
+                self._run(
+                    lambda rng, worker: (name, operation(rng, worker, self.merchant))
+                )
+            )
+        return results
+
+    def _scenario_sharded_hot_account(self):
+        # the hot account again, its credits and cash-flow rows spread over shards
+        holders = [self.merchant.wallet, self.accounts[self.merchant.pk]]
+        for holder in holders:
+            set_balance_shards(holder, self.options["hot_shards"])
+        try:
+            return self._scenario_hot_account()
+        finally:
+            for holder in holders:
+                set_balance_shards(holder, 0)
+
+    def _scenario_mixed(self):
+        history_url = reverse("transaction_list")
+        home_url = reverse("home")
+
+        def choose(rng, worker):
+            if rng.random() >= self.options["read_ratio"]:
+                return "wallet_transfer", self._wallet_transfer(rng, worker, None)
+            if rng.random() < 0.5:
+                return "history_page", self._page(worker, history_url)
+            return "home_page", self._page(worker, home_url)
+
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            return self._run(choose)
+
+    # operations, each returns the callable to time
+
+    def _recipient(self, rng, worker, recipient):
+        while recipient is None or recipient == worker.user:
+            recipient = rng.choice(self.users)
+        return recipient
+
+    def _amount(self, rng):
+        return Decimal(rng.randint(1, 1000)) / 100
+
+    def _wallet_transfer(self, rng, worker, recipient):
+        return Transaction(
+            sender=worker.user,
+            transaction_type=Transaction.TransactionType.WALLET,
+            recipient_address=self._recipient(rng, worker, recipient).email,
+            amount=self._amount(rng),
+        ).save
+
+    def _bank_transfer(self, rng, worker, recipient):
+        recipient = self._recipient(rng, worker, recipient)
+        return Transaction(
+            sender=worker.user,
+            transaction_type=Transaction.TransactionType.BANK_ACCOUNT,
+            sender_bank_account=self.accounts[worker.user.pk],
+            recipient_address=self.accounts[recipient.pk].account_number,
+            amount=self._amount(rng),
+        ).save
+
+    def _deposit(self, rng, worker, recipient):
+        return Transaction(
+            sender=worker.user,
+            transaction_type=Transaction.TransactionType.WALLET,
+            transaction_category=Transaction.TransactionCategory.DEPOSIT,
+            amount=self._amount(rng),
+        ).save
+
+    def _withdrawal(self, rng, worker, recipient):
+        return Transaction(
+            sender=worker.user,
+            transaction_type=Transaction.TransactionType.WALLET,
+            transaction_category=Transaction.TransactionCategory.WAITHDRAWAL,
+            amount=self._amount(rng),
+        ).save
+
+    def _page(self, worker, url):
+        def get():
+            response = worker.client.get(url)
+            if response.status_code != 200:
+                raise ValueError(f"{url} returned {response.status_code}")
+
+        return get
+
+    # runner
+
+    def _run(self, choose):
+        """
+        Run --iterations operations picked by choose(rng, worker) across
+        --workers threads, every thread with its own seeded rng and user.
+        Returns {operation name: latency_stats}.
+        """
+        iterations, workers = self.options["iterations"], self.options["workers"]
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def work(index, count):
+            rng = random.Random(self.options["seed"] * 1000 + index)
+            worker = Worker(self.users[index % len(self.users)])
+            local_timings = defaultdict(list)
+            local_errors = defaultdict(int)
+            try:
+                for _ in range(count):
+                    name, operation = choose(rng, worker)
+                    started = time.perf_counter()
+                    try:
+                        operation()
+                    except (ValueError, OperationalError):
+                        local_errors[name] += 1
+                        continue
+                    local_timings[name].append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                for name, values in local_timings.items():
+                    timings[name].extend(values)
+                for name, count in local_errors.items():
+                    errors[name] += count
+
+        per_worker, extra = divmod(iterations, workers)
+        threads = [
+            threading.Thread(target=work, args=(i, per_worker + (i < extra)))
+            for i in range(workers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            name: latency_stats(timings[name], elapsed, errors[name])
+            for name in sorted({*timings, *errors})
+        }
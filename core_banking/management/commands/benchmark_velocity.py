@@ -0,0 +1,71 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core_banking import velocity
+from core_banking.benchmarks import percentile
+from core_banking.models import BankAccount, Wallet
+
+TARGET_US = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Time velocity.check() and velocity.record() against the configured "
+        f"cache, the check should stay under {TARGET_US}us. The counters of the "
+        "made-up accounts are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=100_000)
+        parser.add_argument(
+            "--accounts",
+            type=int,
+            default=100,
+            help="Distinct senders the checks are spread over.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        # never saved, negative ids keep their counters apart from real ones
+        holders = [Wallet(pk=-1)] + [
+            BankAccount(pk=-i, account_type=BankAccount.AccountChoices.BUSINESS)
+            for i in range(2, options["accounts"] + 1)
+        ]
+        amount = Decimal("1.00")
+        # counters as a busy account would have them
+        for holder in holders:
+            velocity.record(holder, amount, now=time.time() - 60)
+            velocity.record(holder, amount)
+
+        for name, operation in (
+            ("check", velocity.check),
+            ("record", velocity.record),
+        ):
+            timings = []
+            for i in range(iterations):
+                holder = holders[i % len(holders)]
+                t0 = time.perf_counter()
+                try:
+                    operation(holder, amount)
+                except velocity.VelocityLimitExceeded:
+                    pass
+                timings.append(time.perf_counter() - t0)
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            self.stdout.write(
+                f"{name}: mean={mean * 1e6:.1f}us "
+                f"p50={percentile(timings, 50) * 1e6:.1f}us "
+                f"p99={percentile(timings, 99) * 1e6:.1f}us"
+            )
+            if name == "check":
+                style = (
+                    self.style.SUCCESS
+                    if percentile(timings, 50) * 1e6 < TARGET_US
+                    else self.style.ERROR
+                )
+                self.stdout.write(style(f"target p50 < {TARGET_US}us"))
+
+        for holder in holders:
+            velocity.reset(holder)
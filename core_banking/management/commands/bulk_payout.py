@@ -0,0 +1,76 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_banking.models import BankAccount, Transaction, User, Wallet
+from core_banking.payouts import PayoutResult, run_payout
+
+
+class Command(BaseCommand):
+    help = (
+        "Pay every line of a CSV file (columns: recipient,amount) from one "
+        "wallet or bank account in a single batch. Writes the outcome of each "
+        "line as CSV to stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="CSV file, '-' for stdin")
+        parser.add_argument("--sender", required=True, help="Email of the payer")
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--account", help="Funding bank account number")
+        source.add_argument(
+            "--wallet", action="store_true", help="Pay from the sender's wallet"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sender = User.objects.get(email=options["sender"])
+            if options["wallet"]:
+                source = sender.wallet
+            else:
+                source = BankAccount.objects.get(
+                    owner=sender, account_number=options["account"]
+                )
+        except (User.DoesNotExist, Wallet.DoesNotExist, BankAccount.DoesNotExist) as e:
+            raise CommandError(e)
+
+        lines = self._read_lines(options["file"])
+        started = time.perf_counter()
+        try:
+            results = run_payout(sender, source, lines)
+        except ValueError as e:
+            raise CommandError(e)
+        elapsed = time.perf_counter() - started
+
+        fields = list(PayoutResult.__dataclass_fields__)
+        writer = csv.DictWriter(self.stdout, fieldnames=fields)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result.as_dict())
+
+        completed = sum(
+            r.status == Transaction.TransactionStatus.COMPLETED for r in results
+        )
+        self.stderr.write(
+            f"{completed}/{len(results)} payouts completed in {elapsed:.2f}s"
+        )
+
+    def _read_lines(self, path):
+        """The (recipient, amount) lines of the CSV file at path, '-' for stdin."""
+        try:
+            stream = sys.stdin if path == "-" else open(path, newline="")
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e.strerror}")
+        with stream:
+            try:
+                reader = csv.DictReader(stream)
+                missing = {"recipient", "amount"} - set(reader.fieldnames or ())
+                if missing:
+                    raise CommandError(
+                        f"The file has no {' or '.join(sorted(missing))} column"
+                    )
+                return [(row["recipient"], row["amount"]) for row in reader]
+            except (UnicodeDecodeError, csv.Error) as e:
+                raise CommandError(f"Cannot read {path}: {e}")
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core_banking.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL, --batch-size "
+        "rows per transaction so the table is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff)
+        deleted = 0
+        while True:
+            pks = list(expired.values_list("pk", flat=True)[: options["batch_size"]])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(f"deleted {deleted} expired idempotency keys")
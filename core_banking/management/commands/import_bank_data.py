@@ -0,0 +1,70 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_banking.imports import IMPORTERS, import_bank_data, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load users (with their wallets), bank accounts or historical "
+        "transactions from a CSV or NDJSON file, in batches. Transactions are "
+        "loaded as history, no money moves. Load users first, then accounts, "
+        "then transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(IMPORTERS))
+        parser.add_argument("file", help="CSV or NDJSON file, '-' for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Records per commit."
+        )
+        parser.add_argument(
+            "--skip",
+            type=int,
+            default=0,
+            help="Skip the first N records, to resume after a failed run.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        fmt = options["format"]
+        if fmt is None:
+            fmt = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+        stream = sys.stdin if path == "-" else open(path, newline="")
+        imported = options["skip"]
+        started = time.perf_counter()
+        with stream:
+            try:
+                for imported in import_bank_data(
+                    options["kind"],
+                    read_records(stream, fmt),
+                    options["batch_size"],
+                    options["skip"],
+                ):
+                    elapsed = time.perf_counter() - started
+                    loaded = imported - options["skip"]
+                    self.stderr.write(
+                        f"{imported} records, {loaded / elapsed:.0f} rows/s"
+                    )
+            except ValueError as e:
+                raise CommandError(
+                    f"{e}\n{imported} records are in, fix the file and rerun "
+                    f"with --skip {imported}"
+                )
+
+        loaded = imported - options["skip"]
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {loaded} {options['kind']} in {elapsed:.1f}s "
+                f"({loaded / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core_banking.ledger import rebuild_balances, verify_balances
+from core_banking.models import BankAccount, Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify or rebuild the cached wallet and bank account balances from the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only",
+            action="store_true",
+            help="Report drifted balances without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        for model in (Wallet, BankAccount):
+            name = model._meta.verbose_name
+            if options["verify_only"]:
+                drifted = 0
+                for holder, cached, expected in verify_balances(model):
+                    drifted += 1
+                    self.stdout.write(
+                        f"{name} {holder.pk}: cached {cached}, ledger {expected}"
+                    )
+                self.stdout.write(f"{drifted} {name} balance(s) out of step")
+            else:
+                fixed = rebuild_balances(model)
+                self.stdout.write(
+                    self.style.SUCCESS(f"Rebuilt {fixed} {name} balance(s)")
+                )
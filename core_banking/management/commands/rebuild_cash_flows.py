@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core_banking.cashflow import rebuild_cash_flows
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the monthly cash-flow rows of every wallet and bank account "
+        "from the ledger, in chunks across a process pool. The months of "
+        "archived transactions are left as they are."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, help="Worker processes, one per core by default."
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild_cash_flows(options["processes"], options["chunk_size"])
+        self.stdout.write(
+            f"wrote {rows} monthly rows in {time.perf_counter() - started:.1f}s"
+        )
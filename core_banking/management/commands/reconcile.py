@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_banking.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every wallet and bank account balance against the ledger, in "
+        "partitions of ids across a process pool. Mismatches go to a CSV file; "
+        "an interrupted run continues from its checkpoint with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="reconcile.csv")
+        parser.add_argument("--checkpoint", default="reconcile.checkpoint.json")
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the partitions the checkpoint has and append to --output.",
+        )
+        parser.add_argument(
+            "--partition-size", type=int, default=10000, help="Ids per partition."
+        )
+        parser.add_argument(
+            "--processes", type=int, help="Worker processes, one per core by default."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        done = total = mismatches = 0
+        try:
+            for done, total, mismatches in reconcile(
+                options["output"],
+                options["checkpoint"],
+                options["partition_size"],
+                options["processes"],
+                options["resume"],
+            ):
+                self.stdout.write(
+                    f"{done}/{total} partitions, {mismatches} mismatch(es)"
+                )
+        except ValueError as e:
+            raise CommandError(e)
+
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(
+            style(
+                f"{mismatches} balance(s) out of step, see {options['output']} "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+        )
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core_banking.statements import render_statements
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the monthly PDF statement of every wallet and bank account, "
+        "skipping statements whose content has not changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "period",
+            nargs="?",
+            help="Month as YYYY-MM, defaults to the previous month.",
+        )
+        parser.add_argument(
+            "--processes", type=int, help="Worker processes, defaults to every core."
+        )
+
+    def handle(self, *args, **options):
+        period = options["period"]
+        if not period:
+            first_of_month = timezone.localdate().replace(day=1)
+            period = (first_of_month - timedelta(days=1)).strftime("%Y-%m")
+
+        try:
+            total, rendered = render_statements(period, options["processes"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{period}: {total} statements, {rendered} rendered, "
+                f"{total - rendered} unchanged"
+            )
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core_banking.scheduler import run_due_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Run due standing orders (scheduled and recurring transfers) in "
+        "batches. Several of these may run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=30.0,
+            help="Seconds to wait when nothing is due.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run what is due once and exit."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                outcomes = run_due_batch(options["batch_size"])
+                ran = sum(outcomes.values())
+                if ran:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        "completed {completed}, failed {failed}, "
+                        "deferred {deferred}".format(**outcomes)
+                        + f" ({ran / elapsed:.0f} orders/s)"
+                    )
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
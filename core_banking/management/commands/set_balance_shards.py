@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core_banking.models import BankAccount, Wallet
+from core_banking.shards import current_balance, set_balance_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread the credits of a hot wallet or bank account over SHARDS "
+        "balance rows, 0 turns sharding off. See core_banking/shards.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("shards", type=int)
+        holder = parser.add_mutually_exclusive_group(required=True)
+        holder.add_argument("--account", help="Bank account number")
+        holder.add_argument("--wallet", help="Email of the wallet owner")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["shards"] <= 256:
+            raise CommandError("SHARDS must be between 0 and 256")
+        try:
+            if options["wallet"]:
+                holder = Wallet.objects.get(user__email=options["wallet"])
+            else:
+                holder = BankAccount.objects.get(account_number=options["account"])
+        except (Wallet.DoesNotExist, BankAccount.DoesNotExist) as e:
+            raise CommandError(e)
+
+        set_balance_shards(holder, options["shards"])
+        self.stdout.write(
+            f"{holder}: {holder.balance_shards or 'no'} shards, "
+            f"balance {current_balance(holder)}"
+        )
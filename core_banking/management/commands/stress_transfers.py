@@ -0,0 +1,132 @@
+import random
+import threading
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import override_settings
+
+from core_banking.ledger import verify_balances
+from core_banking.models import Transaction, User, Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many parallel wallet transfers between throwaway users and check "
+        "that no money was created or lost. The users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--transfers", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--seed-balance", type=Decimal, default=Decimal("1000"))
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the stress users afterwards."
+        )
+
+    # a load generator would trip the velocity limits
+    @override_settings(VELOCITY_LIMITS={})
+    def handle(self, *args, **options):
+        seed = options["seed_balance"]
+        users = self._seed_users(options["users"], seed)
+        counts = self._transfer(users, options["transfers"], options["workers"])
+
+        wallets = Wallet.objects.filter(user__in=users)
+        total = wallets.aggregate(total=Sum("balance"))["total"]
+        expected_total = seed * len(users)
+        self.stdout.write(
+            f"completed={counts['completed']} insufficient={counts['insufficient']} "
+            f"locked={counts['locked']} total={total} expected={expected_total}"
+        )
+        errors = self._check(users, wallets, total, expected_total, counts)
+
+        if not options["keep"]:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+        if errors:
+            raise CommandError("\n".join(errors))
+        self.stdout.write(self.style.SUCCESS("Money conserved"))
+
+    def _seed_users(self, count, seed):
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(
+                f"stress-{run_id}-{i}@example.com",
+                first_name="Stress",
+                last_name=str(i),
+            )
+            for i in range(count)
+        ]
+        for user in users:
+            Transaction(
+                sender=user,
+                transaction_type=Transaction.TransactionType.WALLET,
+                transaction_category=Transaction.TransactionCategory.DEPOSIT,
+                amount=seed,
+            ).save()
+        return users
+
+    def _transfer(self, users, transfers, workers):
+        """Run transfers random transfers across workers threads, returns the outcomes."""
+        counts = {"completed": 0, "insufficient": 0, "locked": 0}
+        lock = threading.Lock()
+
+        def worker(n_transfers):
+            rng = random.Random()
+            try:
+                for _ in range(n_transfers):
+                    sender, recipient = rng.sample(users, 2)
+                    try:
+                        Transaction(
+                            sender=sender,
+                            transaction_type=Transaction.TransactionType.WALLET,
+                            recipient_address=recipient.email,
+                            amount=Decimal(rng.randint(1, 20000)) / 100,
+                        ).save()
+                        outcome = "completed"
+                    except OperationalError:
+                        outcome = "locked"
+                    except ValueError:
+                        outcome = "insufficient"
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        per_worker, extra = divmod(transfers, workers)
+        threads = [
+            threading.Thread(target=worker, args=(per_worker + (i < extra),))
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
+
+    def _check(self, users, wallets, total, expected_total, counts):
+        """What went wrong, an empty list when money was conserved."""
+        errors = []
+        if total != expected_total:
+            errors.append(f"Money not conserved: {total} != {expected_total}")
+        negative = wallets.filter(balance__lt=0).count()
+        if negative:
+            errors.append(f"{negative} wallet(s) went negative")
+        wallet_pks = set(wallets.values_list("pk", flat=True))
+        drifted = [
+            holder
+            for holder, _, _ in verify_balances(Wallet)
+            if holder.pk in wallet_pks
+        ]
+        if drifted:
+            errors.append(f"{len(drifted)} wallet(s) disagree with the ledger")
+        completed_rows = Transaction.objects.filter(
+            sender__in=users, transaction_category__isnull=True
+        ).count()
+        if completed_rows != counts["completed"]:
+            errors.append(
+                f"{completed_rows} transfer rows for {counts['completed']} completed transfers"
+            )
+        return errors
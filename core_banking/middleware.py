@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.conf import settings
+
+from .instrumentation import collect_stats, record_request
+from .routers import is_pinned_to_primary, pin_to_primary, routing_state
+
+
+def reads_from_replica(request, view_func):
+    """Read-only pages: views with read_from_replica = True and admin changelists."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    view_class = getattr(view_func, "view_class", None)
+    if getattr(view_class, "read_from_replica", False):
+        return True
+    match = request.resolver_match
+    return match.namespace == "admin" and match.url_name.endswith("_changelist")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route the reads of read-only pages to a replica, see routers.py.
+    Goes after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routing_state() as state:
+            request.db_routing = state
+            response = self.get_response(request)
+
+        if state.wrote and request.user.is_authenticated:
+            pin_to_primary(response, request.user.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not reads_from_replica(request, view_func):
+            return None
+        # the user is loaded from the primary, before the switch
+        if is_pinned_to_primary(request):
+            return None
+        request.db_routing.replica = random.choice(replicas)
+        return None
+
+
+class InstrumentationMiddleware:
+    """
+    Time sampled requests and count their queries and cache lookups, see
+    instrumentation.py. Goes first so the time includes the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with collect_stats() as stats:
+            response = self.get_response(request)
+        record_request(request, response, time.perf_counter() - started, stats)
+        return response
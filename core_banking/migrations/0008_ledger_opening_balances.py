@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def open_existing_balances(apps, schema_editor):
+    """
+    Balances that existed before the ledger get an opening entry from the
+    outside world so that the ledger and the projections agree.
+    """
+    LedgerEntry = apps.get_model("core_banking", "LedgerEntry")
+    Wallet = apps.get_model("core_banking", "Wallet")
+    BankAccount = apps.get_model("core_banking", "BankAccount")
+
+    entries = []
+    for model, field in ((Wallet, "wallet"), (BankAccount, "bank_account")):
+        for holder in model.objects.exclude(balance=0).iterator():
+            entries.append(LedgerEntry(entry_type="Debit", amount=holder.balance))
+            entries.append(
+                LedgerEntry(
+                    entry_type="Credit", amount=holder.balance, **{field: holder}
+                )
+            )
+    LedgerEntry.objects.bulk_create(entries, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0007_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(open_existing_balances, migrations.RunPython.noop),
+    ]
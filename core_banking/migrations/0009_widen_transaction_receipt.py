@@ -0,0 +1,63 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:10
+
+import time
+
+from django.db import migrations, models
+
+# the layout of core_banking/receipts.py when this migration was written
+EPOCH_MS = 1735689600000
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+# the highest worker id is reserved for this one-off run
+WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def snowflake_receipts():
+    last_ms, sequence = -1, 0
+    while True:
+        now = int(time.time() * 1000) - EPOCH_MS
+        if now <= last_ms:
+            now = last_ms
+            sequence = (sequence + 1) & MAX_SEQUENCE
+            if sequence == 0:
+                while now <= last_ms:
+                    now = int(time.time() * 1000) - EPOCH_MS
+        else:
+            sequence = 0
+        last_ms = now
+        yield str(
+            (now << (WORKER_BITS + SEQUENCE_BITS))
+            | (WORKER_ID << SEQUENCE_BITS)
+            | sequence
+        )
+
+
+def rekey_receipts(apps, schema_editor):
+    """Give existing transactions generator receipts, in creation order."""
+    Transaction = apps.get_model("core_banking", "Transaction")
+    receipts = snowflake_receipts()
+
+    batch = []
+    for txn in Transaction.objects.only("pk").order_by("pk").iterator():
+        txn.receipt = next(receipts)
+        batch.append(txn)
+        if len(batch) == 2000:
+            Transaction.objects.bulk_update(batch, ["receipt"])
+            batch = []
+    Transaction.objects.bulk_update(batch, ["receipt"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0008_ledger_opening_balances"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="receipt",
+            field=models.CharField(editable=False, max_length=20, unique=True),
+        ),
+        migrations.RunPython(rekey_receipts, migrations.RunPython.noop),
+    ]
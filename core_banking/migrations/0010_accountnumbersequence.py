@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+def create_account_number_sequence(apps, schema_editor):
+    AccountNumberSequence = apps.get_model("core_banking", "AccountNumberSequence")
+    # 11 digit values, a 12 digit number with its check digit never collides
+    # with the 10 digit legacy account numbers
+    AccountNumberSequence.objects.create(name="bank_account", next_value=10**10)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0009_widen_transaction_receipt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountNumberSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("next_value", models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_account_number_sequence, migrations.RunPython.noop),
+    ]
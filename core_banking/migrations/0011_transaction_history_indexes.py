@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0010_accountnumbersequence"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["sender", "created_at", "id"], name="txn_sender_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["recipient", "created_at", "id"],
+                name="txn_recipient_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0011_transaction_history_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["created_at", "id"], name="txn_created_idx"),
+        ),
+    ]
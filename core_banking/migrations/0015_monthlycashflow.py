@@ -0,0 +1,147 @@
+# Generated by Django 5.1.5 on 2026-10-18 07:33
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def backfill_cash_flows(apps, schema_editor):
+    """
+    Aggregate the existing ledger into monthly rows, same categories as
+    core_banking/cashflow.py. Large tables are better served by the parallel
+    rebuild_cash_flows command afterwards.
+    """
+    LedgerEntry = apps.get_model("core_banking", "LedgerEntry")
+    MonthlyCashFlow = apps.get_model("core_banking", "MonthlyCashFlow")
+
+    def signed(entry_type):
+        return Sum(
+            Case(
+                When(entry_type=entry_type, then=F("amount")),
+                default=Value(Decimal("0.00")),
+            )
+        )
+
+    for field, user in (
+        ("wallet", "wallet__user"),
+        ("bank_account", "bank_account__owner"),
+    ):
+        rows = (
+            LedgerEntry.objects.filter(**{f"{field}__isnull": False})
+            .annotate(
+                month=TruncMonth("created_at", output_field=DateField()),
+                category=Case(
+                    When(transaction__isnull=True, then=Value("Opening balance")),
+                    default=Coalesce(
+                        "transaction__transaction_category", Value("Transfer")
+                    ),
+                ),
+            )
+            .values(field, user, "month", "category")
+            .annotate(
+                inflow=signed("Credit"), outflow=signed("Debit"), entries=Count("pk")
+            )
+            .order_by()
+        )
+        MonthlyCashFlow.objects.bulk_create(
+            (
+                MonthlyCashFlow(
+                    user_id=row[user],
+                    month=row["month"],
+                    category=row["category"],
+                    inflow=Decimal(str(row["inflow"])).quantize(Decimal("0.01")),
+                    outflow=Decimal(str(row["outflow"])).quantize(Decimal("0.01")),
+                    entries=row["entries"],
+                    **{f"{field}_id": row[field]},
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0014_idempotencykey"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyCashFlow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("category", models.CharField(max_length=30)),
+                (
+                    "inflow",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "outflow",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("entries", models.PositiveIntegerField(default=0)),
+                (
+                    "bank_account",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cash_flows",
+                        to="core_banking.bankaccount",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cash_flows",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cash_flows",
+                        to="core_banking.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "month"], name="cashflow_user_month_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("wallet__isnull", False)),
+                        fields=("wallet", "month", "category"),
+                        name="unique_wallet_cash_flow",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("bank_account__isnull", False)),
+                        fields=("bank_account", "month", "category"),
+                        name="unique_bank_account_cash_flow",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_cash_flows, migrations.RunPython.noop),
+    ]
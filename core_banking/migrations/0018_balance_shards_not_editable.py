@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0017_archive"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bankaccount",
+            name="balance_shards",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="wallet",
+            name="balance_shards",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0019_idempotency_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReceiptWorker",
+            fields=[
+                (
+                    "worker_id",
+                    models.PositiveSmallIntegerField(primary_key=True, serialize=False),
+                ),
+                ("holder", models.CharField(max_length=100)),
+                ("leased_until", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core_banking", "0020_receiptworker"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="monthlycashflow",
+            name="unique_wallet_cash_flow",
+        ),
+        migrations.RemoveConstraint(
+            model_name="monthlycashflow",
+            name="unique_bank_account_cash_flow",
+        ),
+        migrations.AddField(
+            model_name="monthlycashflow",
+            name="slot",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlycashflow",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("wallet__isnull", False)),
+                fields=("wallet", "month", "category", "slot"),
+                name="unique_wallet_cash_flow",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlycashflow",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("bank_account__isnull", False)),
+                fields=("bank_account", "month", "category", "slot"),
+                name="unique_bank_account_cash_flow",
+            ),
+        ),
+    ]
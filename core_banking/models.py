@@ -1,11 +1,10 @@
-import random
-import string
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models, transaction
 
+from .receipts import get_receipt_generator
+
 # Create your models here.
 User = get_user_model()
 
@@ -31,20 +30,58 @@ class BankAccount(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # > 1 spreads incoming credits over that many BalanceShard rows, only
+    # set_balance_shards() changes it, see shards.py
+    balance_shards = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.account_number} - {self.account_type}"
 
     def save(self, *args, **kwargs):
+        from .ledger import post_opening_balance
+
         if not self.account_number:
             self.account_number = self.generate_account_number()
-        super().save(*args, **kwargs)
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # an account opened with money in it needs a matching ledger entry
+            post_opening_balance(self)
 
     def generate_account_number(self):
-        while True:
-            account_number = "".join(random.choices(string.digits, k=10))
-            if not BankAccount.objects.filter(account_number=account_number).exists():
-                return account_number
+        # handed out from a block reserved by this process, see account_numbers.py
+        from .account_numbers import get_account_number_allocator
+
+        return get_account_number_allocator().next()
+
+
+class AccountNumberSequence(models.Model):
+    """
+    Source of account numbers, workers reserve blocks of it at a time.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
+
+
+class ReceiptWorker(models.Model):
+    """
+    A receipt worker id and the process that holds it until leased_until,
+    see receipts.py.
+    """
+
+    worker_id = models.PositiveSmallIntegerField(primary_key=True)
+    holder = models.CharField(max_length=100)
+    leased_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.worker_id} ({self.holder})"
 
 
 class Wallet(models.Model):
@@ -58,6 +95,9 @@ class Wallet(models.Model):
         validators=[MinValueValidator(0.00)],
     )
     last_update = models.DateTimeField(auto_now=True)
+    # > 1 spreads incoming credits over that many BalanceShard rows, only
+    # set_balance_shards() changes it, see shards.py
+    balance_shards = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.email}'s wallet"
@@ -114,37 +154,103 @@ class Transaction(models.Model):
     amount = models.DecimalField(
         max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)]
     )
-    receipt = models.CharField(max_length=10, unique=True, editable=False)
+    receipt = models.CharField(max_length=20, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # history pages are keyset scans on each side, see pagination.py
+            models.Index(
+                fields=["sender", "created_at", "id"], name="txn_sender_created_idx"
+            ),
+            models.Index(
+                fields=["recipient", "created_at", "id"],
+                name="txn_recipient_created_idx",
+            ),
+            # admin ordering and created_at filter
+            models.Index(fields=["created_at", "id"], name="txn_created_idx"),
+        ]
+
     def __str__(self):
         rec = self.recipient.email if self.recipient else self.recipient_address
         return f"{self.sender.email} sent {self.amount} to {rec}"
 
     def generate_receipt_number(self):
-        while True:
-            receipt_number = "".join(random.choices(string.digits, k=5))
-            if not Transaction.objects.filter(receipt=receipt_number).exists():
-                return receipt_number
+        # unique by construction, no lookup needed. see receipts.py
+        return get_receipt_generator()()
 
     def save(self, *args, **kwargs):
+        """
+        Money only moves when the transaction is first created, the ledger is
+        append-only so saving an existing transaction just updates the row.
+        """
+        from . import velocity
+        from .ledger import move_funds, record_entries
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
         if not self.receipt:
             self.receipt = self.generate_receipt_number()
 
         self.transaction_status = self.TransactionStatus.PENDING
+        source = self.check_velocity()
 
+        # BEGIN IMMEDIATE on SQLite, see SQLITE_OPTIONS in settings
         with transaction.atomic():
+            # each handler validates the request and returns the (debit, credit)
+            # balance holders, None stands for money entering or leaving the bank
             if not self.transaction_category:
-                self._handle_transfer()
+                debit, credit = self._handle_transfer()
             elif self.transaction_category == self.TransactionCategory.DEPOSIT:
-                self._handle_deposit()
+                debit, credit = self._handle_deposit()
             elif self.transaction_category == self.TransactionCategory.WAITHDRAWAL:
-                self._handle_withdrawal()
+                debit, credit = self._handle_withdrawal()
             else:
                 raise ValueError("Unsupported transaction category.")
 
-        super().save(*args, **kwargs)
+            try:
+                move_funds(debit, credit, self.amount)
+            except ValueError:
+                self.transaction_status = self.TransactionStatus.FAILED
+                raise
+
+            self.transaction_status = self.TransactionStatus.COMPLETED
+            super().save(*args, **kwargs)
+            record_entries(self, debit, credit)
+            if source is not None:
+                velocity.record_on_commit(source, self.amount)
+
+    def check_velocity(self):
+        """
+        Raise VelocityLimitExceeded if this transfer would break its source's
+        limits, returns the source (None for deposits and withdrawals).
+        Checked from the cache, call it before any write transaction opens so
+        a transfer over its limits never takes the lock, see velocity.py.
+        save() checks unless the caller already did.
+        """
+        from . import velocity
+
+        if hasattr(self, "_velocity_source"):
+            return self._velocity_source
+        source = None if self.transaction_category else self._transfer_source()
+        if source is not None:
+            try:
+                velocity.check(source, self.amount)
+            except ValueError:
+                self.transaction_status = self.TransactionStatus.FAILED
+                raise
+        self._velocity_source = source
+        return source
+
+    def _transfer_source(self):
+        """The Wallet or BankAccount a transfer debits, None if it has none."""
+        if self.transaction_type == self.TransactionType.WALLET:
+            return self.sender.wallet
+        if self.transaction_type == self.TransactionType.BANK_ACCOUNT:
+            return self.sender_bank_account
+        return None
 
     def _handle_deposit(self):
         """
@@ -153,20 +259,14 @@ class Transaction(models.Model):
         """
 
         if self.transaction_type == self.TransactionType.WALLET:
-            wallet = self.sender.wallet
-            wallet.balance += self.amount
-            wallet.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            return None, self.sender.wallet
 
         elif self.transaction_type == self.TransactionType.BANK_ACCOUNT:
             if not self.sender_bank_account:
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError("No sender bank account specified.")
 
-            bank_account = self.sender_bank_account
-            bank_account.balance += self.amount
-            bank_account.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            return None, self.sender_bank_account
 
         else:
             raise ValueError("Transaction type not supported")
@@ -178,64 +278,55 @@ class Transaction(models.Model):
         """
 
         if self.transaction_type == self.TransactionType.WALLET:
-            wallet = self.sender.wallet
-            if self.amount > wallet.balance:
-                self.transaction_status = self.TransactionStatus.FAILED
-                raise ValueError(
-                    f"You don't have enough funds in your wallet , you wallet balance is {wallet.balance}"
-                )
-
-            wallet.balance -= self.amount
-            wallet.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            # the balance check happens in the guarded debit, see balances.py
+            return self.sender.wallet, None
 
         elif self.transaction_type == self.TransactionType.BANK_ACCOUNT:
             if not self.sender_bank_account:
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError("No sender bank account specified.")
 
-            bank_account = self.sender_bank_account
-            if self.amount > bank_account.balance:
-                self.transaction_status = self.TransactionStatus.FAILED
-                raise ValueError(
-                    f"you don't have enough funds in your bank account, your bank account balance is {bank_account.balance}"
-                )
-
-            bank_account.balance -= self.amount
-            bank_account.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            return self.sender_bank_account, None
 
         else:
             raise ValueError("Transaction type not supported")
 
+    def remember_recipient(self, transaction_type, recipient_address, holder):
+        """
+        Keep the recipient resolved while validating the form so the transfer
+        does not look it up again.
+        """
+        self._resolved_recipient = ((transaction_type, recipient_address), holder)
+
+    def get_recipient_holder(self):
+        """The Wallet or BankAccount to credit, resolved at most once."""
+        from .recipients import resolve_recipient
+
+        key = (self.transaction_type, self.recipient_address)
+        cached = getattr(self, "_resolved_recipient", None)
+        if cached is None or cached[0] != key:
+            self.remember_recipient(*key, resolve_recipient(*key))
+        return self._resolved_recipient[1]
+
     def _handle_transfer(self):
-        # getting sender and amount from the transaction
+        # getting sender from the transaction, the amount is checked
+        # against the balance by the guarded debit in balances.py
+        from .recipients import recipient_owner
+
         sender = self.sender
-        amount = self.amount
 
         if self.transaction_type == self.TransactionType.WALLET:
             # using wallet
             sender_wallet = sender.wallet
-            if amount > sender_wallet.balance:
-                self.transaction_status = self.TransactionStatus.FAILED
-                raise ValueError(
-                    f"You don't have enough funds in your wallet , you wallet balance is {sender_wallet.balance}"
-                )
-
-            if not User.objects.filter(email=self.recipient_address).exists():
+            recipient_wallet = self.get_recipient_holder()
+            if recipient_wallet is None:
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError(
                     f"User with email {self.recipient_address} does not exist"
                 )
 
-            recipient_wallet = User.objects.get(email=self.recipient_address).wallet
-            # Deducting money
-            sender_wallet.balance -= amount
-            sender_wallet.save()
-            # adding money
-            recipient_wallet.balance += amount
-            recipient_wallet.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            self.recipient = recipient_owner(recipient_wallet)
+            return sender_wallet, recipient_wallet
 
         # USING BANK_ACCOUNT
         elif self.transaction_type == self.TransactionType.BANK_ACCOUNT:
@@ -244,33 +335,304 @@ class Transaction(models.Model):
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError("No sender bank account specified.")
 
-            if amount > self.sender_bank_account.balance:
-                self.transaction_status = self.TransactionStatus.FAILED
-                raise ValueError(
-                    f"you don't have enough funds in your bank account, your bank account balance is {self.sender_bank_account.balance}"
-                )
-
-            try:
-                recipiant_bank_account = BankAccount.objects.get(
-                    account_number=self.recipient_address
-                )
-            except BankAccount.DoesNotExist:
+            recipiant_bank_account = self.get_recipient_holder()
+            if recipiant_bank_account is None:
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError(
                     f"Bank account with account number {self.recipient_address} does not exist"
                 )
 
-            if recipiant_bank_account == sender_account:
+            if recipiant_bank_account.pk == sender_account.pk:
                 self.transaction_status = self.TransactionStatus.FAILED
                 raise ValueError("Sender and Recipient bank account cannot be the same")
 
-            # Deducting money
-            sender_account.balance -= amount
-            sender_account.save()
-            # adding money
-            recipiant_bank_account.balance += amount
-            recipiant_bank_account.save()
-            self.transaction_status = self.TransactionStatus.COMPLETED
+            self.recipient = recipient_owner(recipiant_bank_account)
+            return sender_account, recipiant_bank_account
 
         else:
             raise ValueError("Transcation Type not supported")
+
+
+class LedgerEntry(models.Model):
+    """
+    One side of a money movement. Every posting writes a DEBIT and a CREDIT
+    entry for the same amount, the balance columns on Wallet and BankAccount
+    are cached projections of these rows.
+    An entry with neither a wallet nor a bank account is the outside world
+    (cash deposited or withdrawn).
+    """
+
+    class EntryType(models.TextChoices):
+        DEBIT = "Debit"
+        CREDIT = "Credit"
+
+    # entries outlive their transaction when it is archived (see archive.py)
+    # and keep its id, so no database constraint
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    entry_type = models.CharField(max_length=10, choices=EntryType.choices)
+    amount = models.DecimalField(
+        max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)]
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "ledger entries"
+
+    def __str__(self):
+        holder = self.wallet or self.bank_account or "external"
+        return f"{self.entry_type} {self.amount} on {holder}"
+
+
+class BalanceShard(models.Model):
+    """
+    Part of the balance of a hot wallet or bank account, on top of the
+    holder's own balance column. See shards.py.
+    """
+
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="shards",
+    )
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="shards",
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0.00)],
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "index"], name="unique_wallet_shard"
+            ),
+            models.UniqueConstraint(
+                fields=["bank_account", "index"], name="unique_bank_account_shard"
+            ),
+        ]
+
+    def __str__(self):
+        return f"shard {self.index} of {self.wallet or self.bank_account}"
+
+
+class IdempotencyKey(models.Model):
+    """A client supplied key a transaction was saved under, see idempotency.py."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=64)
+    # hash of what was asked for, a reused key must ask for the same thing
+    fingerprint = models.CharField(max_length=64, blank=True, default="")
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class MonthlyCashFlow(models.Model):
+    """
+    Money in and out of one wallet or bank account in one month and category,
+    kept up to date from the ledger. See cashflow.py.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cash_flows"
+    )
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="cash_flows",
+    )
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="cash_flows",
+    )
+    month = models.DateField()
+    category = models.CharField(max_length=30)
+    inflow = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outflow = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entries = models.PositiveIntegerField(default=0)
+    # a sharded holder spreads its postings over balance_shards rows per
+    # month and category like its credits, readers sum them
+    slot = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "month", "category", "slot"],
+                condition=models.Q(wallet__isnull=False),
+                name="unique_wallet_cash_flow",
+            ),
+            models.UniqueConstraint(
+                fields=["bank_account", "month", "category", "slot"],
+                condition=models.Q(bank_account__isnull=False),
+                name="unique_bank_account_cash_flow",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "month"], name="cashflow_user_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet or self.bank_account} {self.month:%Y-%m} {self.category}"
+
+
+class ScheduledTransfer(models.Model):
+    """
+    A standing order: a transfer the scheduler makes on the owner's behalf
+    at next_run_at, once or every day, week or month. See scheduler.py.
+    """
+
+    class Frequency(models.TextChoices):
+        ONCE = "Once"
+        DAILY = "Daily"
+        WEEKLY = "Weekly"
+        MONTHLY = "Monthly"
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="scheduled_transfers",
+    )
+    transaction_type = models.CharField(
+        max_length=30, choices=Transaction.TransactionType.choices
+    )
+    sender_bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="scheduled_transfers",
+    )
+    recipient_address = models.CharField(max_length=300)
+    amount = models.DecimalField(
+        max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)]
+    )
+    frequency = models.CharField(
+        max_length=10, choices=Frequency.choices, default=Frequency.MONTHLY
+    )
+    # occurrences are counted from starts_at so a monthly order on the 31st
+    # comes back to the 31st after a shorter month
+    starts_at = models.DateTimeField()
+    next_run_at = models.DateTimeField()
+    # which occurrence next_run_at is, it keeps its number when a run is retried
+    occurrence = models.PositiveIntegerField(default=0)
+    runs = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    # a scheduler process working on it, others skip it until then
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_transaction = models.ForeignKey(
+        Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    last_error = models.TextField(blank=True, default="")
+    failures = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the scheduler's due scan
+            models.Index(
+                fields=["next_run_at"],
+                condition=models.Q(is_active=True),
+                name="scheduled_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} to {self.recipient_address} ({self.frequency})"
+
+
+class ArchiveSegment(models.Model):
+    """A file of archived transactions under ARCHIVE_DIR, see archive.py."""
+
+    name = models.CharField(max_length=100, unique=True)
+    rows = models.PositiveIntegerField()
+    oldest = models.DateTimeField()
+    newest = models.DateTimeField()
+    # set once its transactions are gone from the transaction table
+    is_sealed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ArchiveBlock(models.Model):
+    """Where one user's transactions are in a segment, the per-user index."""
+
+    segment = models.ForeignKey(
+        ArchiveSegment, on_delete=models.CASCADE, related_name="blocks"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archive_blocks",
+    )
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveIntegerField()
+    rows = models.PositiveIntegerField()
+    oldest = models.DateTimeField()
+    newest = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # a history page reads the user's blocks newest first
+            models.Index(fields=["user", "newest"], name="archive_block_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.rows} rows of {self.user_id} in {self.segment_id}"
+
+
+# the LedgerEntry / BalanceShard / MonthlyCashFlow field pointing at each kind of holder
+HOLDER_FIELDS = {Wallet: "wallet", BankAccount: "bank_account"}
@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination, newest first, on (created_at, id).
+
+Instead of OFFSET the next page starts right after the last row the client
+saw, so every page is an index range scan of page_size rows however long the
+history is. The position travels in the URL as an opaque cursor token.
+"""
+
+import base64
+import heapq
+from dataclasses import dataclass
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (created_at, pk) for token, raises ValueError if it was tampered with."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if created_at is None:
+        raise ValueError("Invalid cursor")
+    return created_at, pk
+
+
+def after_cursor(queryset, cursor):
+    """Rows of queryset that come after cursor in newest first order."""
+    if cursor is None:
+        return queryset
+    created_at, pk = cursor
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+    )
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _sort_key(row):
+    return (row.created_at, row.pk)
+
+
+def keyset_page(querysets, cursor=None, page_size=50):
+    """
+    Return one page of the union of querysets, newest first.
+
+    Each queryset is one branch of the union (e.g. sent and received). Every
+    branch runs as its own LIMITed range scan on its (x, created_at) index and
+    the branches are merged here, a row found by several branches is kept once.
+    A branch that isn't a queryset provides after(cursor, limit) instead, e.g.
+    archive.ArchivedHistory.
+    """
+    branches = [
+        (
+            after_cursor(qs, cursor).order_by("-created_at", "-pk")[: page_size + 1]
+            if isinstance(qs, QuerySet)
+            else qs.after(cursor, page_size + 1)
+        )
+        for qs in querysets
+    ]
+    merged = heapq.merge(*branches, key=_sort_key, reverse=True)
+
+    items = []
+    seen = set()
+    for row in merged:
+        if row.pk in seen:
+            continue
+        seen.add(row.pk)
+        items.append(row)
+        if len(items) > page_size:
+            break
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+    return KeysetPage(items, next_cursor)
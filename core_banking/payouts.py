@@ -0,0 +1,181 @@
+"""
+Bulk payouts: many transfers from one funding wallet or bank account.
+
+A batch resolves every recipient in one query, debits the funding account
+once with the guarded debit for the total, credits all recipients with
+batched CASE updates and bulk_creates the Transaction rows and their ledger
+entries, all in one atomic block. Every line gets its own outcome, bad lines
+are rejected without failing the rest of the batch. If the funding account
+cannot cover the total, or the lines would break its velocity limits (see
+velocity.py), nothing moves.
+"""
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import balances, velocity
+from .ledger import record_many
+from .models import Transaction, Wallet
+from .receipts import get_receipt_generator
+from .recipients import recipient_owner, resolve_recipients
+from .summaries import invalidate_balance_summary
+
+MAX_LINES = 10_000
+MAX_AMOUNT = Decimal("99999999.99")
+
+
+@dataclass
+class PayoutResult:
+    line: int
+    recipient: str
+    amount: str
+    status: str
+    error: str = ""
+    receipt: str = ""
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _parse_amount(raw):
+    try:
+        amount = Decimal(str(raw).strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount != amount.quantize(Decimal("0.01")):
+        return None
+    if not Decimal("0.01") <= amount <= MAX_AMOUNT:
+        return None
+    return amount
+
+
+def _parse_recipient(raw):
+    """An email or account number, which JSON may send as a number."""
+    if isinstance(raw, str):
+        return raw.strip()
+    if isinstance(raw, int) and not isinstance(raw, bool):
+        return str(raw)
+    return None
+
+
+def _parse_lines(lines):
+    """A PayoutResult per line, and (result, recipient, amount) of the well-formed ones."""
+    results = []
+    parsed = []
+    for number, (raw_recipient, raw_amount) in enumerate(lines, 1):
+        recipient = _parse_recipient(raw_recipient)
+        result = PayoutResult(
+            number, recipient or str(raw_recipient or ""), str(raw_amount), "Rejected"
+        )
+        results.append(result)
+        amount = _parse_amount(raw_amount)
+        if not recipient:
+            result.error = "Invalid recipient"
+        elif amount is None:
+            result.error = "Invalid amount"
+        else:
+            parsed.append((result, recipient, amount))
+    return results, parsed
+
+
+def _payable(parsed, transaction_type, source):
+    """(result, holder, amount) of the lines whose recipient can be paid."""
+    resolved = resolve_recipients(transaction_type, [r for _, r, _ in parsed])
+    valid = []
+    for result, recipient, amount in parsed:
+        holder = resolved.get(recipient)
+        if holder is None:
+            result.error = "Unknown recipient"
+        elif holder.pk == source.pk:
+            result.error = "Cannot pay the funding account"
+        else:
+            valid.append((result, holder, amount))
+    return valid
+
+
+def _ensure_pks(txns):
+    # bulk_create only sets primary keys on backends that can return them
+    missing = [txn for txn in txns if txn.pk is None]
+    if missing:
+        pks = dict(
+            Transaction.objects.filter(
+                receipt__in=[txn.receipt for txn in missing]
+            ).values_list("receipt", "pk")
+        )
+        for txn in missing:
+            txn.pk = pks[txn.receipt]
+
+
+def _fail(results, valid, error):
+    for result, _, _ in valid:
+        result.status = Transaction.TransactionStatus.FAILED
+        result.error = str(error)
+    return results
+
+
+def run_payout(sender, source, lines):
+    """
+    Pay every (recipient, amount) of lines from source, a Wallet or
+    BankAccount of sender. Returns one PayoutResult per line, in order.
+    """
+    lines = list(lines)
+    if len(lines) > MAX_LINES:
+        raise ValueError(f"A payout batch can have at most {MAX_LINES} lines")
+
+    if isinstance(source, Wallet):
+        transaction_type = Transaction.TransactionType.WALLET
+    else:
+        transaction_type = Transaction.TransactionType.BANK_ACCOUNT
+
+    results, parsed = _parse_lines(lines)
+    valid = _payable(parsed, transaction_type, source)
+    if not valid:
+        return results
+
+    total = sum((amount for _, _, amount in valid), Decimal("0.00"))
+    generator = get_receipt_generator()
+    try:
+        # every line counts against the velocity limits of the source
+        velocity.check(source, total, count=len(valid))
+    except velocity.VelocityLimitExceeded as e:
+        return _fail(results, valid, e)
+
+    with transaction.atomic():
+        try:
+            balances.debit(source, total)
+        except balances.InsufficientFunds as e:
+            return _fail(results, valid, e)
+        velocity.record_on_commit(source, total, count=len(valid))
+
+        credits = defaultdict(Decimal)
+        for _, holder, amount in valid:
+            credits[holder.pk] += amount
+        balances.credit_many(type(source), credits)
+
+        txns = [
+            Transaction(
+                sender=sender,
+                recipient=recipient_owner(holder),
+                recipient_address=result.recipient,
+                sender_bank_account=None if isinstance(source, Wallet) else source,
+                transaction_type=transaction_type,
+                transaction_status=Transaction.TransactionStatus.COMPLETED,
+                amount=amount,
+                receipt=generator(),
+            )
+            for result, holder, amount in valid
+        ]
+        Transaction.objects.bulk_create(txns, batch_size=2000)
+        _ensure_pks(txns)
+        record_many((txn, source, holder) for txn, (_, holder, _) in zip(txns, valid))
+        invalidate_balance_summary(
+            *(recipient_owner(holder).pk for _, holder, _ in valid)
+        )
+
+    for txn, (result, _, _) in zip(txns, valid):
+        result.status = Transaction.TransactionStatus.COMPLETED
+        result.receipt = txn.receipt
+    return results
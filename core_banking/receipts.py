@@ -0,0 +1,165 @@
+"""
+Receipt number generators.
+
+Receipts used to be 5 random digits checked against the table with an
+``exists()`` query in a loop, which slows down as the table fills and never
+finishes once the 100,000 numbers are used up.
+The default generator builds Snowflake style ids instead: milliseconds since
+EPOCH, the worker id and a per-millisecond sequence packed into one integer,
+so ids are unique across workers without asking the database.
+
+    | 41 bits time | 10 bits worker | 12 bits sequence |  -> at most 19 digits
+
+The generator is picked with the RECEIPT_GENERATOR setting (a dotted path to a
+callable class taking ``worker_id``).
+
+Every process leases its own worker id in the ReceiptWorker table at its
+first receipt, for RECEIPT_WORKER_LEASE seconds, and renews it once half of
+that has passed, so forked workers and other hosts never share one. The id
+of a process that died is taken over once its lease expires. The lease is
+written on the caller's connection: inside an atomic block it commits or
+rolls back with the caller, and the process only relies on it once it has
+committed. Until then each receipt claims it again and finds the row its
+own transaction already holds. Use a generator for seconds, not for as long
+as the lease.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# 2025-01-01T00:00:00Z, before the first transaction of the project
+EPOCH_MS = 1735689600000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SnowflakeReceiptGenerator:
+    def __init__(self, worker_id, epoch_ms=EPOCH_MS, clock=time.time):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.epoch_ms = epoch_ms
+        self.clock = clock
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def _now_ms(self):
+        return int(self.clock() * 1000) - self.epoch_ms
+
+    def next_id(self):
+        with self.lock:
+            now = self._now_ms()
+            # never go back in time, keep counting on the last millisecond
+            # if the clock was adjusted
+            if now <= self.last_ms:
+                now = self.last_ms
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # 4096 ids used in this millisecond, wait for the next one
+                    while now <= self.last_ms:
+                        now = self._now_ms()
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return (
+                (now << (WORKER_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self.sequence
+            )
+
+    def __call__(self):
+        return str(self.next_id())
+
+
+class WorkerLease:
+    """The worker id one process leases in the ReceiptWorker table."""
+
+    def __init__(self):
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.worker_id = None
+        self.leased_until = None  # as far as committed
+        self.lock = threading.Lock()
+
+    def current(self):
+        """The worker id to use now, renews or claims the lease when it is due."""
+        from .models import ReceiptWorker
+
+        term = timedelta(seconds=settings.RECEIPT_WORKER_LEASE)
+        now = timezone.now()
+        with self.lock:
+            if self.leased_until is not None and now < self.leased_until - term / 2:
+                return self.worker_id
+
+        until = now + term
+        alias = router.db_for_write(ReceiptWorker)
+        worker_id = self._claim(ReceiptWorker.objects.using(alias), now, until)
+        transaction.on_commit(lambda: self._held(worker_id, until), using=alias)
+        return worker_id
+
+    def _held(self, worker_id, until):
+        with self.lock:
+            if self.leased_until is None or until > self.leased_until:
+                self.worker_id, self.leased_until = worker_id, until
+
+    def _claim(self, workers, now, until):
+        """Renew the id this process holds or take an expired or new one."""
+        while True:
+            mine = workers.filter(holder=self.holder)
+            expired = workers.filter(leased_until__lt=now)
+            candidates = [
+                *mine.values_list("worker_id", flat=True)[:1],
+                *expired.values_list("worker_id", flat=True)[:10],
+            ]
+            for worker_id in candidates:
+                claimable = (mine | expired).filter(pk=worker_id)
+                if claimable.update(holder=self.holder, leased_until=until):
+                    return worker_id
+            if candidates:
+                continue  # others took them in between
+
+            last = workers.aggregate(last=Max("worker_id"))["last"]
+            worker_id = 0 if last is None else last + 1
+            if worker_id > MAX_WORKER_ID:
+                raise RuntimeError("Every receipt worker id is leased")
+            try:
+                with transaction.atomic(using=workers.db):
+                    workers.create(
+                        worker_id=worker_id, holder=self.holder, leased_until=until
+                    )
+            except IntegrityError:
+                continue  # another process added it first
+            return worker_id
+
+
+_leases = {}
+_generators = {}
+
+
+def get_receipt_generator():
+    """
+    Return the generator of the current process for the worker id it leases.
+    Leases and generators are keyed by pid, a forked worker leases its own.
+    """
+    pid = os.getpid()
+    if pid not in _leases:
+        _leases.setdefault(pid, WorkerLease())
+    worker_id = _leases[pid].current()
+    key = (pid, worker_id)
+    if key not in _generators:
+        generator_class = import_string(settings.RECEIPT_GENERATOR)
+        _generators.setdefault(key, generator_class(worker_id=worker_id))
+    return _generators[key]
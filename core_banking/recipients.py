@@ -0,0 +1,59 @@
+"""
+Recipient resolution.
+
+Turns the recipient address of a transfer (an email for wallets, an account
+number for bank accounts) into the balance row to credit, with its owner, in
+one select_related query. TransactionForm resolves the recipient while
+validating and hands the result to the Transaction (remember_recipient), so
+the transfer itself does not look it up again.
+No row lock is taken: the credit is a single UPDATE (see balances.py).
+"""
+
+from .account_numbers import is_valid_account_number
+from .models import BankAccount, Transaction, Wallet
+
+
+def resolve_recipient(transaction_type, address):
+    """Return the Wallet or BankAccount behind address, or None."""
+    if not address:
+        return None
+    if transaction_type == Transaction.TransactionType.WALLET:
+        return Wallet.objects.select_related("user").filter(user__email=address).first()
+    if transaction_type == Transaction.TransactionType.BANK_ACCOUNT:
+        if not is_valid_account_number(address):
+            return None
+        return (
+            BankAccount.objects.select_related("owner")
+            .filter(account_number=address)
+            .first()
+        )
+    return None
+
+
+def recipient_owner(holder):
+    if isinstance(holder, Wallet):
+        return holder.user
+    return holder.owner
+
+
+def resolve_recipients(transaction_type, addresses, chunk_size=5000):
+    """
+    Bulk version of resolve_recipient, returns {address: holder} for the
+    addresses that exist. One query per chunk_size addresses.
+    """
+    addresses = list(set(addresses))
+    if transaction_type == Transaction.TransactionType.WALLET:
+        queryset = Wallet.objects.select_related("user")
+        lookup, key = "user__email__in", lambda wallet: wallet.user.email
+    elif transaction_type == Transaction.TransactionType.BANK_ACCOUNT:
+        addresses = [a for a in addresses if is_valid_account_number(a)]
+        queryset = BankAccount.objects.select_related("owner")
+        lookup, key = "account_number__in", lambda account: account.account_number
+    else:
+        return {}
+
+    resolved = {}
+    for i in range(0, len(addresses), chunk_size):
+        for holder in queryset.filter(**{lookup: addresses[i : i + chunk_size]}):
+            resolved[key(holder)] = holder
+    return resolved
@@ -0,0 +1,157 @@
+"""
+Parallel balance reconciliation.
+
+Checks every cached Wallet and BankAccount balance (shards included) against
+the ledger, which holds the postings of every completed transaction and the
+opening balances. Holders are split into partitions of consecutive ids and
+the partitions run across a process pool. A partition costs two queries, one
+grouped aggregate of its ledger entries over the id range and one scan of its
+holders, so the job never loads more than a partition into memory.
+
+Mismatches are appended to a CSV file as partitions finish. Finished
+partitions are recorded in a JSON checkpoint after their mismatches are
+flushed, and a resumed run skips them. A partition interrupted between the
+two is checked again, so its lines may appear twice.
+"""
+
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from .ledger import holder_balance, ledger_balances
+from .models import HOLDER_FIELDS
+from .shards import current_balance, pending_balances
+
+CSV_HEADER = ["kind", "pk", "cached", "ledger"]
+
+
+def partitions(model, size):
+    """
+    (first_pk, last_pk) ranges of size ids covering every holder of model.
+    They start at multiples of size, so a resumed run cuts the same ranges
+    as the checkpoint it resumes even if holders came or went in between.
+    """
+    bounds = model.objects.aggregate(first=Min("pk"), last=Max("pk"))
+    if bounds["first"] is None:
+        return []
+    start = bounds["first"] - bounds["first"] % size
+    return [
+        (first, first + size - 1) for first in range(start, bounds["last"] + 1, size)
+    ]
+
+
+def _recheck(model, pks):
+    """
+    Check pks again with their rows locked, a posting that committed between
+    the two queries of the partition is not a mismatch.
+    """
+    mismatches = []
+    with transaction.atomic():
+        for holder in model.objects.select_for_update().filter(pk__in=pks):
+            cached, expected = current_balance(holder), holder_balance(holder)
+            if cached != expected:
+                mismatches.append((holder.pk, cached, expected))
+    return mismatches
+
+
+def reconcile_partition(kind, first_pk, last_pk):
+    """[(pk, cached, expected)] of the holders first_pk..last_pk that disagree."""
+    model = next(m for m, field in HOLDER_FIELDS.items() if field == kind)
+    expected = ledger_balances(model, (first_pk, last_pk))
+    holders = list(
+        model.objects.filter(pk__range=(first_pk, last_pk)).values_list(
+            "pk", "balance", "balance_shards"
+        )
+    )
+    pending = pending_balances(model, [pk for pk, _, shards in holders if shards])
+    suspects = [
+        pk
+        for pk, balance, _ in holders
+        if balance + pending.get(pk, 0) != expected.get(pk, Decimal("0.00"))
+    ]
+    return _recheck(model, suspects) if suspects else []
+
+
+class Checkpoint:
+    """The partitions a reconciliation finished, kept in a JSON file."""
+
+    def __init__(self, path, partition_size):
+        self.path = path
+        self.partition_size = partition_size
+        self.done = set()
+        self.mismatches = 0
+
+    @classmethod
+    def load(cls, path, partition_size):
+        checkpoint = cls(path, partition_size)
+        if not os.path.exists(path):
+            return checkpoint
+        with open(path) as f:
+            data = json.load(f)
+        if data["partition_size"] != partition_size:
+            raise ValueError(
+                f"The checkpoint was written with partitions of "
+                f"{data['partition_size']} ids, resume with the same size"
+            )
+        checkpoint.done = {(kind, first) for kind, first in data["done"]}
+        checkpoint.mismatches = data["mismatches"]
+        return checkpoint
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "partition_size": self.partition_size,
+                    "done": sorted(self.done),
+                    "mismatches": self.mismatches,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def reconcile(
+    output, checkpoint_path, partition_size=10000, processes=None, resume=False
+):
+    """
+    Reconcile every wallet and bank account, appending mismatches to the CSV
+    file output. With resume the partitions in checkpoint_path are skipped.
+    Yields (partitions finished, partitions in total, mismatches so far) once
+    at the start and then as partitions finish.
+    """
+    if resume:
+        checkpoint = Checkpoint.load(checkpoint_path, partition_size)
+    else:
+        checkpoint = Checkpoint(checkpoint_path, partition_size)
+    jobs = [
+        (kind, first, last)
+        for model, kind in HOLDER_FIELDS.items()
+        for first, last in partitions(model, partition_size)
+        if (kind, first) not in checkpoint.done
+    ]
+    total = len(jobs) + len(checkpoint.done)
+    yield len(checkpoint.done), total, checkpoint.mismatches
+
+    with open(output, "a" if resume else "w", newline="") as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(CSV_HEADER)
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+            futures = {pool.submit(reconcile_partition, *job): job for job in jobs}
+            for future in as_completed(futures):
+                kind, first, _ = futures[future]
+                mismatches = future.result()
+                writer.writerows((kind, *mismatch) for mismatch in mismatches)
+                f.flush()
+                checkpoint.done.add((kind, first))
+                checkpoint.mismatches += len(mismatches)
+                checkpoint.save()
+                yield len(checkpoint.done), total, checkpoint.mismatches
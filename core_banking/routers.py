@@ -0,0 +1,125 @@
+"""
+Read replica routing.
+
+Every query goes to the primary ("default") unless the request is one of
+the read-only pages (views with read_from_replica = True and the admin
+changelists), in which case ReplicaRoutingMiddleware picks one replica from
+DATABASE_REPLICAS for the whole request and ReplicaRouter sends its reads
+there. Writes always go to the primary.
+
+Read-your-writes: a request that wrote anything pins its user to the primary
+for REPLICA_STICKY_SECONDS, so the pages they open next do not show a
+replica that has not caught up with their own transfer yet. The pin is a
+signed cookie, whichever process serves the next request sees it.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@dataclass
+class RoutingState:
+    replica: str | None = None
+    wrote: bool = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+PIN_COOKIE = "db_primary_pin"
+
+
+def pin_to_primary(response, user_id):
+    """Send the next requests of user_id to the primary, see is_pinned_to_primary."""
+    response.set_signed_cookie(
+        PIN_COOKIE,
+        user_id,
+        salt=PIN_COOKIE,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def is_pinned_to_primary(request):
+    """Whether the user of request wrote in the last REPLICA_STICKY_SECONDS."""
+    user_id = request.get_signed_cookie(
+        PIN_COOKIE,
+        default=None,
+        salt=PIN_COOKIE,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+    )
+    return user_id is not None and user_id == str(request.user.pk)
+
+
+@contextmanager
+def routing_state():
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_replica(alias=None):
+    """Send reads in the block to alias, a random replica by default."""
+    replicas = settings.DATABASE_REPLICAS
+    state = RoutingState(
+        replica=alias or (random.choice(replicas) if replicas else None)
+    )
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary in the block, even on a replica request."""
+    token = _state.set(RoutingState())
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None:
+            return None
+        # reads inside a transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
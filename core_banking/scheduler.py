@@ -0,0 +1,183 @@
+"""
+Standing orders.
+
+The run_scheduled_transfers command calls run_due_batch in a loop. A batch
+claims up to batch_size due ScheduledTransfers, resolves all their
+recipients with one query per transfer type, makes every transfer through
+Transaction.save() and advances all the schedules with one bulk_update.
+
+Several schedulers can run at once. Claiming takes due rows that nobody has
+claimed (or whose claim expired) with SKIP LOCKED and stamps them with
+claimed_until, so other processes skip them. Each transfer is saved under
+the idempotency key of its occurrence (see idempotency.py). A scheduler that
+overruns its claim and has its rows picked up by another therefore cannot
+pay an occurrence twice; the second one gets the first one's transaction.
+
+An order that fails (insufficient funds, recipient gone) records the error
+and moves on to its next occurrence. One that hits a velocity limit, or any
+other error (a locked database), records it and is tried again a minute
+later under the same key. Occurrences missed while no scheduler ran are paid
+once, then the order continues with its next future occurrence.
+
+The bulk_update never writes is_active, staff may deactivate an order while
+a batch runs. The orders a batch ended are deactivated on their own.
+"""
+
+import calendar
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .idempotency import save_once
+from .models import ScheduledTransfer, Transaction
+from .recipients import resolve_recipients
+from .velocity import VelocityLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+RETRY = timedelta(minutes=1)
+UPDATED_FIELDS = [
+    "next_run_at",
+    "occurrence",
+    "runs",
+    "claimed_until",
+    "last_run_at",
+    "last_transaction",
+    "last_error",
+    "failures",
+]
+
+
+def _add_months(moment, months):
+    month = moment.month - 1 + months
+    year, month = moment.year + month // 12, month % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def occurrence_at(order, n):
+    """When the n-th run of order after starts_at falls, in local wall-clock time."""
+    start = timezone.localtime(order.starts_at).replace(tzinfo=None)
+    if order.frequency == ScheduledTransfer.Frequency.DAILY:
+        moment = start + timedelta(days=n)
+    elif order.frequency == ScheduledTransfer.Frequency.WEEKLY:
+        moment = start + timedelta(weeks=n)
+    elif order.frequency == ScheduledTransfer.Frequency.MONTHLY:
+        moment = _add_months(start, n)
+    else:
+        return None
+    return timezone.make_aware(moment)
+
+
+def next_occurrence(order, after):
+    """
+    The number and time of the first occurrence of order after the current
+    one later than after, (None, None) for a one-off.
+    """
+    n = order.occurrence + 1
+    moment = occurrence_at(order, n)
+    while moment is not None and moment <= after:
+        n += 1
+        moment = occurrence_at(order, n)
+    return (n, moment) if moment is not None else (None, None)
+
+
+def occurrence_key(order):
+    """The idempotency key of the current occurrence of order."""
+    return f"scheduled-{order.pk}-{order.occurrence}"
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        orders = list(
+            ScheduledTransfer.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("owner__wallet", "sender_bank_account")
+            .filter(is_active=True, next_run_at__lte=now)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by("next_run_at")[:batch_size]
+        )
+        ScheduledTransfer.objects.filter(pk__in=[o.pk for o in orders]).update(
+            claimed_until=now + timedelta(seconds=settings.SCHEDULER_LEASE)
+        )
+    return orders
+
+
+def _resolve(orders):
+    addresses = {}
+    for order in orders:
+        addresses.setdefault(order.transaction_type, set()).add(order.recipient_address)
+    return {
+        transaction_type: resolve_recipients(transaction_type, batch)
+        for transaction_type, batch in addresses.items()
+    }
+
+
+def _run(order, recipients):
+    """Make the transfer of order's due occurrence, returns the outcome."""
+    txn = Transaction(
+        sender=order.owner,
+        transaction_type=order.transaction_type,
+        sender_bank_account=order.sender_bank_account,
+        recipient_address=order.recipient_address,
+        amount=order.amount,
+    )
+    txn.remember_recipient(
+        order.transaction_type,
+        order.recipient_address,
+        recipients.get(order.transaction_type, {}).get(order.recipient_address),
+    )
+    try:
+        result = save_once(txn, occurrence_key(order))
+    except VelocityLimitExceeded as e:
+        order.last_error = str(e)
+        order.next_run_at = timezone.now() + RETRY
+        return "deferred"
+    except ValueError as e:
+        order.last_error = str(e)
+        order.failures += 1
+        outcome = "failed"
+    except Exception as e:
+        logger.exception("Standing order %s failed", order.pk)
+        order.last_error = f"{type(e).__name__}: {e}"
+        order.failures += 1
+        order.next_run_at = timezone.now() + RETRY
+        return "deferred"
+    else:
+        order.last_error = ""
+        order.last_transaction_id = result.transaction_id
+        outcome = "completed"
+
+    order.last_run_at = timezone.now()
+    order.runs += 1
+    n, moment = next_occurrence(order, order.last_run_at)
+    if moment is None:
+        order.is_active = False
+    else:
+        order.occurrence, order.next_run_at = n, moment
+    return outcome
+
+
+def run_due_batch(batch_size=500):
+    """
+    Run up to batch_size due standing orders. Returns {outcome: count} with
+    the outcomes "completed", "failed" and "deferred".
+    """
+    orders = _claim(batch_size)
+    outcomes = {"completed": 0, "failed": 0, "deferred": 0}
+    if not orders:
+        return outcomes
+
+    recipients = _resolve(orders)
+    for order in orders:
+        outcomes[_run(order, recipients)] += 1
+        order.claimed_until = None
+    ScheduledTransfer.objects.bulk_update(orders, UPDATED_FIELDS, batch_size=500)
+    ended = [order.pk for order in orders if not order.is_active]
+    if ended:
+        ScheduledTransfer.objects.filter(pk__in=ended).update(is_active=False)
+    return outcomes
@@ -0,0 +1,102 @@
+"""
+Sharded balances for hot accounts.
+
+Every credit is an UPDATE of the holder's balance row, so a merchant paid by
+thousands of customers at once serializes on that one row. A holder with
+balance_shards = N (set_balance_shards) gets N BalanceShard rows and each
+credit goes to a random one of them instead. Shards never go negative and
+sit on top of the holder's own balance column:
+
+    balance = holder.balance + sum of its shards
+
+Debits take from the holder row first, then from any single shard that can
+cover them, and only when the money is spread across shards fold them all
+back into the holder row. The ledger does not know about shards, entries are
+still posted against the holder.
+"""
+
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import HOLDER_FIELDS, BalanceShard
+
+
+def _shards(holder):
+    return BalanceShard.objects.filter(**{HOLDER_FIELDS[type(holder)]: holder})
+
+
+def credit_shard(holder, amount):
+    """Add amount to a random shard of holder, False if that shard is missing."""
+    index = random.randrange(holder.balance_shards)
+    return bool(
+        _shards(holder).filter(index=index).update(balance=F("balance") + amount)
+    )
+
+
+def debit_shard(holder, amount):
+    """Take amount from one shard that holds enough, False if none does."""
+    candidates = list(
+        _shards(holder).filter(balance__gte=amount).values_list("pk", flat=True)
+    )
+    random.shuffle(candidates)
+    for pk in candidates:
+        # another debit may have drained it since
+        if BalanceShard.objects.filter(pk=pk, balance__gte=amount).update(
+            balance=F("balance") - amount
+        ):
+            return True
+    return False
+
+
+def fold_shards(holder):
+    """Move everything held in holder's shards back to its balance row."""
+    with transaction.atomic():
+        rows = list(_shards(holder).select_for_update().values_list("pk", "balance"))
+        total = sum((balance for _, balance in rows), Decimal("0.00"))
+        if total:
+            type(holder).objects.filter(pk=holder.pk).update(
+                balance=F("balance") + total
+            )
+            BalanceShard.objects.filter(pk__in=[pk for pk, _ in rows]).update(balance=0)
+    return total
+
+
+def pending_balances(model, pks=None):
+    """{pk: amount held in shards} for the sharded holders of model, or of pks."""
+    field = HOLDER_FIELDS[model]
+    shards = BalanceShard.objects.filter(**{f"{field}__isnull": False})
+    if pks is not None:
+        shards = shards.filter(**{f"{field}__in": pks})
+    rows = (
+        shards.values(field).annotate(total=Sum("balance")).values_list(field, "total")
+    )
+    return {pk: Decimal(str(total)).quantize(Decimal("0.01")) for pk, total in rows}
+
+
+def current_balance(holder):
+    """The balance of holder as stored right now, shards included."""
+    model = type(holder)
+    balance = model.objects.filter(pk=holder.pk).values_list("balance", flat=True).get()
+    if holder.balance_shards:
+        balance += pending_balances(model, [holder.pk]).get(holder.pk, 0)
+    return balance
+
+
+def set_balance_shards(holder, count):
+    """
+    Spread holder's future credits over count shards, 0 or 1 turns sharding
+    off. Whatever the old shards held is folded into the balance row first.
+    """
+    count = count if count > 1 else 0
+    with transaction.atomic():
+        fold_shards(holder)
+        _shards(holder).delete()
+        BalanceShard.objects.bulk_create(
+            BalanceShard(index=i, **{HOLDER_FIELDS[type(holder)]: holder})
+            for i in range(count)
+        )
+        type(holder).objects.filter(pk=holder.pk).update(balance_shards=count)
+    holder.balance_shards = count
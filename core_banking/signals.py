@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BankAccount, Wallet
+from .summaries import holder_user_id, invalidate_balance_summary
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_save, sender=BankAccount)
+@receiver(post_delete, sender=Wallet)
+@receiver(post_delete, sender=BankAccount)
+def drop_balance_summary(sender, instance, **kwargs):
+    # balance changes made with update() are handled in balances.py
+    invalidate_balance_summary(holder_user_id(instance))
@@ -0,0 +1,133 @@
+"""
+Monthly statement rendering.
+
+A statement lists the ledger entries of one wallet or bank account for one
+month, its totals come from the monthly cash-flow rows. The HTML is rendered
+first (cheap) and hashed, the PDF is only produced when no file exists yet
+for (account, period, content hash), so re-running month-end never
+re-renders an unchanged statement. Batches are spread over a process pool,
+each worker keeps one font configuration and one parsed stylesheet for all
+the statements it renders (see pdf.py).
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .cashflow import balance_before, holder_cash_flow
+from .ledger import HOLDER_FIELDS, holder_entries
+from .models import BankAccount, Wallet
+
+TEMPLATE_NAME = "main_bank/statement.html"
+KINDS = {field: model for model, field in HOLDER_FIELDS.items()}
+
+
+def parse_period(period):
+    """'2025-01' -> (start, end) aware datetimes of that month."""
+    try:
+        start = datetime.strptime(period, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Period must look like YYYY-MM, got {period}")
+    year, month = divmod(start.month, 12)
+    end = start.replace(year=start.year + year, month=month + 1)
+    tz = timezone.get_current_timezone()
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def statement_context(holder, period):
+    start, end = parse_period(period)
+    entries = list(
+        holder_entries(holder)
+        .filter(created_at__gte=start, created_at__lt=end)
+        .select_related("transaction")
+        .order_by("created_at", "pk")
+    )
+    # totals come from the monthly cash-flow rows, see cashflow.py
+    month = start.date()
+    opening = balance_before(holder, month)
+    money_in, money_out = holder_cash_flow(holder, month, end.date())
+    return {
+        "holder": holder,
+        "period": period,
+        "entries": entries,
+        "opening_balance": opening,
+        "money_in": money_in,
+        "money_out": money_out,
+        "closing_balance": opening + money_in - money_out,
+    }
+
+
+def statement_path(kind, holder_pk, period, content_hash):
+    return (
+        Path(settings.STATEMENTS_ROOT)
+        / period
+        / f"{kind}-{holder_pk}-{content_hash[:16]}.pdf"
+    )
+
+
+def render_statement(holder, period):
+    """
+    Render the statement of holder for period unless an identical one exists.
+    Returns (path, rendered) where rendered is False for a cache hit.
+    """
+    from pdf import PDFGenerator
+
+    kind = HOLDER_FIELDS[type(holder)]
+    generator = PDFGenerator(
+        TEMPLATE_NAME,
+        statement_context(holder, period),
+        css_path=settings.STATEMENT_CSS,
+    )
+    html_string = generator.render_html()
+    content_hash = hashlib.sha256(html_string.encode()).hexdigest()
+    path = statement_path(kind, holder.pk, period, content_hash)
+    if path.exists():
+        return path, False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write next to the target and rename so a crash never leaves half a PDF
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    generator.generate_pdf(output_path=tmp_path, html_string=html_string)
+    os.replace(tmp_path, path)
+    return path, True
+
+
+def _render_chunk(kind, pks, period):
+    model = KINDS[kind]
+    rendered = 0
+    for holder in model.objects.filter(pk__in=pks):
+        _, was_rendered = render_statement(holder, period)
+        rendered += was_rendered
+    return len(pks), rendered
+
+
+def render_statements(period, processes=None, chunk_size=200):
+    """
+    Render the statements of every wallet and bank account for period across
+    a process pool, one worker per core by default.
+    Returns (statements, rendered), the difference are cache hits.
+    """
+    parse_period(period)  # fail before starting the pool
+    jobs = []
+    for model in (Wallet, BankAccount):
+        pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        kind = HOLDER_FIELDS[model]
+        for i in range(0, len(pks), chunk_size):
+            jobs.append((kind, pks[i : i + chunk_size], period))
+
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    total = rendered = 0
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [pool.submit(_render_chunk, *job) for job in jobs]
+        for future in futures:
+            done, new = future.result()
+            total += done
+            rendered += new
+    return total, rendered
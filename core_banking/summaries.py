@@ -0,0 +1,109 @@
+"""
+Cached per-user balance summaries.
+
+HomeView and BankAccountListView read the wallet and account balances from
+one cached BalanceSummary instead of querying them on every page view.
+Every balance mutation drops the summary of the affected user once its
+transaction commits (see balances.py and signals.py), the next read rebuilds
+it. BALANCE_SUMMARY_TIMEOUT bounds how long a summary rebuilt from a
+read that raced a commit can stay stale. Another process can only see the
+drop through a shared cache, settings require one outside DEBUG.
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .instrumentation import record_cache_lookup
+from .models import BankAccount, Wallet
+from .routers import use_primary
+from .shards import pending_balances
+
+
+@dataclass
+class AccountSummary:
+    pk: int
+    account_number: str
+    account_type: str
+    balance: Decimal
+
+    def __str__(self):
+        return f"{self.account_number} - {self.account_type}"
+
+
+@dataclass
+class BalanceSummary:
+    wallet_balance: Decimal | None
+    accounts: list[AccountSummary] = field(default_factory=list)
+
+    @property
+    def has_wallet(self):
+        return self.wallet_balance is not None
+
+    @property
+    def total(self):
+        return (self.wallet_balance or Decimal("0.00")) + sum(
+            (account.balance for account in self.accounts), Decimal("0.00")
+        )
+
+
+def summary_key(user_id):
+    return f"balance-summary:{user_id}"
+
+
+def build_balance_summary(user_id):
+    wallet = (
+        Wallet.objects.filter(user_id=user_id)
+        .values_list("pk", "balance", "balance_shards")
+        .first()
+    )
+    wallet_balance = None
+    if wallet:
+        pk, wallet_balance, sharded = wallet
+        if sharded:
+            wallet_balance += pending_balances(Wallet, [pk]).get(pk, 0)
+
+    rows = list(
+        BankAccount.objects.filter(owner_id=user_id)
+        .order_by("pk")
+        .values_list(
+            "pk", "account_number", "account_type", "balance", "balance_shards"
+        )
+    )
+    # hot accounts keep part of their balance in shards, see shards.py
+    sharded = [row[0] for row in rows if row[4]]
+    pending = pending_balances(BankAccount, sharded) if sharded else {}
+    accounts = [
+        AccountSummary(pk, number, kind, balance + pending.get(pk, 0))
+        for pk, number, kind, balance, _ in rows
+    ]
+    return BalanceSummary(wallet_balance, accounts)
+
+
+def get_balance_summary(user):
+    key = summary_key(user.pk)
+    summary = cache.get(key)
+    record_cache_lookup(summary is not None)
+    if summary is None:
+        # balances are cached, never from a replica that may lag behind
+        with use_primary():
+            summary = build_balance_summary(user.pk)
+        cache.set(key, summary, settings.BALANCE_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_balance_summary(*user_ids):
+    """Drop the summaries of user_ids once the current transaction commits."""
+    keys = [summary_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def holder_user_id(holder):
+    """The user whose summary shows holder's balance."""
+    if isinstance(holder, Wallet):
+        return holder.user_id
+    return holder.owner_id
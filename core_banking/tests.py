@@ -1 +1,694 @@
-# Create your tests here.
+import multiprocessing
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .account_numbers import (
+    AccountNumberAllocator,
+    _allocators,
+    is_valid_account_number,
+)
+from .archive import archive_transactions
+from .balances import InsufficientFunds
+from .cashflow import holder_cash_flow
+from .forms import TransactionForm
+from .idempotency import save_once
+from .ledger import verify_balances
+from .models import (
+    BalanceShard,
+    BankAccount,
+    LedgerEntry,
+    MonthlyCashFlow,
+    ReceiptWorker,
+    ScheduledTransfer,
+    Transaction,
+    User,
+    Wallet,
+)
+from .receipts import WorkerLease, get_receipt_generator
+from .reconcile import partitions
+from .routers import PIN_COOKIE, is_pinned_to_primary, pin_to_primary
+from .scheduler import run_due_batch
+from .shards import current_balance, set_balance_shards
+from .velocity import VelocityLimitExceeded
+
+
+def make_user(email, **extra_fields):
+    return User.objects.create_user(
+        email, "pw", first_name="Test", last_name="User", **extra_fields
+    )
+
+
+def deposit(user, amount, account=None):
+    Transaction(
+        sender=user,
+        transaction_type=(
+            Transaction.TransactionType.BANK_ACCOUNT
+            if account
+            else Transaction.TransactionType.WALLET
+        ),
+        transaction_category=Transaction.TransactionCategory.DEPOSIT,
+        sender_bank_account=account,
+        amount=Decimal(amount),
+    ).save()
+
+
+def wallet_transfer(sender, recipient, amount):
+    txn = Transaction(
+        sender=sender,
+        transaction_type=Transaction.TransactionType.WALLET,
+        recipient_address=recipient.email,
+        amount=Decimal(amount),
+    )
+    txn.save()
+    return txn
+
+
+def assert_ledger_balanced(test):
+    """Every transfer posts a debit and a credit of the same amount, and
+    every balance matches its ledger entries."""
+    for model in (Wallet, BankAccount):
+        test.assertEqual(list(verify_balances(model)), [])
+    totals = LedgerEntry.objects.values("entry_type").annotate(total=Sum("amount"))
+    totals = {row["entry_type"]: row["total"] for row in totals}
+    test.assertEqual(
+        totals.get(LedgerEntry.EntryType.DEBIT),
+        totals.get(LedgerEntry.EntryType.CREDIT),
+    )
+
+
+@override_settings(VELOCITY_LIMITS={})
+class TransferTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        deposit(self.alice, "100.00")
+
+    def test_wallet_transfer_moves_money(self):
+        wallet_transfer(self.alice, self.bob, "30.00")
+        self.alice.wallet.refresh_from_db()
+        self.bob.wallet.refresh_from_db()
+        self.assertEqual(self.alice.wallet.balance, Decimal("70.00"))
+        self.assertEqual(self.bob.wallet.balance, Decimal("30.00"))
+        assert_ledger_balanced(self)
+
+    def test_insufficient_funds(self):
+        txn = Transaction(
+            sender=self.alice,
+            transaction_type=Transaction.TransactionType.WALLET,
+            recipient_address=self.bob.email,
+            amount=Decimal("100.01"),
+        )
+        with self.assertRaises(InsufficientFunds):
+            txn.save()
+        self.assertEqual(txn.transaction_status, Transaction.TransactionStatus.FAILED)
+        self.alice.wallet.refresh_from_db()
+        self.bob.wallet.refresh_from_db()
+        self.assertEqual(self.alice.wallet.balance, Decimal("100.00"))
+        self.assertEqual(self.bob.wallet.balance, Decimal("0.00"))
+        self.assertFalse(Transaction.objects.filter(recipient=self.bob).exists())
+        assert_ledger_balanced(self)
+
+    def test_insufficient_funds_on_withdrawal(self):
+        with self.assertRaises(ValueError):
+            Transaction(
+                sender=self.alice,
+                transaction_type=Transaction.TransactionType.WALLET,
+                transaction_category=Transaction.TransactionCategory.WAITHDRAWAL,
+                amount=Decimal("150.00"),
+            ).save()
+        self.alice.wallet.refresh_from_db()
+        self.assertEqual(self.alice.wallet.balance, Decimal("100.00"))
+
+    def test_ledger_stays_balanced(self):
+        account = BankAccount.objects.create(owner=self.alice)
+        other = BankAccount.objects.create(owner=self.bob)
+        deposit(self.alice, "50.00", account)
+        wallet_transfer(self.alice, self.bob, "10.00")
+        wallet_transfer(self.bob, self.alice, "4.00")
+        Transaction(
+            sender=self.alice,
+            transaction_type=Transaction.TransactionType.BANK_ACCOUNT,
+            sender_bank_account=account,
+            recipient_address=other.account_number,
+            amount=Decimal("20.00"),
+        ).save()
+        Transaction(
+            sender=self.bob,
+            transaction_type=Transaction.TransactionType.BANK_ACCOUNT,
+            transaction_category=Transaction.TransactionCategory.WAITHDRAWAL,
+            sender_bank_account=other,
+            amount=Decimal("5.00"),
+        ).save()
+        assert_ledger_balanced(self)
+        held = sum(
+            model.objects.aggregate(total=Sum("balance"))["total"]
+            for model in (Wallet, BankAccount)
+        )
+        # 150 deposited, 5 withdrawn
+        self.assertEqual(held, Decimal("145.00"))
+
+
+@override_settings(VELOCITY_LIMITS={})
+class DoubleSpendTests(TransactionTestCase):
+    def test_concurrent_transfers_never_overdraw(self):
+        alice = make_user("alice@example.com")
+        recipients = [make_user(f"r{i}@example.com") for i in range(4)]
+        deposit(alice, "100.00")
+        outcomes = []
+        barrier = threading.Barrier(len(recipients))
+
+        def spend(recipient):
+            try:
+                barrier.wait()
+                wallet_transfer(alice, recipient, "60.00")
+                outcomes.append("completed")
+            except InsufficientFunds:
+                outcomes.append("insufficient")
+            except OperationalError:
+                outcomes.append("locked")
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=spend, args=(recipient,))
+            for recipient in recipients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("completed"), 1)
+        self.assertEqual(outcomes.count("locked"), 0)
+        alice.wallet.refresh_from_db()
+        self.assertEqual(alice.wallet.balance, Decimal("40.00"))
+        self.assertEqual(
+            Transaction.objects.filter(
+                sender=alice, transaction_category__isnull=True
+            ).count(),
+            1,
+        )
+        assert_ledger_balanced(self)
+
+
+def _receipts(barrier, results, count):
+    barrier.wait()
+    generator = get_receipt_generator()
+    results.put((generator.worker_id, [generator() for _ in range(count)]))
+    connection.close()
+
+
+class ReceiptWorkerTests(TransactionTestCase):
+    def test_forked_processes_never_collide(self):
+        # forked processes must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        barrier, results = context.Barrier(2), context.Queue()
+        processes = [
+            context.Process(target=_receipts, args=(barrier, results, 20000))
+            for _ in range(2)
+        ]
+        for process in processes:
+            process.start()
+        (first_id, first), (second_id, second) = results.get(), results.get()
+        for process in processes:
+            process.join()
+
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual(len(set(first) | set(second)), 40000)
+        self.assertEqual(
+            set(ReceiptWorker.objects.values_list("worker_id", flat=True)),
+            {first_id, second_id},
+        )
+
+    def test_expired_lease_is_taken_over(self):
+        first = WorkerLease()
+        worker_id = first.current()
+        self.assertEqual(first.current(), worker_id)
+        self.assertNotEqual(WorkerLease().current(), worker_id)
+
+        ReceiptWorker.objects.filter(pk=worker_id).update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(WorkerLease().current(), worker_id)
+
+
+class VelocityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        deposit(self.alice, "100.00")
+
+    def transfer(self, amount):
+        # the counters are recorded once the transfer commits
+        with self.captureOnCommitCallbacks(execute=True):
+            wallet_transfer(self.alice, self.bob, amount)
+
+    @override_settings(VELOCITY_LIMITS={"Wallet": {"minute": {"count": 2}}})
+    def test_count_limit(self):
+        self.transfer("1.00")
+        self.transfer("1.00")
+        with self.assertRaises(VelocityLimitExceeded):
+            self.transfer("1.00")
+        self.alice.wallet.refresh_from_db()
+        self.assertEqual(self.alice.wallet.balance, Decimal("98.00"))
+
+    @override_settings(VELOCITY_LIMITS={"Wallet": {"day": {"amount": "50.00"}}})
+    def test_amount_limit(self):
+        self.transfer("40.00")
+        with self.assertRaises(VelocityLimitExceeded):
+            self.transfer("10.01")
+        self.transfer("10.00")
+
+
+class TransactionFormTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice@example.com")
+        self.account = BankAccount.objects.create(owner=self.alice)
+
+    def recipient_errors(self, transaction_type, recipient_address):
+        form = TransactionForm(
+            data={
+                "transaction_type": transaction_type,
+                "amount": "1.00",
+                "recipient_address": recipient_address,
+                "sender_bank_account": self.account.pk,
+            }
+        )
+        form.is_valid()
+        return form.errors.get("recipient_address", [])
+
+    def test_recipient_errors(self):
+        wallet = Transaction.TransactionType.WALLET
+        bank = Transaction.TransactionType.BANK_ACCOUNT
+        number = self.account.account_number
+        typo = number[:-1] + str((int(number[-1]) + 1) % 10)
+        cases = [
+            (wallet, "alice@example.com", []),
+            (wallet, "alice", ["Please enter a valid email address."]),
+            (wallet, "nobody@example.com", ["No user with this email address."]),
+            (
+                bank,
+                typo,
+                ["This bank account number is not valid, please check it for typos."],
+            ),
+            (bank, number, ["You cannot send money to your own bank account."]),
+        ]
+        for transaction_type, address, errors in cases:
+            with self.subTest(address):
+                self.assertEqual(
+                    self.recipient_errors(transaction_type, address), errors
+                )
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        deposit(self.alice, "100.00")
+
+    def transfer(self, amount):
+        return Transaction(
+            sender=self.alice,
+            transaction_type=Transaction.TransactionType.WALLET,
+            recipient_address=self.bob.email,
+            amount=Decimal(amount),
+        )
+
+    def test_retry_returns_the_original_transaction(self):
+        first = save_once(self.transfer("10.00"), "key-1")
+        retry = save_once(self.transfer("10.00"), "key-1")
+        self.assertTrue(retry.replayed)
+        self.assertEqual(retry.transaction_id, first.transaction_id)
+        self.alice.wallet.refresh_from_db()
+        self.assertEqual(self.alice.wallet.balance, Decimal("90.00"))
+
+    def test_key_reused_for_a_different_request(self):
+        save_once(self.transfer("10.00"), "key-1")
+        for _ in range(2):  # answered from the cache, then from the database
+            with self.assertRaisesMessage(ValueError, "different request"):
+                save_once(self.transfer("20.00"), "key-1")
+            cache.clear()
+        self.assertEqual(Transaction.objects.filter(amount=Decimal("20.00")).count(), 0)
+
+    @override_settings(VELOCITY_LIMITS={"Wallet": {"minute": {"count": 1}}})
+    def test_velocity_is_checked_before_the_write_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            save_once(self.transfer("1.00"), "key-1")
+        opened = []
+        atomic = transaction.atomic
+
+        def spy(*args, **kwargs):
+            opened.append(True)
+            return atomic(*args, **kwargs)
+
+        with mock.patch("core_banking.idempotency.transaction.atomic", spy):
+            with self.assertRaises(VelocityLimitExceeded):
+                save_once(self.transfer("1.00"), "key-2")
+            # a retry of the first one is not held by the limit
+            self.assertTrue(save_once(self.transfer("1.00"), "key-1").replayed)
+        self.assertEqual(opened, [])
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user("alice@example.com")
+        self.bob = make_user("bob@example.com")
+        deposit(self.alice, "100.00")
+
+    def order(self, frequency=ScheduledTransfer.Frequency.MONTHLY):
+        due = timezone.now() - timedelta(minutes=1)
+        return ScheduledTransfer.objects.create(
+            owner=self.alice,
+            transaction_type=Transaction.TransactionType.WALLET,
+            recipient_address=self.bob.email,
+            amount=Decimal("10.00"),
+            frequency=frequency,
+            starts_at=due,
+            next_run_at=due,
+        )
+
+    def test_one_off_ends(self):
+        order = self.order(ScheduledTransfer.Frequency.ONCE)
+        self.assertEqual(run_due_batch()["completed"], 1)
+        order.refresh_from_db()
+        self.assertFalse(order.is_active)
+        self.assertIsNotNone(order.last_transaction_id)
+
+    def test_deactivated_during_the_batch_stays_inactive(self):
+        order = self.order()
+        real_save_once = save_once
+
+        def deactivating_save_once(txn, key):
+            ScheduledTransfer.objects.filter(pk=order.pk).update(is_active=False)
+            return real_save_once(txn, key)
+
+        with mock.patch("core_banking.scheduler.save_once", deactivating_save_once):
+            run_due_batch()
+        order.refresh_from_db()
+        self.assertFalse(order.is_active)
+        self.assertEqual(order.runs, 1)
+
+    def test_database_error_is_recorded_per_order(self):
+        broken, working = self.order(), self.order()
+        real_save_once = save_once
+
+        def flaky_save_once(txn, key):
+            if key.startswith(f"scheduled-{broken.pk}-"):
+                raise OperationalError("database is locked")
+            return real_save_once(txn, key)
+
+        with mock.patch("core_banking.scheduler.save_once", flaky_save_once):
+            with self.assertLogs("core_banking.scheduler", "ERROR"):
+                outcomes = run_due_batch()
+        self.assertEqual(outcomes, {"completed": 1, "failed": 0, "deferred": 1})
+        broken.refresh_from_db()
+        working.refresh_from_db()
+        self.assertIn("database is locked", broken.last_error)
+        self.assertEqual((broken.runs, broken.occurrence, broken.failures), (0, 0, 1))
+        self.assertTrue(broken.is_active)
+        self.assertIsNone(broken.claimed_until)
+        self.assertEqual(working.runs, 1)
+
+
+class PrimaryPinTests(TestCase):
+    def request(self, user, cookies):
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies)
+        request.user = user
+        return request
+
+    def test_pin_travels_with_the_client(self):
+        alice = make_user("alice@example.com")
+        bob = make_user("bob@example.com")
+        response = HttpResponse()
+        pin_to_primary(response, alice.pk)
+        cookies = {PIN_COOKIE: response.cookies[PIN_COOKIE].value}
+
+        self.assertTrue(is_pinned_to_primary(self.request(alice, cookies)))
+        self.assertFalse(is_pinned_to_primary(self.request(bob, cookies)))
+        self.assertFalse(is_pinned_to_primary(self.request(alice, {})))
+        forged = {PIN_COOKIE: str(alice.pk)}
+        self.assertFalse(is_pinned_to_primary(self.request(alice, forged)))
+
+
+class AccountNumberAllocatorTests(TestCase):
+    def setUp(self):
+        # a fresh allocator with an empty block, the next number hits the sequence
+        pid = os.getpid()
+        previous = _allocators.pop(pid, None)
+        _allocators[pid] = AccountNumberAllocator(block_size=5)
+        self.addCleanup(_allocators.pop, pid)
+        if previous is not None:
+            self.addCleanup(_allocators.__setitem__, pid, previous)
+        self.user = make_user("owner@example.com")
+
+    def test_create_account_inside_atomic(self):
+        with transaction.atomic():
+            first = BankAccount.objects.create(owner=self.user)
+            second = BankAccount.objects.create(owner=self.user)
+        self.assertTrue(is_valid_account_number(first.account_number))
+        self.assertNotEqual(first.account_number, second.account_number)
+
+    def test_block_is_used_outside_atomic(self):
+        allocator = _allocators[os.getpid()]
+        numbers = allocator.take(3)
+        self.assertEqual(len(set(numbers)), 3)
+        self.assertTrue(all(is_valid_account_number(n) for n in numbers))
+
+
+@override_settings(VELOCITY_LIMITS={})
+class ShardTests(TestCase):
+    def setUp(self):
+        self.sender = make_user("sender@example.com")
+        self.merchant = make_user("merchant@example.com")
+        deposit(self.sender, "100.00")
+
+    def test_credits_spread_over_shards(self):
+        set_balance_shards(self.merchant.wallet, 4)
+        for _ in range(5):
+            wallet_transfer(self.sender, self.merchant, "2.00")
+        self.assertEqual(current_balance(self.merchant.wallet), Decimal("10.00"))
+        self.assertEqual(list(verify_balances(Wallet)), [])
+
+    def test_cash_flow_rows_spread_over_slots(self):
+        set_balance_shards(self.merchant.wallet, 4)
+        for _ in range(20):
+            wallet_transfer(self.sender, self.merchant, "1.00")
+        rows = MonthlyCashFlow.objects.filter(wallet=self.merchant.wallet)
+        slots = set(rows.values_list("slot", flat=True))
+        self.assertGreater(len(slots), 1)
+        self.assertLess(max(slots), 4)
+        month = timezone.localdate().replace(day=1)
+        self.assertEqual(
+            holder_cash_flow(self.merchant.wallet, month),
+            (Decimal("20.00"), Decimal("0.00")),
+        )
+
+    def test_missing_shard_rows_credit_the_holder(self):
+        # a shard count without its rows, e.g. edited in the database
+        Wallet.objects.filter(pk=self.merchant.wallet.pk).update(balance_shards=4)
+        wallet_transfer(self.sender, self.merchant, "30.00")
+        self.assertFalse(BalanceShard.objects.exists())
+        self.assertEqual(current_balance(self.merchant.wallet), Decimal("30.00"))
+        self.assertEqual(list(verify_balances(Wallet)), [])
+
+    def test_admin_shows_shards_in_balance(self):
+        set_balance_shards(self.merchant.wallet, 2)
+        wallet_transfer(self.sender, self.merchant, "7.50")
+        admin = make_user(
+            "admin@example.com", is_active=True, is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            response = self.client.get(reverse("admin:core_banking_wallet_changelist"))
+        self.assertContains(response, "7.50")
+        # a subquery per sharded row, not a GROUP BY over the whole table
+        queryset = response.context["cl"].queryset
+        self.assertIsNone(queryset.query.group_by)
+        totals = dict(queryset.values_list("pk", "shard_total"))
+        self.assertEqual(totals[self.merchant.wallet.pk], Decimal("7.50"))
+        self.assertEqual(totals[self.sender.wallet.pk], Decimal("0.00"))
+
+
+@override_settings(
+    VELOCITY_LIMITS={}, ALLOWED_HOSTS=["testserver"], INSTRUMENTATION_SAMPLE_RATE=0
+)
+class ReconcilePartitionTests(TestCase):
+    def test_partitions_start_at_multiples_of_size(self):
+        for i in range(5):
+            make_user(f"user{i}@example.com")
+        wallets = list(Wallet.objects.order_by("pk").values_list("pk", flat=True))
+        before = partitions(Wallet, 3)
+        self.assertTrue(all(first % 3 == 0 for first, _ in before))
+        self.assertLessEqual(before[0][0], wallets[0])
+        self.assertGreaterEqual(before[-1][1], wallets[-1])
+
+        # the first holders going away does not move the others' ranges
+        Wallet.objects.filter(pk__in=wallets[:2]).delete()
+        after = partitions(Wallet, 3)
+        self.assertEqual(after, [p for p in before if p[1] >= wallets[2]])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.enterContext(override_settings(ARCHIVE_DIR=archive_dir.name))
+        self.alice = make_user("alice@example.com", is_active=True)
+        self.bob = make_user("bob@example.com")
+        deposit(self.alice, "100.00")
+        for i in range(7):
+            wallet_transfer(self.alice, self.bob, f"{i + 1}.00")
+        # all but the newest two are old enough to archive
+        old = timezone.now() - timedelta(days=400)
+        for n, txn in enumerate(Transaction.objects.order_by("pk")[:6]):
+            Transaction.objects.filter(pk=txn.pk).update(
+                created_at=old + timedelta(hours=n)
+            )
+        self.client.force_login(self.alice)
+
+    def history(self):
+        receipts, url = [], reverse("transaction_list")
+        while url:
+            response = self.client.get(url)
+            receipts += [txn.receipt for txn in response.context["transactions"]]
+            cursor = response.context["next_cursor"]
+            url = f"{reverse('transaction_list')}?cursor={cursor}" if cursor else None
+        return receipts
+
+    def export(self):
+        response = self.client.get(reverse("transaction_export") + "?format=csv")
+        return b"".join(response.streaming_content)
+
+    def test_history_and_export_survive_archiving(self):
+        history, export = self.history(), self.export()
+        cutoff = timezone.now() - timedelta(days=365)
+        self.assertEqual(
+            list(archive_transactions(cutoff, segment_size=4, chunk_size=3)),
+            [(1, 4), (2, 6)],
+        )
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(self.history(), history)
+        self.assertEqual(self.export(), export)
+        # the ledger keeps the archived postings
+        assert_ledger_balanced(self)
+
+    def test_retry_after_archiving_replays(self):
+        def transfer():
+            return Transaction(
+                sender=self.alice,
+                transaction_type=Transaction.TransactionType.WALLET,
+                recipient_address=self.bob.email,
+                amount=Decimal("5.00"),
+            )
+
+        first = save_once(transfer(), "key-1")
+        old = timezone.now() - timedelta(days=400)
+        Transaction.objects.filter(pk=first.transaction_id).update(created_at=old)
+        cache.clear()
+
+        cutoff = timezone.now() - timedelta(days=365)
+        list(archive_transactions(cutoff))
+        self.assertTrue(Transaction.objects.filter(pk=first.transaction_id).exists())
+        retry = save_once(transfer(), "key-1")
+        self.assertTrue(retry.replayed)
+        self.assertEqual(retry.transaction_id, first.transaction_id)
+        self.bob.wallet.refresh_from_db()
+        self.assertEqual(self.bob.wallet.balance, Decimal("33.00"))
+
+        # once the key has expired the transaction is archived like any other
+        with override_settings(IDEMPOTENCY_KEY_TTL=0):
+            list(archive_transactions(cutoff))
+        self.assertFalse(Transaction.objects.filter(pk=first.transaction_id).exists())
+
+    def test_admin_filters_by_date_range(self):
+        list(archive_transactions(timezone.now() - timedelta(days=365)))
+        admin = make_user(
+            "admin@example.com", is_active=True, is_staff=True, is_superuser=True
+        )
+        self.client.force_login(admin)
+        url = reverse("admin:core_banking_transaction_changelist")
+        since = (timezone.now() - timedelta(days=7)).date()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{url}?created_at__gte={since}")
+        self.assertEqual(response.context["cl"].result_count, 2)
+        # no date_hierarchy, so no query over the distinct dates of the table
+        self.assertFalse(any("DISTINCT" in q["sql"] for q in queries.captured_queries))
+
+
+@override_settings(
+    VELOCITY_LIMITS={}, ALLOWED_HOSTS=["testserver"], INSTRUMENTATION_SAMPLE_RATE=0
+)
+class BulkPayoutTests(TestCase):
+    def setUp(self):
+        self.payer = make_user("payer@example.com", is_active=True)
+        self.source = BankAccount.objects.create(owner=self.payer)
+        deposit(self.payer, "100.00", self.source)
+        self.payee = BankAccount.objects.create(owner=make_user("payee@example.com"))
+        self.client.force_login(self.payer)
+
+    def post(self, lines):
+        return self.client.post(
+            reverse("bulk_payout"),
+            {"account_number": self.source.account_number, "lines": lines},
+            content_type="application/json",
+        )
+
+    def test_numeric_recipient(self):
+        response = self.post(
+            [
+                {"recipient": int(self.payee.account_number), "amount": "10.00"},
+                {"recipient": ["not", "an", "address"], "amount": "1.00"},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        lines = response.json()["lines"]
+        self.assertEqual(lines[0]["status"], Transaction.TransactionStatus.COMPLETED)
+        self.assertEqual(lines[1]["error"], "Invalid recipient")
+        self.payee.refresh_from_db()
+        self.assertEqual(self.payee.balance, Decimal("10.00"))
+        assert_ledger_balanced(self)
+
+    def test_no_wallet(self):
+        Wallet.objects.filter(user=self.payer).delete()
+        response = self.client.post(
+            reverse("bulk_payout"),
+            {"wallet": True, "lines": []},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_bad_input(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "payouts.csv")
+            with open(path, "w") as f:
+                f.write("recipient,value\n1234,1.00\n")
+            cases = [
+                (path, "The file has no amount column"),
+                (os.path.join(directory, "missing.csv"), "Cannot read"),
+            ]
+            for file, message in cases:
+                with self.subTest(message), self.assertRaisesMessage(
+                    CommandError, message
+                ):
+                    call_command(
+                        "bulk_payout", file, sender=self.payer.email, wallet=True
+                    )
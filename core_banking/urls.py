@@ -3,9 +3,12 @@ from django.urls import path
 from .views import (
     BankAccountCreateView,
     BankAccountListView,
+    BulkPayoutView,
     CreateTransactionView,
     DepositWithdrawView,
     HomeView,
+    InstrumentationView,
+    TransactionExportView,
     TransactionListView,
 )
 
@@ -18,6 +21,13 @@ urlpatterns = [
         CreateTransactionView.as_view(),
         name="create_transaction",
     ),
+    path("bulk-payout/", BulkPayoutView.as_view(), name="bulk_payout"),
     path("deposit-withdraw/", DepositWithdrawView.as_view(), name="depost-withdraw"),
     path("transaction-list/", TransactionListView.as_view(), name="transaction_list"),
+    path(
+        "transaction-list/export/",
+        TransactionExportView.as_view(),
+        name="transaction_export",
+    ),
+    path("instrumentation/", InstrumentationView.as_view(), name="instrumentation"),
 ]
@@ -0,0 +1,145 @@
+"""
+Velocity limits on outgoing transfers.
+
+VELOCITY_LIMITS caps, per account type ("Wallet" or a BankAccount account
+type), how many transfers and how much money may leave one wallet or account
+per minute, hour and day. Limits are checked before the transfer opens its
+database transaction, from counters in the cache, never from the history.
+
+Each window keeps one counter per fixed slot of its length, holding both the
+number of transfers and their cents packed in one integer so that a single
+cache.incr adds a transfer atomically. The sliding total is the current slot
+plus the previous slot weighted by how much of it still overlaps the window:
+
+    current + previous * (1 - elapsed in current slot / window)
+
+so a check is one get_many of two keys per window whatever the traffic, and
+a completed transfer is added with one incr per window once it commits. The
+counters only limit across processes in a shared cache (CACHE_URL, e.g.
+Redis), which settings require outside DEBUG. Two transfers checked at the
+same instant can both pass, the guarded debit still keeps the balance from
+going negative.
+"""
+
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Wallet
+
+WINDOWS = {"minute": 60, "hour": 60 * 60, "day": 24 * 60 * 60}
+WALLET = "Wallet"
+# a counter is transfers << CENT_BITS | cents
+CENT_BITS = 40
+CENT_MASK = (1 << CENT_BITS) - 1
+
+
+class VelocityLimitExceeded(ValueError):
+    pass
+
+
+def holder_kind(holder):
+    return WALLET if isinstance(holder, Wallet) else holder.account_type
+
+
+def _label(holder):
+    kind = holder_kind(holder).lower()
+    return kind if kind == "wallet" else f"{kind} account"
+
+
+def _cents(amount):
+    return int(Decimal(str(amount)) * 100)
+
+
+def _key(holder, window, slot):
+    # short keys, the cache validates every character of every key
+    kind = "w" if isinstance(holder, Wallet) else "b"
+    return f"vl:{kind}{holder.pk}:{window[0]}:{slot}"
+
+
+def _slots(window, now):
+    """Keys suffix of the current and previous slot, and the previous one's weight."""
+    seconds = WINDOWS[window]
+    slot = int(now // seconds)
+    return slot, slot - 1, 1 - (now % seconds) / seconds
+
+
+def check(holder, amount, count=1, now=None):
+    """
+    Raise VelocityLimitExceeded if count more transfers of amount in total
+    out of holder would break one of its limits.
+    """
+    limits = settings.VELOCITY_LIMITS.get(holder_kind(holder))
+    if not limits:
+        return
+    now = time.time() if now is None else now
+
+    windows = []
+    keys = []
+    for window, limit in limits.items():
+        current, previous, overlap = _slots(window, now)
+        names = (_key(holder, window, current), _key(holder, window, previous))
+        windows.append((window, limit, overlap, names))
+        keys.extend(names)
+    counters = cache.get_many(keys)
+
+    cents = _cents(amount)
+    for window, limit, overlap, (current, previous) in windows:
+        now_value = counters.get(current, 0)
+        before = counters.get(previous, 0)
+        max_count = limit.get("count")
+        used = (now_value >> CENT_BITS) + (before >> CENT_BITS) * overlap
+        if max_count is not None and used + count > max_count:
+            raise VelocityLimitExceeded(
+                f"Transfer limit reached: at most {max_count} transfers per "
+                f"{window} from this {_label(holder)}"
+            )
+        max_amount = limit.get("amount")
+        used = (now_value & CENT_MASK) + (before & CENT_MASK) * overlap
+        if max_amount is not None and used + cents > _cents(max_amount):
+            raise VelocityLimitExceeded(
+                f"Transfer limit reached: at most {max_amount} per {window} "
+                f"from this {_label(holder)}"
+            )
+
+
+def _add(key, delta, timeout):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # first transfer of the slot; add loses to a concurrent first one
+        if not cache.add(key, delta, timeout):
+            cache.incr(key, delta)
+
+
+def record(holder, amount, count=1, now=None):
+    """Count count transfers of amount in total out of holder."""
+    limits = settings.VELOCITY_LIMITS.get(holder_kind(holder))
+    if not limits:
+        return
+    now = time.time() if now is None else now
+    delta = count << CENT_BITS | _cents(amount)
+    for window in limits:
+        current, _, _ = _slots(window, now)
+        # read as the previous slot until the end of the next one
+        _add(_key(holder, window, current), delta, 2 * WINDOWS[window])
+
+
+def record_on_commit(holder, amount, count=1):
+    """record() once the current transaction commits, a rolled back one never counts."""
+    transaction.on_commit(lambda: record(holder, amount, count))
+
+
+def reset(holder, now=None):
+    """Forget holder's counters, e.g. when support lifts a block early."""
+    now = time.time() if now is None else now
+    cache.delete_many(
+        [
+            _key(holder, window, slot)
+            for window in WINDOWS
+            for slot in _slots(window, now)[:2]
+        ]
+    )
@@ -1,12 +1,30 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.exceptions import BadRequest
+from django.db import router
 from django.db.models import Q
-from django.shortcuts import redirect
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
-from django.views.generic import CreateView, ListView, TemplateView
+from django.views.generic import CreateView, ListView, TemplateView, View
 
-from .forms import BankAccountForm, DepositWithdrawForm, TransactionForm
-from .models import BankAccount, Transaction, Wallet
+from .archive import ArchivedHistory, archived_transactions
+from .cashflow import monthly_cash_flow
+from .exports import CONTENT_TYPES, export_transactions
+from .forms import (
+    BankAccountForm,
+    DepositWithdrawForm,
+    TransactionExportForm,
+    TransactionForm,
+)
+from .idempotency import request_key, save_once
+from .instrumentation import rolling_stats
+from .models import BankAccount, Transaction, User, Wallet
+from .pagination import decode_cursor, keyset_page
+from .payouts import run_payout
+from .summaries import get_balance_summary
 
 # Create your views here.
 
@@ -17,8 +35,8 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_authenticated:
-            if Wallet.objects.filter(user=self.request.user).exists():
-                context["wallet"] = self.request.user.wallet
+            # cached, see summaries.py
+            context["summary"] = get_balance_summary(self.request.user)
 
         return context
 
@@ -40,16 +58,19 @@ class BankAccountCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView)
 
 class BankAccountListView(LoginRequiredMixin, ListView):
     model = BankAccount
+    read_from_replica = True
     template_name = "main_bank/bank_account_list.html"
     context_object_name = "accounts"
 
     def get_queryset(self):
-        return BankAccount.objects.filter(owner=self.request.user)
+        # the accounts come from the cached balance summary, see summaries.py
+        self.summary = get_balance_summary(self.request.user)
+        return self.summary.accounts
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if Wallet.objects.filter(user=self.request.user).exists():
-            context["wallet"] = self.request.user.wallet
+        context["summary"] = self.summary
+        context["cash_flow"] = monthly_cash_flow(self.request.user, months=12)
         return context
 
 
@@ -79,8 +100,8 @@ class CreateTransactionView(LoginRequiredMixin, SuccessMessageMixin, CreateView)
         transaction = form.save(commit=False)
         transaction.sender = self.request.user
         try:
-            # try to save
-            transaction.save()
+            # try to save, a retried request returns the first one's result
+            save_once(transaction, request_key(self.request, form))
         # except ValidationError as e:
         #     form.add_error(self.request, e)
         #     return self.form_invalid(form) #Re-display the form with errors
@@ -113,7 +134,7 @@ class DepositWithdrawView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
         transaction.sender = self.request.user
 
         try:
-            transaction.save()
+            save_once(transaction, request_key(self.request, form))
         except ValueError as e:
             form.add_error(None, e)
             return self.form_invalid(form)
@@ -123,21 +144,138 @@ class DepositWithdrawView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
 
 class TransactionListView(LoginRequiredMixin, ListView):
     model = Transaction
+    read_from_replica = True
     template_name = "main_bank/transaction_history.html"
     context_object_name = "transactions"
+    page_size = 50
 
     def get_queryset(self):
         """
-        Return all transactions relevant to the logged in user.
+        Return one page of the transactions relevant to the logged in user.
         This could mean:
          - user is the 'sender'
          - or user is the 'recipient'
          - or user = 'sender' in deposit scenario, etc.
+        Archived transactions are read from the user's archive blocks.
 
-        We'll do a Q filter so that the user sees anything where they're involved.
+        Rather than one OR filter, which can't use an index, each side is its own
+        range scan on the (sender, created_at) / (recipient, created_at) index
+        and the two are merged page by page, see pagination.py.
         """
 
         user = self.request.user
-        return Transaction.objects.filter(Q(sender=user) | Q(recipient=user)).order_by(
-            "-created_at"
+        token = self.request.GET.get("cursor")
+        try:
+            cursor = decode_cursor(token) if token else None
+        except ValueError:
+            raise BadRequest("Invalid cursor")
+
+        self.page = keyset_page(
+            [
+                Transaction.objects.filter(sender=user),
+                Transaction.objects.filter(recipient=user),
+                ArchivedHistory(user),
+            ],
+            cursor,
+            self.page_size,
+        )
+        return self.page.items
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = self.page.next_cursor
+        context["is_first_page"] = "cursor" not in self.request.GET
+        return context
+
+
+class TransactionExportView(LoginRequiredMixin, View):
+    """
+    Stream the logged in user's full history as CSV or NDJSON.
+    Staff can export anyone's history with ?user=<email>.
+    """
+
+    read_from_replica = True
+
+    def get(self, request):
+        form = TransactionExportForm(request.GET)
+        if not form.is_valid():
+            raise BadRequest(form.errors.as_text())
+
+        user = request.user
+        email = request.GET.get("user")
+        if email and request.user.is_staff:
+            user = get_object_or_404(User, email=email)
+
+        queryset = form.filter(
+            Transaction.objects.filter(Q(sender=user) | Q(recipient=user))
         )
+        # the rows are streamed after the request is done routing,
+        # pin the database picked for it now
+        queryset = queryset.using(router.db_for_read(Transaction))
+        archived = (txn for txn in archived_transactions(user) if form.accepts(txn))
+        export_format = form.cleaned_data["format"] or "csv"
+        response = StreamingHttpResponse(
+            export_transactions(queryset, export_format, archived),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="transactions.{export_format}"'
+        return response
+
+
+class BulkPayoutView(LoginRequiredMixin, View):
+    """
+    Pay many recipients from one of the user's accounts in a single batch.
+
+    POST a JSON body:
+        {"account_number": "..."}  or  {"wallet": true}  to pick the source,
+        "lines": [{"recipient": "<email or account number>", "amount": "12.50"}, ...]
+    and get back the outcome of every line, see payouts.py
+    """
+
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+            lines = [(line["recipient"], line["amount"]) for line in payload["lines"]]
+        except (ValueError, KeyError, TypeError):
+            raise BadRequest("Expected a JSON body with a list of lines")
+
+        if payload.get("wallet"):
+            try:
+                source = request.user.wallet
+            except Wallet.DoesNotExist:
+                raise BadRequest("You have no wallet to pay from")
+        else:
+            source = get_object_or_404(
+                BankAccount,
+                owner=request.user,
+                account_number=payload.get("account_number"),
+            )
+
+        try:
+            results = run_payout(request.user, source, lines)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        completed = sum(
+            result.status == Transaction.TransactionStatus.COMPLETED
+            for result in results
+        )
+        return JsonResponse(
+            {
+                "completed": completed,
+                "rejected": len(results) - completed,
+                "lines": [result.as_dict() for result in results],
+            }
+        )
+
+
+class InstrumentationView(UserPassesTestMixin, View):
+    """Rolling per-view timings of this process, see instrumentation.py. Staff only."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(rolling_stats.snapshot())
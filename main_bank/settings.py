@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env(
     # set casting, default value
@@ -52,11 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core_banking.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core_banking.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -85,13 +88,55 @@ WSGI_APPLICATION = "main_bank.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# High-concurrency SQLite profile, on unless SQLITE_TUNED=False:
+#  - WAL lets readers run alongside the single writer
+#  - synchronous=NORMAL is durable with WAL and skips an fsync per commit
+#  - bigger page cache and memory mapped reads
+#  - every atomic block starts with BEGIN IMMEDIATE, so the money-moving
+#    transactions in Transaction.save() take the write lock up front and wait
+#    for it (timeout) instead of failing with "database is locked" on upgrade.
+#    SQLite can't pick the mode per block, so read-only atomics (the admin
+#    change form) take the lock too. Code running inside an atomic block must
+#    never write through a second connection, it would wait on the lock its
+#    own caller holds until the timeout (see core_banking/account_numbers.py)
+SQLITE_OPTIONS = {
+    "transaction_mode": "IMMEDIATE",
+    "timeout": 20,
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA cache_size=-65536;"
+        "PRAGMA mmap_size=268435456;"
+        "PRAGMA temp_store=MEMORY;"
+    ),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS if env.bool("SQLITE_TUNED", default=True) else {},
+        # a file rather than memory, the concurrency tests write from threads
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Read replicas, e.g. REPLICA_DATABASE_URLS=sqlite:////srv/replica.sqlite3,postgres://...
+# Read-only pages read from them, see core_banking/routers.py
+DATABASE_REPLICAS = []
+for i, url in enumerate(env.list("REPLICA_DATABASE_URLS", default=[])):
+    alias = f"replica_{i}"
+    DATABASES[alias] = env.db_url_config(url)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    if DATABASES[alias]["ENGINE"] == "django.db.backends.sqlite3":
+        DATABASES[alias]["OPTIONS"] = DATABASES["default"]["OPTIONS"]
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core_banking.routers.ReplicaRouter"]
+
+# Seconds a user reads from the primary after their own writes
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=15)
+
 # for postgres
 # DATABASES = {
 #     "default": {
@@ -104,6 +149,78 @@ DATABASES = {
 #     }
 # }
 
+# Cache, e.g. redis://127.0.0.1:6379/1. Every process must see the same
+# balance summaries, velocity counters and idempotency keys, so only DEBUG
+# may fall back to local memory, which is per process
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+if CACHES["default"]["BACKEND"].endswith(".LocMemCache") and not DEBUG:
+    raise ImproperlyConfigured("Set CACHE_URL to a cache shared by all processes")
+
+# Seconds a cached balance summary may live, see core_banking/summaries.py
+BALANCE_SUMMARY_TIMEOUT = 300
+
+# Idempotency keys are kept this long, and cached for the first seconds,
+# see core_banking/idempotency.py
+IDEMPOTENCY_KEY_TTL = env.int("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60)
+IDEMPOTENCY_CACHE_TIMEOUT = 300
+
+# Most transfers / money that may leave one wallet or bank account per window,
+# by account type; a missing type or window is unlimited. Off with
+# VELOCITY_LIMITS_ENABLED=False. See core_banking/velocity.py
+VELOCITY_LIMITS = {
+    "Wallet": {
+        "minute": {"count": 10, "amount": "2000.00"},
+        "hour": {"count": 60, "amount": "10000.00"},
+        "day": {"count": 200, "amount": "50000.00"},
+    },
+    "Savings": {
+        "minute": {"count": 5, "amount": "5000.00"},
+        "hour": {"count": 30, "amount": "20000.00"},
+        "day": {"count": 100, "amount": "100000.00"},
+    },
+    "Current": {
+        "minute": {"count": 20, "amount": "20000.00"},
+        "hour": {"count": 200, "amount": "100000.00"},
+        "day": {"count": 1000, "amount": "500000.00"},
+    },
+    "Business": {
+        # payroll, a bulk payout counts every line
+        "minute": {"count": 10000, "amount": "1000000.00"},
+        "hour": {"count": 50000, "amount": "5000000.00"},
+        "day": {"count": 200000, "amount": "20000000.00"},
+    },
+}
+if not env.bool("VELOCITY_LIMITS_ENABLED", default=True):
+    VELOCITY_LIMITS = {}
+
+# seconds a scheduler owns the standing orders it claimed before others may
+# run them, see core_banking/scheduler.py
+SCHEDULER_LEASE = 300
+
+# Segment files of archived transactions, shared by every web server reading
+# history. See core_banking/archive.py
+ARCHIVE_DIR = env("ARCHIVE_DIR", default=str(BASE_DIR / "archive"))
+
+# Share of requests timed by InstrumentationMiddleware, and the rolling window
+# of its per-view histograms (slots x seconds), see core_banking/instrumentation.py
+INSTRUMENTATION_SAMPLE_RATE = env.float("INSTRUMENTATION_SAMPLE_RATE", default=0.1)
+INSTRUMENTATION_SLOTS = 12
+INSTRUMENTATION_SLOT_SECONDS = 300
+
+# one JSON line per sampled request on stdout
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "core_banking.instrumentation": {
+            "handlers": ["console"],
+            "level": env("INSTRUMENTATION_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -140,22 +257,43 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Monthly PDF statements, see core_banking/statements.py
+STATEMENTS_ROOT = env("STATEMENTS_ROOT", default=str(BASE_DIR / "statements"))
+STATEMENT_CSS = BASE_DIR / "core_banking" / "static" / "core_banking" / "statement.css"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.CustomUser"
+
+# Receipt numbers, see core_banking/receipts.py
+RECEIPT_GENERATOR = "core_banking.receipts.SnowflakeReceiptGenerator"
+# seconds a process holds its leased worker id, renewed after half of it
+RECEIPT_WORKER_LEASE = env.int("RECEIPT_WORKER_LEASE", default=600)
+
+# Account numbers each process reserves per query, see core_banking/account_numbers.py
+ACCOUNT_NUMBER_BLOCK_SIZE = env.int("ACCOUNT_NUMBER_BLOCK_SIZE", default=100)
 LOGIN_URL = "/login"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login"
 
 
-EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_BACKEND = env(
+    "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
+)
+EMAIL_HOST = env("EMAIL_HOST", default="smtp.gmail.com")
+EMAIL_PORT = env.int("EMAIL_PORT", default=587)
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=True)
 
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL")
+
+# Email outbox, see users/outbox.py
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+# seconds before the first retry, doubled on every further attempt
+EMAIL_OUTBOX_BACKOFF = 30
+# seconds a worker owns the emails it claimed before others may retry them
+EMAIL_OUTBOX_LEASE = 300
@@ -1,14 +1,31 @@
+from functools import lru_cache
+
 from django.template.loader import render_to_string
 from weasyprint import CSS, HTML
 from weasyprint.text.fonts import FontConfiguration
 
 
+@lru_cache(maxsize=None)
+def get_font_config():
+    """
+    One FontConfiguration per process, building it scans the system fonts so
+    it is shared by every render instead of made per generator.
+    """
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def get_stylesheet(css_path):
+    """Parse css_path once per process and reuse it for every render."""
+    return CSS(filename=str(css_path), font_config=get_font_config())
+
+
 class PDFGenerator:
     """
     A reusable class to generate PDF files.
     """
 
-    def _init_(self, template_name, context, base_url=None, css_path=None):
+    def __init__(self, template_name, context, base_url=None, css_path=None):
         """
         Initialize the PDF generator.
         :param template_name: The template file name to use for the PDF.
@@ -20,29 +37,35 @@ class PDFGenerator:
         self.context = context
         self.base_url = base_url
         self.css_path = css_path
-        self.font_config = FontConfiguration()
+        self.font_config = get_font_config()
+
+    def render_html(self):
+        """
+        Render the HTML string from the template.
+        """
+        return render_to_string(self.template_name, self.context)
 
-    def generate_pdf(self, output_path=None):
+    def generate_pdf(self, output_path=None, html_string=None):
         """
         Generates a PDF from the provided template and context.
-        :return: PDF binary content.
+        :param output_path: Write the PDF there instead of returning it.
+        :param html_string: Already rendered HTML, to avoid rendering twice.
+        :return: PDF binary content, or output_path.
         """
-        # Render HTML string from the template
-        html_string = render_to_string(self.template_name, self.context)
+        if html_string is None:
+            html_string = self.render_html()
 
         # Convert the HTML to a PDF
-        pdf_file = HTML(string=html_string, base_url=self.base_url).write_pdf(
+        pdf_bytes = HTML(string=html_string, base_url=self.base_url).write_pdf(
             font_config=self.font_config,
             presentational_hints=True,
-            stylesheets=[CSS(self.css_path, font_config=self.font_config)]
-            if self.css_path
-            else [],
+            stylesheets=[get_stylesheet(self.css_path)] if self.css_path else [],
         )
 
         # Save to file or return bytes
         if output_path:
             with open(output_path, "wb") as pdf_file:
-                pdf_file.write(pdf_file)
+                pdf_file.write(pdf_bytes)
             return output_path
 
-        return pdf_file
+        return pdf_bytes
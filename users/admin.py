@@ -1,7 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
-from .models import CustomUser
+from .forms import BulkOnboardForm
+from .models import CustomUser, EmailOutbox
 
 
 @admin.register(CustomUser)
@@ -12,6 +18,7 @@ class CustomUserAdmin(UserAdmin):
     ordering = ("email",)
 
     readonly_fields = ("last_login", "date_joined")
+    change_list_template = "admin/users/customuser/change_list.html"
 
     fieldsets = (
         (None, {"fields": ("email", "password")}),
@@ -65,3 +72,51 @@ class CustomUserAdmin(UserAdmin):
             },
         ),
     )
+
+    def get_urls(self):
+        return [
+            path(
+                "onboard/",
+                self.admin_site.admin_view(self.onboard_view),
+                name="users_customuser_onboard",
+            )
+        ] + super().get_urls()
+
+    def onboard_view(self, request):
+        """Create the users of an uploaded CSV at once, see bulk_onboard."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BulkOnboardForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            try:
+                users = CustomUser.objects.bulk_onboard(
+                    form.cleaned_data["file"],
+                    get_current_site(request).domain,
+                    account_type=form.cleaned_data["account_type"] or None,
+                    # never fork a hashing pool from a web worker
+                    processes=1,
+                )
+            except ValueError as e:
+                form.add_error("file", str(e))
+            else:
+                self.message_user(
+                    request,
+                    f"Onboarded {len(users)} users, their activation emails are queued.",
+                    messages.SUCCESS,
+                )
+                return redirect("admin:users_customuser_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Onboard users",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/users/customuser/onboard.html", context)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at")
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "sent_at", "last_error")
@@ -1,6 +1,19 @@
+import io
+
 from django import forms
+from django.contrib.auth.forms import PasswordResetForm
+from django.template import loader
+
+from core_banking.models import BankAccount
 
 from .models import CustomUser
+from .onboarding import ONBOARD_FIELDS, read_people
+from .outbox import queue_email
+
+# the admin onboards in the request, bigger files go through onboard_users
+MAX_ONBOARD = 1000
+# hashed one by one in the request, a few hundred milliseconds each
+MAX_ONBOARD_PASSWORDS = 20
 
 
 class UserRegistrationForm(forms.ModelForm):
@@ -43,3 +56,58 @@ class UserRegistrationForm(forms.ModelForm):
         if commit:
             user.save()
         return user
+
+
+class OutboxPasswordResetForm(PasswordResetForm):
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        """Queue the reset email in the outbox instead of sending it in the request."""
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = ""
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+
+        queue_email(subject, body, [to_email], from_email, html_body)
+
+
+class BulkOnboardForm(forms.Form):
+    file = forms.FileField(
+        help_text=f"CSV with a header row, columns: {', '.join(ONBOARD_FIELDS)}. "
+        "Only email, first_name and last_name are required."
+    )
+    account_type = forms.ChoiceField(
+        choices=[("", "No bank account")] + BankAccount.AccountChoices.choices,
+        required=False,
+        help_text="Also open a bank account of this type for everyone.",
+    )
+
+    def clean_file(self):
+        """Parse the upload into a list of dicts of the non-empty columns."""
+        text = io.TextIOWrapper(self.cleaned_data["file"], encoding="utf-8-sig")
+        try:
+            people = read_people(text)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        if not people:
+            raise forms.ValidationError("The file has no rows")
+        if len(people) > MAX_ONBOARD:
+            raise forms.ValidationError(
+                f"At most {MAX_ONBOARD} users can be onboarded here, use "
+                "manage.py onboard_users for larger files"
+            )
+        if sum("password" in person for person in people) > MAX_ONBOARD_PASSWORDS:
+            raise forms.ValidationError(
+                f"At most {MAX_ONBOARD_PASSWORDS} rows can set a password here, "
+                "use manage.py onboard_users for larger files"
+            )
+        return people
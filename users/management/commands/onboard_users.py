@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core_banking.models import BankAccount
+from users.models import CustomUser
+from users.onboarding import read_people
+
+
+class Command(BaseCommand):
+    help = (
+        "Onboard the users of a CSV file in the admin upload's format, for "
+        "files too large for the admin. Passwords are hashed across a process "
+        "pool. If any row is invalid or already registered, nobody is created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument(
+            "--domain", required=True, help="Host of the activation links."
+        )
+        parser.add_argument(
+            "--account-type",
+            choices=BankAccount.AccountChoices.values,
+            help="Also open a bank account of this type for everyone.",
+        )
+        parser.add_argument("--processes", type=int)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["file"], encoding="utf-8-sig", newline="") as f:
+                people = read_people(f)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['file']}: {e.strerror}")
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not people:
+            raise CommandError("The file has no rows")
+
+        try:
+            users = CustomUser.objects.bulk_onboard(
+                people,
+                options["domain"],
+                account_type=options["account_type"],
+                processes=options["processes"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Onboarded {len(users)} users, their activation emails are queued."
+        )
@@ -4,6 +4,7 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.db import models
+from django.utils import timezone
 
 
 class UserManager(BaseUserManager):
@@ -50,6 +51,65 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def bulk_onboard(self, people, domain, account_type=None, processes=None):
+        """
+        Create many users with their wallets at once, see onboarding.py.
+        people are dicts of create_user arguments (email, password,
+        first_name, last_name, ...), a missing password is unusable until
+        reset. With account_type every user also gets a bank account of that
+        type. Users start inactive and are sent the activation email with
+        links to domain. Raises ValueError, and creates nobody, if anyone is
+        invalid or already registered. Returns the users.
+        """
+        from django.db import IntegrityError, transaction
+
+        from core_banking.account_numbers import get_account_number_allocator
+        from core_banking.models import BankAccount, Wallet
+
+        from .onboarding import activation_email, hash_passwords, validate_people
+        from .outbox import queue_emails
+
+        people = validate_people(people, self)
+        hashes = hash_passwords(
+            (person.pop("password", None) or None for person in people), processes
+        )
+        users = [
+            self.model(password=password, **person)
+            for person, password in zip(people, hashes)
+        ]
+        # reserved before the write transaction opens, see account_numbers.py
+        numbers = (
+            get_account_number_allocator().take(len(users)) if account_type else []
+        )
+
+        try:
+            with transaction.atomic(using=self._db):
+                self.bulk_create(users, batch_size=1000)
+                if any(user.pk is None for user in users):
+                    emails = [user.email for user in users]
+                    pks = dict(self.filter(email__in=emails).values_list("email", "pk"))
+                    for user in users:
+                        user.pk = pks[user.email]
+                Wallet.objects.bulk_create(
+                    (Wallet(user=user) for user in users), batch_size=1000
+                )
+                if account_type:
+                    BankAccount.objects.bulk_create(
+                        (
+                            BankAccount(
+                                owner=user,
+                                account_number=number,
+                                account_type=account_type,
+                            )
+                            for user, number in zip(users, numbers)
+                        ),
+                        batch_size=1000,
+                    )
+                queue_emails(activation_email(user, domain) for user in users)
+        except IntegrityError as e:
+            raise ValueError(f"Could not onboard these users: {e}") from e
+        return users
+
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
@@ -75,3 +135,40 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be delivered by the send_outbox command. Rows are
+    written in the same database transaction as whatever triggered the email,
+    so a rolled back sign-up never sends one and an SMTP outage never breaks
+    a sign-up.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "Pending"
+        SENT = "Sent"
+        FAILED = "Failed"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "email outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
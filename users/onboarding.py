@@ -0,0 +1,123 @@
+"""
+Batched onboarding, e.g. all of a company's employees at once.
+
+UserManager.bulk_onboard creates the users, their wallets and optionally a
+bank account each with a few bulk_create calls. Password hashing is the slow
+part (hundreds of milliseconds per PBKDF2 hash by design), so large batches
+hash across a process pool. That is too slow for a request, so the admin
+upload takes small files only and larger ones go through the onboard_users
+command. Activation emails are queued in one insert, in
+the same transaction as the users. The create_user_wallet signal still
+creates the wallet of users created one at a time.
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .tokens import account_activation_token
+
+# below this hashing inline beats starting a pool
+POOL_THRESHOLD = 32
+ONBOARD_FIELDS = (
+    "email",
+    "first_name",
+    "last_name",
+    "password",
+    "phone_number",
+    "national_id",
+    "address",
+    "date_of_birth",
+)
+
+
+def read_people(lines):
+    """
+    The rows of a CSV with a header row of ONBOARD_FIELDS, as dicts of their
+    non-empty columns. Raises ValueError if lines are not UTF-8 CSV.
+    """
+    try:
+        rows = list(csv.DictReader(lines))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError("Expected a UTF-8 CSV file") from e
+    return [
+        {name: value.strip() for name, value in row.items() if value and name}
+        for row in rows
+    ]
+
+
+def _clean_person(number, person, manager):
+    """
+    Validate the fields of person like a form would and replace them by their
+    python values, e.g. a date_of_birth string by a date.
+    """
+    fields = {name: value for name, value in person.items() if name != "password"}
+    user = manager.model(**fields)
+    try:
+        user.full_clean(
+            exclude=["password"], validate_unique=False, validate_constraints=False
+        )
+    except ValidationError as e:
+        name, errors = next(iter(e.message_dict.items()))
+        raise ValueError(f"Line {number}: {name}: {' '.join(errors)}") from e
+    person.update((name, getattr(user, name)) for name in fields)
+
+
+def validate_people(people, manager):
+    """
+    Copies of the bulk_onboard people with normalized emails and cleaned
+    values. Raises ValueError naming the first line with an unknown field, a
+    missing email or name, an invalid value (see CustomUser's fields) or an
+    email seen before, then the emails already registered.
+    """
+    people = [dict(person) for person in people]
+    seen = set()
+    for number, person in enumerate(people, 1):
+        unknown = set(person) - set(ONBOARD_FIELDS)
+        if unknown:
+            raise ValueError(f"Line {number}: unknown field {sorted(unknown)[0]}")
+        for name in ("email", "first_name", "last_name"):
+            if not person.get(name):
+                raise ValueError(f"Line {number}: {name} is required")
+        person["email"] = manager.normalize_email(person["email"])
+        _clean_person(number, person, manager)
+        if person["email"] in seen:
+            raise ValueError(f"Line {number}: {person['email']} appears twice")
+        seen.add(person["email"])
+    taken = list(manager.filter(email__in=seen).values_list("email", flat=True)[:5])
+    if taken:
+        raise ValueError(f"Already registered: {', '.join(sorted(taken))}")
+    return people
+
+
+def hash_passwords(passwords, processes=None):
+    """make_password for every password, None gives an unusable password."""
+    passwords = list(passwords)
+    if len(passwords) < POOL_THRESHOLD or processes == 1:
+        return [make_password(password) for password in passwords]
+    workers = processes or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def activation_email(user, domain):
+    """queue_email arguments of the activation email of user."""
+    token = account_activation_token.make_token(user)
+    uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+    activate_url = reverse("activate", kwargs={"uidb64": uidb64, "token": token})
+    activate_link = f"http://{domain}{activate_url}"
+    return {
+        "subject": "Activate your account",
+        "message": render_to_string(
+            "users/activate.html", {"user": user, "activate_link": activate_link}
+        ),
+        "recipient_list": [user.email],
+    }
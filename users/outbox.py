@@ -0,0 +1,112 @@
+"""
+Transactional email outbox.
+
+Views never talk to SMTP. They queue an EmailOutbox row inside their own
+database transaction and the send_outbox command delivers due rows in batches
+over one reused SMTP connection, retrying failures with exponential backoff.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+def _outbox_row(subject, message, recipient_list, from_email=None, html_message=""):
+    return EmailOutbox(
+        subject=subject,
+        body=message,
+        html_body=html_message or "",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def queue_email(subject, message, recipient_list, from_email=None, html_message=""):
+    """Same arguments as send_mail, but the email is only queued."""
+    row = _outbox_row(subject, message, recipient_list, from_email, html_message)
+    row.save()
+    return row
+
+
+def queue_emails(emails):
+    """Queue many emails at once, emails are dicts of queue_email arguments."""
+    return EmailOutbox.objects.bulk_create(_outbox_row(**email) for email in emails)
+
+
+def _claim(batch_size):
+    """
+    Take up to batch_size due rows and push their next attempt one lease into
+    the future, so other workers skip them while they are being sent. Rows of
+    a worker that dies become due again once the lease expires.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return rows
+
+
+def _message(row, connection):
+    message = EmailMultiAlternatives(
+        row.subject, row.body, row.from_email, row.to, connection=connection
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, "text/html")
+    return message
+
+
+def deliver_batch(connection, batch_size=100):
+    """
+    Send one batch of due emails over connection, which the caller keeps open
+    between batches. Returns (sent, failed).
+    """
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, 0
+
+    sent, failed = [], []
+    try:
+        # opened here so that send() reuses it instead of connecting per email
+        connection.open()
+        open_error = None
+    except Exception as e:
+        open_error = e
+
+    for row in rows:
+        row.attempts += 1
+        try:
+            if open_error:
+                raise open_error
+            _message(row, connection).send()
+        except Exception as e:  # any SMTP or socket error is retried later
+            row.last_error = str(e)
+            # a dropped connection must not poison the rest of the batch,
+            # closing it makes the next send reconnect
+            connection.close()
+            if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                row.status = EmailOutbox.Status.FAILED
+            else:
+                backoff = settings.EMAIL_OUTBOX_BACKOFF * 2 ** (row.attempts - 1)
+                row.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+            failed.append(row)
+        else:
+            row.status = EmailOutbox.Status.SENT
+            row.sent_at = timezone.now()
+            sent.append(row)
+
+    EmailOutbox.objects.bulk_update(
+        sent + failed,
+        ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+    )
+    return len(sent), len(failed)
@@ -1 +1,116 @@
-# Create your tests here.
+import io
+import os
+import tempfile
+from datetime import date
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core_banking.models import BankAccount, Wallet
+
+from .forms import MAX_ONBOARD_PASSWORDS
+from .models import CustomUser, EmailOutbox
+
+
+def person(email, **fields):
+    return {"email": email, "first_name": "Test", "last_name": "User", **fields}
+
+
+class BulkOnboardTests(TestCase):
+    def onboard(self, people, **kwargs):
+        return CustomUser.objects.bulk_onboard(people, "testserver", **kwargs)
+
+    def test_onboard(self):
+        users = self.onboard(
+            [person("a@Example.com", password="pw"), person("b@example.com")],
+            account_type=BankAccount.AccountChoices.SAVINGS,
+            processes=1,
+        )
+        self.assertEqual(
+            [user.email for user in users], ["a@example.com", "b@example.com"]
+        )
+        self.assertFalse(any(user.is_active for user in users))
+        self.assertTrue(users[0].check_password("pw"))
+        self.assertFalse(users[1].has_usable_password())
+        self.assertEqual(Wallet.objects.filter(user__in=users).count(), 2)
+        self.assertEqual(BankAccount.objects.filter(owner__in=users).count(), 2)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_invalid_people_create_nobody(self):
+        cases = [
+            ([person("a@example.com", nickname="x")], "Line 1: unknown field nickname"),
+            ([person("a@example.com"), person("")], "Line 2: email is required"),
+            ([person("a@example.com"), person("a@example.com")], "appears twice"),
+            (
+                [person("a@example.com", date_of_birth="31/02/1990")],
+                "Line 1: date_of_birth:",
+            ),
+            ([person("a@example.com", first_name="x" * 31)], "Line 1: first_name:"),
+            ([person("a@example.com", phone_number="1" * 21)], "Line 1: phone_number:"),
+            ([person("not-an-email")], "Line 1: email:"),
+        ]
+        for people, message in cases:
+            with self.subTest(message), self.assertRaisesMessage(ValueError, message):
+                self.onboard(people)
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_values_are_cleaned(self):
+        (user,) = self.onboard([person("a@example.com", date_of_birth="1990-02-28")])
+        user.refresh_from_db()
+        self.assertEqual(user.date_of_birth, date(1990, 2, 28))
+
+    def test_already_registered(self):
+        self.onboard([person("a@example.com")])
+        with self.assertRaisesMessage(ValueError, "Already registered: a@example.com"):
+            self.onboard([person("b@example.com"), person("a@example.com")])
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], INSTRUMENTATION_SAMPLE_RATE=0)
+class OnboardAdminTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser(
+            "admin@example.com", "pw", first_name="Admin", last_name="User"
+        )
+        self.client.force_login(admin)
+
+    def upload(self, content):
+        upload = SimpleUploadedFile("people.csv", content.encode())
+        return self.client.post(
+            reverse("admin:users_customuser_onboard"), {"file": upload}
+        )
+
+    def test_bad_row_is_a_form_error(self):
+        response = self.upload(
+            "email,first_name,last_name,date_of_birth\n"
+            "a@example.com,Test,User,1990-02-31\n"
+        )
+        self.assertContains(response, "Line 1: date_of_birth:")
+        self.assertFalse(CustomUser.objects.filter(email="a@example.com").exists())
+
+    def test_passwords_are_capped(self):
+        rows = "".join(
+            f"user{i}@example.com,Test,User,pw\n"
+            for i in range(MAX_ONBOARD_PASSWORDS + 1)
+        )
+        response = self.upload("email,first_name,last_name,password\n" + rows)
+        self.assertContains(response, "onboard_users")
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+
+class OnboardCommandTests(TestCase):
+    def test_onboard_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "people.csv")
+            with open(path, "w") as f:
+                f.write("email,first_name,last_name\na@example.com,Test,User\n")
+            call_command(
+                "onboard_users", path, domain="testserver", stdout=io.StringIO()
+            )
+            self.assertTrue(CustomUser.objects.filter(email="a@example.com").exists())
+            with self.assertRaisesMessage(CommandError, "Already registered"):
+                call_command("onboard_users", path, domain="testserver")
+        with self.assertRaisesMessage(CommandError, "Cannot read"):
+            call_command("onboard_users", path, domain="testserver")
@@ -1,5 +1,7 @@
+from django.contrib.auth import views as auth_views
 from django.urls import include, path
 
+from .forms import OutboxPasswordResetForm
 from .views import (
     ActivationPendingView,
     EditProfileView,
@@ -8,6 +10,12 @@ from .views import (
 )
 
 urlpatterns = [
+    # must come before the auth urls so the reset email goes through the outbox
+    path(
+        "password_reset/",
+        auth_views.PasswordResetView.as_view(form_class=OutboxPasswordResetForm),
+        name="password_reset",
+    ),
     path("", include("django.contrib.auth.urls")),
     path("register/", UserRegistrationView.as_view(), name="register"),
     path("edit-profile/", EditProfileView.as_view(), name="edit_profile"),
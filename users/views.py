@@ -1,19 +1,18 @@
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import send_mail
+from django.db import transaction
 from django.shortcuts import redirect
-from django.template.loader import render_to_string
-from django.urls import reverse, reverse_lazy
-from django.utils.encoding import force_bytes
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.urls import reverse_lazy
+from django.utils.http import urlsafe_base64_decode
 from django.views.generic import CreateView, TemplateView, UpdateView
 
 from .forms import UserRegistrationForm
 from .models import CustomUser
+from .onboarding import activation_email
+from .outbox import queue_email
 from .tokens import account_activation_token
 
 # Create your views here.
@@ -27,31 +26,16 @@ class UserRegistrationView(SuccessMessageMixin, CreateView):
     )
     success_url = reverse_lazy("activation_pending")
 
+    @transaction.atomic
     def form_valid(self, form):
+        # the user and their activation email are committed together
         response = super().form_valid(form)
 
         user = self.object
         user.save()
 
-        token = account_activation_token.make_token(user)
-        uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
-
         current_site = get_current_site(self.request).domain
-        activate_url = reverse("activate", kwargs={"uidb64": uidb64, "token": token})
-        activate_link = f"http://{current_site}{activate_url}"
-
-        mail_subject = "Activate your account"
-        message = render_to_string(
-            "users/activate.html", {"user": user, "activate_link": activate_link}
-        )
-
-        send_mail(
-            mail_subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,  # Use configured email
-            [user.email],
-            fail_silently=False,
-        )
+        queue_email(**activation_email(user, current_site))
 
         return response
 